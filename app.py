@@ -1,11 +1,39 @@
 import streamlit as st
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from io import BytesIO
+from contextlib import contextmanager
 import os
+import pandas as pd
+from PIL import Image
+import queue
+import asyncio
+import ipaddress
+import socket
+import string
+import threading
 from typing import Dict, List, Optional
 import time
 from streamlit.components.v1 import html
 
+# Display lookup tables for queue and status badges
+PRIORITY_EMOJI = {"critical": "🔴", "urgent": "🟡"}
+STATUS_EMOJI = {
+    "triage": "📝",
+    "waiting_consultation": "⏳",
+    "consultation": "👨‍⚕️",
+    "prescribed": "💊",
+    "completed": "✅"
+}
+DOCTOR_STATUS_EMOJI = {"available": "🟢", "with_patient": "🟡"}
+DOCTOR_STATUS_LABEL = {
+    "available": "Available",
+    "with_patient": "With Patient",
+    "offline": "Offline"
+}
+
 # Page state persistence - store current page in URL parameters
 def preserve_page_state():
     """Initialize page state persistence"""
@@ -235,14 +263,6 @@ st.markdown("""
         height: 3rem;
     }
     
-    .patient-card {
-        border: 2px solid #e0e0e0;
-        border-radius: 10px;
-        padding: 1rem;
-        margin: 1rem 0;
-        background-color: #f8f9fa;
-    }
-    
     .urgent {
         border-color: #dc3545;
         background-color: #f8d7da;
@@ -283,13 +303,121 @@ st.markdown("""
 
 class DatabaseManager:
 
+    # Hot statements kept as shared constants so every call sends identical
+    # SQL text and hits the connection's prepared-statement cache
+    _INS_PATIENT = '''
+        INSERT INTO patients (
+            patient_id, name, age, gender, phone, emergency_contact,
+            medical_history, allergies, created_date, last_visit,
+            family_id, relationship, parent_id, is_independent,
+            address, registration_time
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    _INS_VISIT = '''
+        INSERT INTO visits (visit_id, patient_id, visit_date, status)
+        VALUES (?, ?, ?, ?)
+    '''
+    _INS_LAB_TEST = '''
+        INSERT INTO lab_tests (visit_id, test_type, ordered_by, ordered_time, status)
+        VALUES (?, ?, ?, ?, 'pending')
+        RETURNING id
+    '''
+    _INS_PRESCRIPTION = '''
+        INSERT INTO prescriptions 
+        (visit_id, medication_id, medication_name, dosage, frequency, duration, 
+         instructions, awaiting_lab, prescribed_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING id
+    '''
+    _UPD_DOCTOR_STATUS = '''
+        INSERT INTO doctor_status (doctor_name, current_patient_id, current_patient_name, status, last_updated)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(doctor_name) DO UPDATE SET
+            current_patient_id = excluded.current_patient_id,
+            current_patient_name = excluded.current_patient_name,
+            status = excluded.status,
+            last_updated = excluded.last_updated
+    '''
+
+    READ_POOL_SIZE = 4
+
     def __init__(self, db_name: str = "clinic_database.db"):
         self.db_name = db_name
+        # One connection for every write; Streamlit reruns can overlap,
+        # so cursor work is serialized with a re-entrant lock. Writes also
+        # enter `with self.conn` so an error rolls back instead of leaving
+        # the transaction (and SQLite's write lock) open
+        self.conn = sqlite3.connect(self.db_name,
+                                    check_same_thread=False,
+                                    cached_statements=256)
+        self.conn.row_factory = sqlite3.Row
+        self._configure(self.conn)
+        self._lock = threading.RLock()
         self.init_database()
 
+        # Lookups borrow one of a few read-only connections instead of
+        # queueing behind writes on the lock; WAL lets them read concurrently
+        self._readers = queue.Queue()
+        for _ in range(self.READ_POOL_SIZE):
+            reader = sqlite3.connect(self.db_name,
+                                     check_same_thread=False,
+                                     cached_statements=256)
+            reader.row_factory = sqlite3.Row
+            self._configure(reader)
+            self._readers.put(reader)
+
+    @contextmanager
+    def _reader(self):
+        """Borrow a pooled read connection for the duration of a lookup"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @staticmethod
+    def _configure(conn: sqlite3.Connection, busy_timeout: int = 5000):
+        """Apply performance PRAGMAs to a new connection"""
+        # WAL lets triage, doctor and pharmacy stations read while one writes;
+        # journal_mode persists in the file, the rest are per-connection.
+        # page_size only takes effect on a new, empty database (a WAL file
+        # cannot be re-paged), so it has to come before journal_mode
+        conn.executescript('''
+            PRAGMA page_size=8192;
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+            PRAGMA cache_size=-65536;
+        ''')
+        # foreign_keys stays at SQLite's default (off): preset medications are
+        # deleted while prescriptions still reference them, and
+        # delete_patient removes child rows itself
+        # Overrides the connect() timeout, so it is set here for every caller
+        conn.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+
+    @staticmethod
+    def _column_names(conn: sqlite3.Connection, table: str) -> set:
+        """Names of a table's columns, including generated ones"""
+        # table_xinfo (unlike table_info) also lists generated columns
+        return {row[1] for row in conn.execute(f'PRAGMA table_xinfo({table})')}
+
+    def _exec_retry(self, cursor: sqlite3.Cursor, sql: str, params=(),
+                    tries: int = 5) -> sqlite3.Cursor:
+        """Execute a write, backing off if another station holds the lock"""
+        # busy_timeout already makes SQLite wait up to 5s; this covers the
+        # rarer case where the lock is still held once that expires
+        for attempt in range(tries):
+            try:
+                return cursor.execute(sql, params)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == tries - 1:
+                    raise
+                time.sleep(0.01 * 2**attempt)
+
     def init_database(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_name)
+        conn = self.conn
         cursor = conn.cursor()
 
         # Create families table for proper family management
@@ -401,135 +529,6 @@ class DatabaseManager:
             )
         ''')
 
-        # Add awaiting_lab column if it doesn't exist (for database migration)
-        try:
-            cursor.execute(
-                'ALTER TABLE prescriptions ADD COLUMN awaiting_lab TEXT DEFAULT "no"'
-            )
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add oxygen saturation column if it doesn't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE vital_signs ADD COLUMN oxygen_saturation INTEGER')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add family-related columns to patients table if they don't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE patients ADD COLUMN is_independent INTEGER DEFAULT 0'
-            )
-        except sqlite3.OperationalError:
-            pass
-
-        try:
-            cursor.execute(
-                'ALTER TABLE patients ADD COLUMN separation_date TEXT')
-        except sqlite3.OperationalError:
-            pass
-
-        try:
-            cursor.execute('ALTER TABLE patients ADD COLUMN address TEXT')
-        except sqlite3.OperationalError:
-            pass
-
-        try:
-            cursor.execute(
-                'ALTER TABLE patients ADD COLUMN registration_time TEXT')
-        except sqlite3.OperationalError:
-            pass
-
-        # Add address column to patients table if it doesn't exist
-        try:
-            cursor.execute('ALTER TABLE patients ADD COLUMN address TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add registration_time column to patients table if it doesn't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE patients ADD COLUMN registration_time TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add needs_ophthalmology column if it doesn't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE consultations ADD COLUMN needs_ophthalmology INTEGER DEFAULT 0'
-            )
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add indication column if it doesn't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE prescriptions ADD COLUMN indication TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add return_to_provider column if it doesn't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE prescriptions ADD COLUMN return_to_provider TEXT DEFAULT "no"')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add pharmacy workflow columns if they don't exist
-        try:
-            cursor.execute(
-                'ALTER TABLE prescriptions ADD COLUMN pharmacy_approved_time TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute(
-                'ALTER TABLE prescriptions ADD COLUMN pharmacy_denied_time TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute(
-                'ALTER TABLE prescriptions ADD COLUMN pharmacy_return_time TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute(
-                'ALTER TABLE visits ADD COLUMN return_reason TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add family columns to patients table if they don't exist
-        try:
-            cursor.execute('ALTER TABLE patients ADD COLUMN family_id TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute(
-                'ALTER TABLE patients ADD COLUMN relationship TEXT DEFAULT "self"'
-            )
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute('ALTER TABLE patients ADD COLUMN parent_id TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add amount and indications columns to preset_medications table
-        try:
-            cursor.execute('ALTER TABLE preset_medications ADD COLUMN amount TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute('ALTER TABLE preset_medications ADD COLUMN indications TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
         # Create notifications table for doctor alerts
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS notifications (
@@ -562,63 +561,6 @@ class DatabaseManager:
             )
         ''')
 
-        # Add disposition column to lab_tests table if it doesn't exist
-        try:
-            cursor.execute('ALTER TABLE lab_tests ADD COLUMN disposition TEXT DEFAULT "return_to_provider"')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Create patient_names_queue table for pre-registration
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS patient_names_queue (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                age INTEGER,
-                gender TEXT,
-                location_code TEXT,
-                relationship TEXT DEFAULT 'individual',
-                family_group_id TEXT,
-                created_time TEXT,
-                status TEXT DEFAULT 'pending_vitals',
-                processed_by TEXT,
-                notes TEXT
-            )
-        ''')
-
-        try:
-            cursor.execute('ALTER TABLE patients ADD COLUMN created_date TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        try:
-            cursor.execute('ALTER TABLE patients ADD COLUMN last_visit TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-
-        # Add consultation columns to visits table
-        consultation_columns = [
-            'chief_complaint TEXT',
-            'symptoms TEXT',
-            'diagnosis TEXT',
-            'treatment_plan TEXT',
-            'notes TEXT',
-            'surgical_history TEXT',
-            'medical_history TEXT',
-            'allergies TEXT',
-            'current_medications TEXT'
-        ]
-        
-        for column in consultation_columns:
-            try:
-                cursor.execute(f'ALTER TABLE visits ADD COLUMN {column}')
-            except sqlite3.OperationalError:
-                pass  # Column already exists
-
-        # Add status column to prescriptions table for consultation state management
-        try:
-            cursor.execute('ALTER TABLE prescriptions ADD COLUMN status TEXT DEFAULT "ready"')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
 
         # Create counter table for location-based patient numbering
         cursor.execute('''
@@ -650,6 +592,7 @@ class DatabaseManager:
                 completed_time TEXT,
                 results TEXT,
                 status TEXT DEFAULT 'pending',
+                notes TEXT,
                 FOREIGN KEY (visit_id) REFERENCES visits (visit_id)
             )
         ''')
@@ -692,63 +635,60 @@ class DatabaseManager:
             )
         ''')
 
-        # Check if medications already exist to prevent duplicates
-        cursor.execute('SELECT COUNT(*) FROM preset_medications')
-        existing_count = cursor.fetchone()[0]
-
-        if existing_count == 0:
-            # Initialize default medications with Epocrates-style dosages
-            default_meds = [
-                ('Acetaminophen',
-                 '325mg q6h PRN, 500mg q6h PRN, 650mg q6h PRN', 'Pain Relief',
-                 'no'),
-                ('Ibuprofen', '200mg q6h PRN, 400mg q8h PRN, 600mg q8h PRN',
-                 'Pain Relief', 'no'),
-                ('Amoxicillin', '500mg q12h x7-10 days, 875mg q12h x7-10 days',
-                 'Antibiotic', 'no'),
-                ('Azithromycin',
-                 '250mg daily x5 days, 500mg day 1 then 250mg daily x4 days',
-                 'Antibiotic', 'no'),
-                ('Metronidazole', '250mg q8h x7 days, 500mg q12h x7 days',
-                 'Antibiotic', 'no'),
-                ('Ciprofloxacin',
-                 '250mg q12h x3-7 days, 500mg q12h x7-14 days', 'Antibiotic',
-                 'no'),
-                ('Nitrofurantoin', '100mg q12h x5-7 days', 'UTI Antibiotic',
-                 'no'),
-                ('Metformin', '500mg q12h with meals, 850mg daily with meals',
-                 'Diabetes', 'no'),
-                ('Lisinopril', '5mg daily, 10mg daily, 20mg daily',
-                 'Blood Pressure', 'no'),
-                ('Amlodipine', '2.5mg daily, 5mg daily, 10mg daily',
-                 'Blood Pressure', 'no'),
-                ('Omeprazole',
-                 '20mg daily before breakfast, 40mg daily before breakfast',
-                 'Stomach', 'no'),
-                ('Prednisone',
-                 '5mg daily x5-7 days, 10mg daily x5-7 days, 20mg daily x5 days',
-                 'Steroid', 'no'),
-                ('Albuterol Inhaler', '2 puffs q4-6h PRN', 'Respiratory',
-                 'no'), ('Multivitamin', '1 tablet daily', 'Vitamin', 'no'),
-                ('Iron Supplement', '65mg daily on empty stomach', 'Vitamin',
-                 'no'),
-                ('Cephalexin', '250mg q6h x7-10 days, 500mg q12h x7-10 days',
-                 'Antibiotic', 'no'),
-                ('Doxycycline', '100mg q12h x7-14 days', 'Antibiotic', 'no'),
-                ('Hydrochlorothiazide', '12.5mg daily, 25mg daily',
-                 'Blood Pressure', 'no'),
-                ('Atorvastatin', '20mg daily, 40mg daily', 'Cholesterol',
-                 'no'),
-                ('Furosemide', '20mg daily, 40mg daily', 'Diuretic', 'no')
-            ]
+        # Seed default medications with Epocrates-style dosages. The NOT EXISTS
+        # guard makes this a single statement that only fills an empty table,
+        # so medications the admin deleted or renamed are not brought back.
+        default_meds = [
+            ('Acetaminophen',
+             '325mg q6h PRN, 500mg q6h PRN, 650mg q6h PRN', 'Pain Relief',
+             'no'),
+            ('Ibuprofen', '200mg q6h PRN, 400mg q8h PRN, 600mg q8h PRN',
+             'Pain Relief', 'no'),
+            ('Amoxicillin', '500mg q12h x7-10 days, 875mg q12h x7-10 days',
+             'Antibiotic', 'no'),
+            ('Azithromycin',
+             '250mg daily x5 days, 500mg day 1 then 250mg daily x4 days',
+             'Antibiotic', 'no'),
+            ('Metronidazole', '250mg q8h x7 days, 500mg q12h x7 days',
+             'Antibiotic', 'no'),
+            ('Ciprofloxacin',
+             '250mg q12h x3-7 days, 500mg q12h x7-14 days', 'Antibiotic',
+             'no'),
+            ('Nitrofurantoin', '100mg q12h x5-7 days', 'UTI Antibiotic',
+             'no'),
+            ('Metformin', '500mg q12h with meals, 850mg daily with meals',
+             'Diabetes', 'no'),
+            ('Lisinopril', '5mg daily, 10mg daily, 20mg daily',
+             'Blood Pressure', 'no'),
+            ('Amlodipine', '2.5mg daily, 5mg daily, 10mg daily',
+             'Blood Pressure', 'no'),
+            ('Omeprazole',
+             '20mg daily before breakfast, 40mg daily before breakfast',
+             'Stomach', 'no'),
+            ('Prednisone',
+             '5mg daily x5-7 days, 10mg daily x5-7 days, 20mg daily x5 days',
+             'Steroid', 'no'),
+            ('Albuterol Inhaler', '2 puffs q4-6h PRN', 'Respiratory',
+             'no'), ('Multivitamin', '1 tablet daily', 'Vitamin', 'no'),
+            ('Iron Supplement', '65mg daily on empty stomach', 'Vitamin',
+             'no'),
+            ('Cephalexin', '250mg q6h x7-10 days, 500mg q12h x7-10 days',
+             'Antibiotic', 'no'),
+            ('Doxycycline', '100mg q12h x7-14 days', 'Antibiotic', 'no'),
+            ('Hydrochlorothiazide', '12.5mg daily, 25mg daily',
+             'Blood Pressure', 'no'),
+            ('Atorvastatin', '20mg daily, 40mg daily', 'Cholesterol',
+             'no'),
+            ('Furosemide', '20mg daily, 40mg daily', 'Diuretic', 'no')
+        ]
 
-            for med in default_meds:
-                cursor.execute(
-                    '''
-                    INSERT INTO preset_medications 
-                    (medication_name, common_dosages, category, requires_lab)
-                    VALUES (?, ?, ?, ?)
-                ''', med)
+        cursor.execute(
+            f'''
+            INSERT INTO preset_medications 
+            (medication_name, common_dosages, category, requires_lab)
+            SELECT * FROM (VALUES {', '.join(['(?, ?, ?, ?)'] * len(default_meds))})
+            WHERE NOT EXISTS (SELECT 1 FROM preset_medications)
+        ''', [value for med in default_meds for value in med])
 
         # Add new tables for multi-user functionality
         cursor.execute('''
@@ -767,93 +707,232 @@ class DatabaseManager:
                 current_patient_id TEXT,
                 current_patient_name TEXT,
                 status TEXT DEFAULT 'available',
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                last_updated TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'))
             )
         ''')
 
-        # Initialize default doctors if table is empty
-        cursor.execute('SELECT COUNT(*) FROM doctors')
-        doctor_count = cursor.fetchone()[0]
-
-        if doctor_count == 0:
-            default_doctors = [
-                'Dr. Smith', 'Dr. Johnson', 'Dr. Williams', 'Dr. Brown',
-                'Dr. Garcia'
+        # Schema migrations for databases created by older versions.
+        # PRAGMA user_version records the last migration applied, so the
+        # ALTERs only run once per database file.
+        cursor.execute('PRAGMA user_version')
+        schema_version = cursor.fetchone()[0]
+
+        if schema_version < 1:
+            added_columns = [
+                ('prescriptions', 'awaiting_lab TEXT DEFAULT "no"'),
+                ('vital_signs', 'oxygen_saturation INTEGER'),
+                ('patients', 'is_independent INTEGER DEFAULT 0'),
+                ('patients', 'separation_date TEXT'),
+                ('patients', 'address TEXT'),
+                ('patients', 'registration_time TEXT'),
+                ('consultations', 'needs_ophthalmology INTEGER DEFAULT 0'),
+                ('prescriptions', 'indication TEXT'),
+                ('prescriptions', 'return_to_provider TEXT DEFAULT "no"'),
+                ('prescriptions', 'pharmacy_approved_time TEXT'),
+                ('prescriptions', 'pharmacy_denied_time TEXT'),
+                ('prescriptions', 'pharmacy_return_time TEXT'),
+                ('visits', 'return_reason TEXT'),
+                ('patients', 'family_id TEXT'),
+                ('patients', 'relationship TEXT DEFAULT "self"'),
+                ('patients', 'parent_id TEXT'),
+                ('preset_medications', 'amount TEXT'),
+                ('preset_medications', 'indications TEXT'),
+                ('lab_tests', 'disposition TEXT DEFAULT "return_to_provider"'),
+                ('patients', 'created_date TEXT'),
+                ('patients', 'last_visit TEXT'),
+                ('visits', 'chief_complaint TEXT'),
+                ('visits', 'symptoms TEXT'),
+                ('visits', 'diagnosis TEXT'),
+                ('visits', 'treatment_plan TEXT'),
+                ('visits', 'notes TEXT'),
+                ('visits', 'surgical_history TEXT'),
+                ('visits', 'medical_history TEXT'),
+                ('visits', 'allergies TEXT'),
+                ('visits', 'current_medications TEXT'),
+                ('prescriptions', 'status TEXT DEFAULT "ready"')
             ]
+            # Tables created above already have most of these columns, so
+            # check the schema instead of letting ALTER TABLE fail
+            existing = {
+                table: self._column_names(conn, table)
+                for table in {table for table, _ in added_columns}
+            }
+            for table, column in added_columns:
+                if column.split()[0] not in existing[table]:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+            cursor.execute('PRAGMA user_version = 1')
+
+        if schema_version < 2:
+            # Older versions assigned IDs without keeping counters up to date,
+            # so bring each stored counter up to the highest ID in use
+            cursor.execute('''
+                UPDATE counters SET value = MAX(value, (
+                    SELECT COALESCE(MAX(CAST(SUBSTR(patient_id, LENGTH(counters.location_code) + 1) AS INTEGER)), 0)
+                    FROM patients
+                    WHERE patient_id GLOB counters.location_code || '[0-9]*'
+                ))
+            ''')
+            cursor.execute('PRAGMA user_version = 2')
+
+        if schema_version < 3:
+            # Sort key for the queues, derived from priority so no write
+            # path has to keep it in step
+            if 'priority_rank' not in self._column_names(conn, 'visits'):
+                cursor.execute('''
+                    ALTER TABLE visits ADD COLUMN priority_rank INTEGER
+                    GENERATED ALWAYS AS (
+                        CASE priority WHEN 'critical' THEN 1 WHEN 'urgent' THEN 2 ELSE 3 END
+                    ) VIRTUAL
+                ''')
+            cursor.execute('PRAGMA user_version = 3')
+
+        if schema_version < 4:
+            # Post-lab decisions are appended to the lab test as notes
+            if 'notes' not in self._column_names(conn, 'lab_tests'):
+                cursor.execute('ALTER TABLE lab_tests ADD COLUMN notes TEXT')
+            cursor.execute('PRAGMA user_version = 4')
+
+        # Index the foreign-key and filter columns used by joins and lookups
+        cursor.executescript('''
+            CREATE INDEX IF NOT EXISTS idx_visits_patient_id ON visits (patient_id);
+            CREATE INDEX IF NOT EXISTS idx_visits_status_date ON visits (status, visit_date);
+            CREATE INDEX IF NOT EXISTS idx_visits_visit_date ON visits (visit_date);
+            CREATE INDEX IF NOT EXISTS idx_visits_status_rank ON visits (status, visit_date, priority_rank);
+            CREATE INDEX IF NOT EXISTS idx_vital_signs_visit_id ON vital_signs (visit_id);
+            CREATE INDEX IF NOT EXISTS idx_prescriptions_visit_id ON prescriptions (visit_id);
+            CREATE INDEX IF NOT EXISTS idx_lab_tests_visit_id ON lab_tests (visit_id);
+            CREATE INDEX IF NOT EXISTS idx_lab_tests_pending
+                ON lab_tests (status, ordered_time) WHERE status = 'pending';
+            CREATE INDEX IF NOT EXISTS idx_lab_results_lab_test_id ON lab_results (lab_test_id);
+            CREATE INDEX IF NOT EXISTS idx_consultations_visit_id ON consultations (visit_id);
+            CREATE INDEX IF NOT EXISTS idx_consultations_time ON consultations (consultation_time);
+            CREATE INDEX IF NOT EXISTS idx_prescriptions_pending
+                ON prescriptions (status, awaiting_lab, prescribed_time);
+            CREATE INDEX IF NOT EXISTS idx_prescriptions_filled ON prescriptions (status, filled_time);
+            CREATE INDEX IF NOT EXISTS idx_lab_tests_completed ON lab_tests (status, completed_time);
+            CREATE INDEX IF NOT EXISTS idx_prescriptions_time ON prescriptions (prescribed_time, visit_id);
+            CREATE INDEX IF NOT EXISTS idx_lab_tests_ordered ON lab_tests (ordered_time, visit_id);
+            DELETE FROM doctor_status WHERE id NOT IN (
+                SELECT MAX(id) FROM doctor_status GROUP BY doctor_name
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_doctor_status_doctor_name ON doctor_status (doctor_name);
+            CREATE TRIGGER IF NOT EXISTS trg_doc_after_insert AFTER INSERT ON doctors BEGIN
+                INSERT OR IGNORE INTO doctor_status (doctor_name, status, last_updated)
+                VALUES (new.name, 'offline', strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'));
+            END;
+            INSERT OR IGNORE INTO doctor_status (doctor_name, status, last_updated)
+            SELECT name, 'offline', strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+            FROM doctors;
+            CREATE INDEX IF NOT EXISTS idx_doctors_active_name ON doctors (name) WHERE is_active = 1;
+            CREATE INDEX IF NOT EXISTS idx_patients_name_nocase ON patients (name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS idx_patients_family_id ON patients (family_id);
+            CREATE INDEX IF NOT EXISTS idx_patients_created ON patients (created_date);
+        ''')
 
-            for doctor in default_doctors:
+        # Full-text index over patient names and IDs for search_patients,
+        # kept in sync with patients by triggers. Skipped if FTS5 is missing.
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'"
+        )
+        fts_exists = cursor.fetchone() is not None
+        try:
+            cursor.executescript('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+                    patient_id, name,
+                    content='patients', content_rowid='rowid',
+                    tokenize='unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS patients_ai AFTER INSERT ON patients BEGIN
+                    INSERT INTO patients_fts (rowid, patient_id, name)
+                    VALUES (new.rowid, new.patient_id, new.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS patients_ad AFTER DELETE ON patients BEGIN
+                    INSERT INTO patients_fts (patients_fts, rowid, patient_id, name)
+                    VALUES ('delete', old.rowid, old.patient_id, old.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS patients_au AFTER UPDATE OF patient_id, name ON patients BEGIN
+                    INSERT INTO patients_fts (patients_fts, rowid, patient_id, name)
+                    VALUES ('delete', old.rowid, old.patient_id, old.name);
+                    INSERT INTO patients_fts (rowid, patient_id, name)
+                    VALUES (new.rowid, new.patient_id, new.name);
+                END;
+            ''')
+            if not fts_exists:
+                # Index patients registered before the FTS table existed
                 cursor.execute(
-                    '''
-                    INSERT INTO doctors (name, is_active) VALUES (?, 1)
-                ''', (doctor, ))
-
-        conn.commit()
-        conn.close()
+                    "INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            pass  # SQLite built without FTS5; search falls back to LIKE
 
-    def get_next_patient_id(self, location_code: str) -> str:
-        """Get the next patient ID in format DR00001, H00001, etc."""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        # Initialize default doctors if table is empty
+        default_doctors = [
+            'Dr. Smith', 'Dr. Johnson', 'Dr. Williams', 'Dr. Brown',
+            'Dr. Garcia'
+        ]
 
-        # Find the highest existing patient ID for this location
         cursor.execute(
-            '''
-            SELECT patient_id FROM patients 
-            WHERE patient_id LIKE ? 
-            ORDER BY patient_id DESC 
-            LIMIT 1
-        ''', (f"{location_code}%", ))
-
-        result = cursor.fetchone()
-
-        if result:
-            # Extract the number from the last patient ID
-            last_id = result[0]
-            last_number = int(last_id[len(location_code):])
-            new_number = last_number + 1
-        else:
-            # First patient for this location
-            new_number = 1
+            f'''
+            INSERT INTO doctors (name, is_active)
+            SELECT column1, 1 FROM (VALUES {', '.join(['(?)'] * len(default_doctors))})
+            WHERE NOT EXISTS (SELECT 1 FROM doctors)
+        ''', default_doctors)
 
-        # Ensure we don't have conflicts by checking if ID exists
-        while True:
-            new_id = f"{location_code}{new_number:05d}"
-            cursor.execute(
-                'SELECT COUNT(*) FROM patients WHERE patient_id = ?',
-                (new_id, ))
-            if cursor.fetchone()[0] == 0:
-                break
-            new_number += 1
+        conn.commit()
 
-        conn.close()
-        return new_id
+    def _reserve_patient_numbers(self, location_code: str,
+                                 count: int = 1) -> int:
+        """Reserve count patient numbers for a location and return the last one"""
+        with self._lock:
+            cursor = self.conn.cursor()
+
+            # Bump the per-location counter in one statement. COALESCE stops
+            # at the stored value, so the scan of existing IDs only runs the
+            # first time a location is seen
+            self._exec_retry(cursor,
+                '''
+                INSERT INTO counters (location_code, value)
+                VALUES (?, COALESCE(
+                    (SELECT value FROM counters WHERE location_code = ?),
+                    (SELECT COALESCE(MAX(CAST(SUBSTR(patient_id, ?) AS INTEGER)), 0)
+                     FROM patients WHERE patient_id GLOB ?)
+                ) + ?)
+                ON CONFLICT(location_code) DO UPDATE SET value = excluded.value
+                RETURNING value
+            ''', (location_code, location_code, len(location_code) + 1,
+                  f"{location_code}[0-9]*", count))
+
+            return cursor.fetchone()[0]
+
+    def get_next_patient_id(self, location_code: str) -> str:
+        """Get the next patient ID in format DR00001, H00001, etc."""
+        with self._lock, self.conn:
+            new_number = self._reserve_patient_numbers(location_code)
+        return f"{location_code}{new_number:05d}"
 
     def create_family(self, location_code: str, family_name: str,
                       head_of_household: str, **kwargs) -> str:
         """Create a new family unit and return family ID"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        # Generate family ID using location code + sequential number
-        cursor.execute('SELECT COUNT(*) FROM families WHERE location_code = ?',
-                       (location_code, ))
-        count = cursor.fetchone()[0]
-        family_id = f"{location_code}FAM{str(count + 1).zfill(5)}"
+            # Generate family ID using location code + sequential number
+            cursor.execute('SELECT COUNT(*) FROM families WHERE location_code = ?',
+                           (location_code, ))
+            count = cursor.fetchone()[0]
+            family_id = f"{location_code}FAM{str(count + 1).zfill(5)}"
 
-        cursor.execute(
-            '''
-            INSERT INTO families (
-                family_id, family_name, head_of_household, location_code,
-                address, phone, emergency_contact, created_date, notes
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (family_id, family_name, head_of_household, location_code,
-              kwargs.get('address', ''), kwargs.get(
-                  'phone', ''), kwargs.get('emergency_contact', ''),
-              datetime.now().isoformat(), kwargs.get('notes', '')))
+            self._exec_retry(cursor,
+                '''
+                INSERT INTO families (
+                    family_id, family_name, head_of_household, location_code,
+                    address, phone, emergency_contact, created_date, notes
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (family_id, family_name, head_of_household, location_code,
+                  kwargs.get('address', ''), kwargs.get(
+                      'phone', ''), kwargs.get('emergency_contact', ''),
+                  datetime.now().isoformat(), kwargs.get('notes', '')))
 
-        conn.commit()
-        conn.close()
-        return family_id
+            return family_id
 
     def add_family_member(self,
                           family_id: str,
@@ -862,150 +941,161 @@ class DatabaseManager:
                           parent_id: str = "",
                           **kwargs) -> str:
         """Add a family member to an existing family"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        patient_id = self.get_next_patient_id(location_code)
+            # Reserved in this transaction so a failed insert releases the number
+            new_number = self._reserve_patient_numbers(location_code)
+            patient_id = f"{location_code}{new_number:05d}"
+            now = datetime.now().isoformat()
 
-        # Determine if this person should be independent (18+ years old)
-        age = kwargs.get('age', 0)
-        is_independent = 1 if age and age >= 18 else 0
+            # Determine if this person should be independent (18+ years old)
+            age = kwargs.get('age', 0)
+            is_independent = 1 if age and age >= 18 else 0
 
-        cursor.execute(
-            '''
-            INSERT INTO patients (
-                patient_id, name, age, gender, phone, emergency_contact, 
-                medical_history, allergies, created_date, last_visit,
-                family_id, relationship, parent_id, is_independent,
-                address, registration_time
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''',
-            (patient_id, kwargs.get('name', ''), age, kwargs.get('gender', ''),
-             kwargs.get('phone', ''), kwargs.get('emergency_contact', ''),
-             kwargs.get('medical_history', ''), kwargs.get('allergies', ''),
-             datetime.now().isoformat(), datetime.now().isoformat(), family_id,
-             relationship, parent_id, is_independent, kwargs.get(
-                 'address', ''), datetime.now().isoformat()))
+            self._exec_retry(cursor,
+                self._INS_PATIENT,
+                (patient_id, kwargs.get('name', ''), age, kwargs.get('gender', ''),
+                 kwargs.get('phone', ''), kwargs.get('emergency_contact', ''),
+                 kwargs.get('medical_history', ''), kwargs.get('allergies', ''),
+                 now, now, family_id,
+                 relationship, parent_id, is_independent, kwargs.get(
+                     'address', ''), now))
 
-        conn.commit()
-        conn.close()
-        return patient_id
+            return patient_id
 
     def add_patient(self, location_code: str, **kwargs) -> str:
         """Add a new individual patient and return their ID"""
-        patient_id = self.get_next_patient_id(location_code)
+        with self._lock, self.conn:
+            # Reserved in this transaction so a failed insert releases the number
+            new_number = self._reserve_patient_numbers(location_code)
+            patient_id = f"{location_code}{new_number:05d}"
+            now = datetime.now().isoformat()
+            cursor = self.conn.cursor()
+
+            self._exec_retry(cursor,
+                self._INS_PATIENT,
+                (
+                    patient_id,
+                    kwargs.get('name', ''),
+                    kwargs.get('age'),
+                    kwargs.get('gender'),
+                    kwargs.get('phone'),
+                    kwargs.get('emergency_contact'),
+                    kwargs.get('medical_history'),
+                    kwargs.get('allergies'),
+                    now,
+                    now,
+                    kwargs.get('family_id', None),
+                    kwargs.get('relationship', 'self'),
+                    kwargs.get('parent_id', None),
+                    1,  # Individual patients are always independent
+                    kwargs.get('address', ''),
+                    now))
+
+            return patient_id
+
+    def add_patients_bulk(self, location_code: str,
+                          rows: List[Dict]) -> List[str]:
+        """Add many individual patients in one transaction and return their IDs"""
+        if not rows:
+            return []
 
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock:
+            cursor = self.conn.cursor()
+            now = datetime.now().isoformat()
 
-        cursor.execute(
-            '''
-            INSERT INTO patients (patient_id, name, age, gender, phone, 
-                                emergency_contact, medical_history, allergies, 
-                                created_date, last_visit, family_id, relationship, parent_id,
-                                is_independent, address, registration_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''',
-            (
-                patient_id,
-                kwargs.get('name', ''),
-                kwargs.get('age'),
-                kwargs.get('gender'),
-                kwargs.get('phone'),
-                kwargs.get('emergency_contact'),
-                kwargs.get('medical_history'),
-                kwargs.get('allergies'),
-                datetime.now().isoformat(),
-                datetime.now().isoformat(),
-                kwargs.get('family_id', None),
-                kwargs.get('relationship', 'self'),
-                kwargs.get('parent_id', None),
-                1,  # Individual patients are always independent
-                kwargs.get('address', ''),
-                datetime.now().isoformat()))
+            self._exec_retry(cursor, 'BEGIN IMMEDIATE')
+            try:
+                # One counter bump covers the whole roster
+                last_number = self._reserve_patient_numbers(
+                    location_code, len(rows))
+                first_number = last_number - len(rows) + 1
+                patient_ids = [
+                    f"{location_code}{number:05d}"
+                    for number in range(first_number, last_number + 1)
+                ]
 
-        conn.commit()
-        conn.close()
+                cursor.executemany(
+                    self._INS_PATIENT,
+                    [(patient_id, row.get('name', ''), row.get('age'),
+                      row.get('gender'), row.get('phone'),
+                      row.get('emergency_contact'), row.get('medical_history'),
+                      row.get('allergies'), now, now, row.get('family_id', None),
+                      row.get('relationship', 'self'), row.get('parent_id', None),
+                      1, row.get('address', ''), now)
+                     for patient_id, row in zip(patient_ids, rows)])
+
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
 
-        return patient_id
+            return patient_ids
 
     def check_duplicate_patient(self,
                                 name: str,
                                 age: Optional[int] = None,
                                 phone: Optional[str] = None) -> dict:
         """Check for potential duplicate patients based on name, age, and phone"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock:
+            cursor = self.conn.cursor()
+
+            # Similar names (fuzzy matching): both word orders for full names
+            name_parts = name.lower().split()
+            if len(name_parts) >= 2:
+                first_name = name_parts[0]
+                last_name = name_parts[-1]
+                patterns = (f'%{first_name}%{last_name}%',
+                            f'%{last_name}%{first_name}%')
+            else:
+                patterns = (f'%{name.lower()}%', ) * 2
 
-        # Search for exact name matches
-        cursor.execute(
-            '''
-            SELECT patient_id, name, age, phone, address, registration_time
-            FROM patients 
-            WHERE LOWER(name) = LOWER(?)
-            ORDER BY registration_time DESC
-        ''', (name, ))
-
-        exact_matches = cursor.fetchall()
-
-        # Search for similar names (fuzzy matching)
-        name_parts = name.lower().split()
-        if len(name_parts) >= 2:
-            first_name = name_parts[0]
-            last_name = name_parts[-1]
+            # Exact and similar matches in one round trip; the first column
+            # says which list a row belongs to
             cursor.execute(
                 '''
-                SELECT patient_id, name, age, phone, address, registration_time
-                FROM patients 
-                WHERE (LOWER(name) LIKE ? OR LOWER(name) LIKE ?) 
-                AND patient_id NOT IN (
-                    SELECT patient_id FROM patients WHERE LOWER(name) = LOWER(?)
+                WITH exact AS (
+                    SELECT patient_id, name, age, phone, address, registration_time
+                    FROM patients
+                    WHERE name = :name COLLATE NOCASE
                 )
-                ORDER BY registration_time DESC
-                LIMIT 5
-            ''', (f'%{first_name}%{last_name}%', f'%{last_name}%{first_name}%',
-                  name))
-        else:
-            cursor.execute(
-                '''
-                SELECT patient_id, name, age, phone, address, registration_time
-                FROM patients 
-                WHERE LOWER(name) LIKE ? 
-                AND patient_id NOT IN (
-                    SELECT patient_id FROM patients WHERE LOWER(name) = LOWER(?)
+                SELECT 1 AS is_exact, * FROM exact
+                UNION ALL
+                SELECT 0, * FROM (
+                    SELECT patient_id, name, age, phone, address, registration_time
+                    FROM patients
+                    WHERE (name LIKE :first OR name LIKE :second)
+                    AND patient_id NOT IN (SELECT patient_id FROM exact)
+                    ORDER BY registration_time DESC
+                    LIMIT 5
                 )
-                ORDER BY registration_time DESC
-                LIMIT 5
-            ''', (f'%{name.lower()}%', name))
+                ORDER BY is_exact DESC, registration_time DESC
+            ''', {'name': name, 'first': patterns[0], 'second': patterns[1]})
 
-        similar_matches = cursor.fetchall()
-
-        conn.close()
-
-        return {
-            'exact_matches': exact_matches,
-            'similar_matches': similar_matches
-        }
+            # Plain tuples so the results can sit in session state
+            matches = {'exact_matches': [], 'similar_matches': []}
+            for row in cursor.fetchall():
+                key = 'exact_matches' if row[0] else 'similar_matches'
+                matches[key].append(tuple(row)[1:])
+            return matches
 
     def link_to_existing_patient(self, existing_patient_id: str) -> str:
         """Create a new visit for an existing patient from previous clinic"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        # Update last visit time
-        cursor.execute(
-            '''
-            UPDATE patients 
-            SET last_visit = ?
-            WHERE patient_id = ?
-        ''', (datetime.now().isoformat(), existing_patient_id))
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        conn.commit()
-        conn.close()
+            # Update last visit time
+            self._exec_retry(cursor,
+                '''
+                UPDATE patients 
+                SET last_visit = ?
+                WHERE patient_id = ?
+            ''', (datetime.now().isoformat(), existing_patient_id))
 
-        # Create new visit
-        visit_id = self.create_visit(existing_patient_id)
-        return visit_id
+            # Create new visit
+            visit_id = self.create_visit(existing_patient_id)
+            return visit_id
 
     def save_patient_photo(self,
                            visit_id: str,
@@ -1013,519 +1103,490 @@ class DatabaseManager:
                            photo_data: bytes,
                            description: str = "") -> int:
         """Save a patient photo for symptom documentation"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        cursor.execute(
-            '''
-            INSERT INTO patient_photos (visit_id, patient_id, photo_data, photo_description, captured_time)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (visit_id, patient_id, photo_data, description,
-              datetime.now().isoformat()))
-
-        photo_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            self._exec_retry(cursor,
+                '''
+                INSERT INTO patient_photos (visit_id, patient_id, photo_data, photo_description, captured_time)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (visit_id, patient_id, photo_data, description,
+                  datetime.now().isoformat()))
 
-        return photo_id or 0
+            photo_id = cursor.lastrowid
+            return photo_id or 0
 
     def get_patient_photos(self, patient_id: str) -> List[Dict]:
         """Get all photos for a patient"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            '''
-            SELECT id, visit_id, photo_description, captured_time
-            FROM patient_photos
-            WHERE patient_id = ?
-            ORDER BY captured_time DESC
-        ''', (patient_id, ))
-
-        photos = []
-        for row in cursor.fetchall():
-            photos.append({
-                'id': row[0],
-                'visit_id': row[1],
-                'description': row[2],
-                'captured_time': row[3]
-            })
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        conn.close()
-        return photos
+            cursor.execute(
+                '''
+                SELECT id, visit_id, photo_description, captured_time
+                FROM patient_photos
+                WHERE patient_id = ?
+                ORDER BY captured_time DESC
+            ''', (patient_id, ))
+
+            photos = []
+            for row in cursor.fetchall():
+                photos.append({
+                    'id': row[0],
+                    'visit_id': row[1],
+                    'description': row[2],
+                    'captured_time': row[3]
+                })
+            return photos
 
     def get_family_members(self, patient_id: str) -> List[Dict]:
         """Get all family members for a patient"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        # First get the patient's family_id
-        cursor.execute('SELECT family_id FROM patients WHERE patient_id = ?',
-                       (patient_id, ))
-        result = cursor.fetchone()
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        if not result or not result[0]:
-            conn.close()
-            return []
+            # First get the patient's family_id
+            cursor.execute('SELECT family_id FROM patients WHERE patient_id = ?',
+                           (patient_id, ))
+            result = cursor.fetchone()
 
-        family_id = result[0]
+            if not result or not result[0]:
+                return []
 
-        # Get all family members
-        cursor.execute(
-            '''
-            SELECT patient_id, name, age, gender, relationship, parent_id
-            FROM patients 
-            WHERE family_id = ?
-            ORDER BY 
-                CASE relationship 
-                    WHEN 'parent' THEN 1 
-                    WHEN 'self' THEN 1
-                    ELSE 2 
-                END,
-                age DESC
-        ''', (family_id, ))
-
-        members = []
-        for row in cursor.fetchall():
-            members.append({
-                'patient_id': row[0],
-                'name': row[1],
-                'age': row[2],
-                'gender': row[3],
-                'relationship': row[4],
-                'parent_id': row[5]
-            })
+            family_id = result[0]
 
-        conn.close()
-        return members
+            # Get all family members
+            cursor.execute(
+                '''
+                SELECT patient_id, name, age, gender, relationship, parent_id
+                FROM patients 
+                WHERE family_id = ?
+                ORDER BY 
+                    CASE relationship 
+                        WHEN 'parent' THEN 1 
+                        WHEN 'self' THEN 1
+                        ELSE 2 
+                    END,
+                    age DESC
+            ''', (family_id, ))
+
+            members = []
+            for row in cursor.fetchall():
+                members.append({
+                    'patient_id': row[0],
+                    'name': row[1],
+                    'age': row[2],
+                    'gender': row[3],
+                    'relationship': row[4],
+                    'parent_id': row[5]
+                })
+            return members
 
     def get_family_info(self, family_id: str) -> Dict:
         """Get complete family information including all members"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        # Get family details
-        cursor.execute('SELECT * FROM families WHERE family_id = ?',
-                       (family_id, ))
-        family_row = cursor.fetchone()
+            # Get family details
+            cursor.execute('SELECT * FROM families WHERE family_id = ?',
+                           (family_id, ))
+            family_row = cursor.fetchone()
 
-        if not family_row:
-            conn.close()
-            return {}
+            if not family_row:
+                return {}
 
-        # Get all family members
-        cursor.execute(
-            '''
-            SELECT patient_id, name, age, gender, relationship, parent_id, is_independent 
-            FROM patients WHERE family_id = ? ORDER BY relationship, age DESC
-        ''', (family_id, ))
-        members = cursor.fetchall()
-
-        conn.close()
-
-        return {
-            'family_id':
-            family_row[0],
-            'family_name':
-            family_row[1],
-            'head_of_household':
-            family_row[2],
-            'location_code':
-            family_row[3],
-            'address':
-            family_row[4],
-            'phone':
-            family_row[5],
-            'members': [
-                dict(
-                    zip([
-                        'patient_id', 'name', 'age', 'gender', 'relationship',
-                        'parent_id', 'is_independent'
-                    ], member)) for member in members
-            ]
-        }
+            # Get all family members
+            cursor.execute(
+                '''
+                SELECT patient_id, name, age, gender, relationship, parent_id, is_independent 
+                FROM patients WHERE family_id = ? ORDER BY relationship, age DESC
+            ''', (family_id, ))
+            members = cursor.fetchall()
+
+            return {
+                'family_id':
+                family_row[0],
+                'family_name':
+                family_row[1],
+                'head_of_household':
+                family_row[2],
+                'location_code':
+                family_row[3],
+                'address':
+                family_row[4],
+                'phone':
+                family_row[5],
+                'members': [
+                    dict(
+                        zip([
+                            'patient_id', 'name', 'age', 'gender', 'relationship',
+                            'parent_id', 'is_independent'
+                        ], member)) for member in members
+                ]
+            }
 
     def separate_family_member(self,
                                patient_id: str,
                                new_address: str = "") -> bool:
         """Separate a family member (typically when they turn 18)"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        cursor.execute(
-            '''
-            UPDATE patients 
-            SET is_independent = 1, separation_date = ?, address = ?
-            WHERE patient_id = ?
-        ''', (datetime.now().isoformat(), new_address, patient_id))
+            self._exec_retry(cursor,
+                '''
+                UPDATE patients 
+                SET is_independent = 1, separation_date = ?, address = ?
+                WHERE patient_id = ?
+            ''', (datetime.now().isoformat(), new_address, patient_id))
 
-        conn.commit()
-        conn.close()
-        return True
+            return True
 
-    def search_patients(self, query: str) -> List[Dict]:
+    def search_patients(self, query: str, limit: Optional[int] = None,
+                        offset: int = 0) -> List[Dict]:
         """Search for patients by name or ID"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        cursor.execute(
+        with self._reader() as conn:
+            cursor = conn.cursor()
+            # LIMIT -1 means no limit in SQLite
+            page = (limit if limit is not None else -1, offset)
+
+            # Prefix-match every word against the FTS index, and keep LIKE for
+            # substrings in the middle of a word (e.g. "0042"). Both feed one
+            # ORDER BY so every page is cut from the same result set
+            terms = [
+                '"' + term.replace('"', '""') + '"*' for term in query.split()
+            ]
+            like_sql = 'SELECT rowid FROM patients WHERE patient_id LIKE ? OR name LIKE ?'
+            like = (f'%{query}%', f'%{query}%')
+            search_sql = '''
+                SELECT * FROM patients
+                WHERE rowid IN ({})
+                ORDER BY name, patient_id
+                LIMIT ? OFFSET ?
             '''
-            SELECT * FROM patients 
-            WHERE patient_id LIKE ? OR name LIKE ?
-            ORDER BY name
-        ''', (f'%{query}%', f'%{query}%'))
-
-        results = cursor.fetchall()
-        conn.close()
-
-        columns = [
-            'patient_id', 'name', 'age', 'gender', 'phone',
-            'emergency_contact', 'medical_history', 'allergies',
-            'created_date', 'last_visit'
-        ]
 
-        return [dict(zip(columns, row)) for row in results]
+            results = None
+            if terms:
+                try:
+                    cursor.execute(
+                        search_sql.format(
+                            'SELECT rowid FROM patients_fts WHERE patients_fts MATCH ? '
+                            'UNION ' + like_sql),
+                        ('{patient_id name} : ' + ' '.join(terms), ) + like + page)
+                    results = cursor.fetchall()
+                except sqlite3.OperationalError:
+                    results = None
+
+            # No words to match, or no FTS index: LIKE on its own
+            if results is None:
+                cursor.execute(search_sql.format(like_sql), like + page)
+                results = cursor.fetchall()
+
+            return [dict(row) for row in results]
+
+    def get_visit_consultation(self, visit_id: str) -> Optional[Dict]:
+        """Get the saved consultation fields for a visit"""
+        with self._reader() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                '''
+                SELECT chief_complaint, symptoms, diagnosis, treatment_plan, notes,
+                       surgical_history, medical_history, allergies, current_medications
+                FROM visits 
+                WHERE visit_id = ?
+            ''', (visit_id, ))
+            row = cursor.fetchone()
+
+            # Blank fields come back as '' so they can seed form defaults
+            return {key: row[key] or '' for key in row.keys()} if row else None
 
     def create_visit(self, patient_id: str) -> str:
         """Create a new visit for a patient"""
-        visit_id = f"{patient_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            now_dt = datetime.now()
+            now = now_dt.isoformat()
+            visit_id = f"{patient_id}_{now_dt.strftime('%Y%m%d_%H%M%S')}"
+            cursor = self.conn.cursor()
 
-        cursor.execute(
-            '''
-            INSERT INTO visits (visit_id, patient_id, visit_date, status)
-            VALUES (?, ?, ?, ?)
-        ''', (visit_id, patient_id, datetime.now().isoformat(), 'triage'))
+            self._exec_retry(cursor,
+                self._INS_VISIT, (visit_id, patient_id, now, 'triage'))
 
-        # Update patient's last visit
-        cursor.execute(
-            '''
-            UPDATE patients SET last_visit = ? WHERE patient_id = ?
-        ''', (datetime.now().isoformat(), patient_id))
-
-        conn.commit()
-        conn.close()
+            # Update patient's last visit
+            self._exec_retry(cursor,
+                '''
+                UPDATE patients SET last_visit = ? WHERE patient_id = ?
+            ''', (now, patient_id))
 
-        return visit_id
+            return visit_id
 
     def get_doctors(self) -> List[Dict]:
         """Get all active doctors"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            'SELECT name FROM doctors WHERE is_active = 1 ORDER BY name')
-        doctors = [{'name': row[0]} for row in cursor.fetchall()]
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        conn.close()
-        return doctors
+            cursor.execute(
+                'SELECT name FROM doctors WHERE is_active = 1 ORDER BY name')
+            doctors = [{'name': row[0]} for row in cursor.fetchall()]
+            return doctors
 
     def add_doctor(self, name: str) -> bool:
-        """Add a new doctor"""
+        """Add a new doctor, or reactivate one that was removed"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-
-            cursor.execute(
-                'INSERT INTO doctors (name, is_active) VALUES (?, 1)',
-                (name, ))
-            conn.commit()
-            conn.close()
-            return True
-        except:
+            with self._lock, self.conn:
+                self._exec_retry(self.conn.cursor(),
+                    '''
+                    INSERT INTO doctors (name, is_active) VALUES (?, 1)
+                    ON CONFLICT(name) DO UPDATE SET is_active = 1
+                ''', (name, ))
+        except sqlite3.OperationalError:
+            # Busy or locked database; the with block has rolled back
             return False
 
+        get_doctors.clear()
+        return True
+
     def remove_doctor(self, name: str) -> bool:
         """Remove a doctor (set inactive)"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-
-            cursor.execute('UPDATE doctors SET is_active = 0 WHERE name = ?',
-                           (name, ))
-            conn.commit()
-            conn.close()
-            return True
-        except:
+            with self._lock, self.conn:
+                cursor = self._exec_retry(
+                    self.conn.cursor(),
+                    'UPDATE doctors SET is_active = 0 WHERE name = ?', (name, ))
+        except sqlite3.OperationalError:
             return False
 
+        get_doctors.clear()
+        return cursor.rowcount > 0
+
     def update_doctor_status(self,
                              doctor_name: str,
                              status: str,
                              patient_id: str = "",
                              patient_name: str = ""):
         """Update doctor's current status"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        # Remove old status for this doctor
-        cursor.execute('DELETE FROM doctor_status WHERE doctor_name = ?',
-                       (doctor_name, ))
+            # Insert or replace this doctor's single status row
+            self._exec_retry(cursor,
+                self._UPD_DOCTOR_STATUS, (doctor_name, patient_id or "", patient_name
+                  or "", status, datetime.now().isoformat()))
 
-        # Insert new status
-        cursor.execute(
-            '''
-            INSERT INTO doctor_status (doctor_name, current_patient_id, current_patient_name, status, last_updated)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (doctor_name, patient_id or "", patient_name
-              or "", status, datetime.now().isoformat()))
-
-        conn.commit()
-        conn.close()
+        get_doctor_status.clear()
 
     def get_all_doctor_status(self) -> List[Dict]:
         """Get current status of all doctors"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT ds.doctor_name, ds.current_patient_id, ds.current_patient_name, ds.status, ds.last_updated,
-                   d.is_active
-            FROM doctor_status ds
-            JOIN doctors d ON ds.doctor_name = d.name
-            WHERE d.is_active = 1
-            ORDER BY ds.doctor_name
-        ''')
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        status_list = []
-        for row in cursor.fetchall():
-            status_list.append({
-                'doctor_name': row[0],
-                'current_patient_id': row[1],
-                'current_patient_name': row[2],
-                'status': row[3],
-                'last_updated': row[4],
-                'is_active': bool(row[5])
-            })
+            cursor.execute('''
+                SELECT ds.doctor_name, ds.current_patient_id, ds.current_patient_name, ds.status, ds.last_updated,
+                       strftime('%Y-%m-%d %H:%M', ds.last_updated) AS last_updated_fmt,
+                       d.is_active = 1 AS is_active
+                FROM doctor_status ds
+                JOIN doctors d ON ds.doctor_name = d.name
+                WHERE d.is_active = 1
+                ORDER BY ds.doctor_name
+            ''')
 
-        conn.close()
-        return status_list
+            return [dict(row) for row in cursor.fetchall()]
 
     def clean_duplicate_medications(self):
         """Remove duplicate medications keeping the first occurrence"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        # Find duplicate medications by name
-        cursor.execute('''
-            SELECT medication_name, MIN(id) as keep_id, GROUP_CONCAT(id) as all_ids
-            FROM preset_medications 
-            GROUP BY medication_name 
-            HAVING COUNT(*) > 1
-        ''')
-
-        duplicates = cursor.fetchall()
-
-        for med_name, keep_id, all_ids in duplicates:
-            # Delete all duplicates except the first one
-            id_list = [int(x) for x in all_ids.split(',')]
-            delete_ids = [x for x in id_list if x != keep_id]
-
-            for delete_id in delete_ids:
-                cursor.execute('DELETE FROM preset_medications WHERE id = ?',
-                               (delete_id, ))
-
-        conn.commit()
-        conn.close()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
+            # Find duplicate medications by name
+            cursor.execute('''
+                SELECT medication_name, MIN(id) as keep_id, GROUP_CONCAT(id) as all_ids
+                FROM preset_medications 
+                GROUP BY medication_name 
+                HAVING COUNT(*) > 1
+            ''')
+
+            duplicates = cursor.fetchall()
+
+            for med_name, keep_id, all_ids in duplicates:
+                # Delete all duplicates except the first one
+                id_list = [int(x) for x in all_ids.split(',')]
+                delete_ids = [x for x in id_list if x != keep_id]
+
+                for delete_id in delete_ids:
+                    self._exec_retry(cursor,
+                                     'DELETE FROM preset_medications WHERE id = ?',
+                                     (delete_id, ))
+
+        get_preset_medications.clear()
+        get_medications_by_category.clear()
         return len(duplicates)
 
     def delete_patient(self, patient_id: str) -> bool:
         """Delete a patient and all associated data"""
-        conn = None
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
+        with self._lock:
+            try:
+                cursor = self.conn.cursor()
 
-            # Enable foreign key support
-            cursor.execute('PRAGMA foreign_keys = ON')
+                # Start transaction
+                self._exec_retry(cursor, 'BEGIN IMMEDIATE')
 
-            # Start transaction
-            cursor.execute('BEGIN IMMEDIATE')
+                # Delete dependent rows in bulk; foreign keys are not enforced,
+                # so nothing cascades on its own
+                visit_ids = 'SELECT visit_id FROM visits WHERE patient_id = ?'
+                cursor.execute(
+                    f'''
+                    DELETE FROM lab_results WHERE lab_test_id IN (
+                        SELECT id FROM lab_tests WHERE visit_id IN ({visit_ids})
+                    )
+                ''', (patient_id, ))
+                for table in ('lab_tests', 'prescriptions', 'consultations',
+                              'vital_signs'):
+                    cursor.execute(
+                        f'DELETE FROM {table} WHERE visit_id IN ({visit_ids})',
+                        (patient_id, ))
 
-            # Get all visit IDs for this patient
-            cursor.execute('SELECT visit_id FROM visits WHERE patient_id = ?',
-                           (patient_id, ))
-            visit_ids = [row[0] for row in cursor.fetchall()]
-
-            # Delete related data for each visit
-            for visit_id in visit_ids:
-                # Delete vital signs
-                cursor.execute('DELETE FROM vital_signs WHERE visit_id = ?',
-                               (visit_id, ))
-
-                # Delete prescriptions
-                cursor.execute('DELETE FROM prescriptions WHERE visit_id = ?',
-                               (visit_id, ))
-
-                # Get lab test IDs for this visit
-                cursor.execute('SELECT id FROM lab_tests WHERE visit_id = ?',
-                               (visit_id, ))
-                lab_test_ids = [row[0] for row in cursor.fetchall()]
-
-                # Delete lab results for these tests
-                for test_id in lab_test_ids:
-                    cursor.execute('DELETE FROM lab_results WHERE test_id = ?',
-                                   (test_id, ))
-
-                # Delete lab tests
-                cursor.execute('DELETE FROM lab_tests WHERE visit_id = ?',
-                               (visit_id, ))
-
-                # Delete consultations
-                cursor.execute('DELETE FROM consultations WHERE visit_id = ?',
-                               (visit_id, ))
-
-                # Delete patient photos for this visit
-                cursor.execute('DELETE FROM patient_photos WHERE visit_id = ?',
-                               (visit_id, ))
-
-            # Delete all visits for this patient
-            cursor.execute('DELETE FROM visits WHERE patient_id = ?',
-                           (patient_id, ))
+                cursor.execute('DELETE FROM patient_photos WHERE patient_id = ?',
+                               (patient_id, ))
 
-            # Delete family relationships where this patient is a member
-            cursor.execute('DELETE FROM family_members WHERE patient_id = ?',
-                           (patient_id, ))
+                # eye_examinations is created lazily by the ophthalmologist view
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'eye_examinations'"
+                )
+                if cursor.fetchone():
+                    cursor.execute(
+                        'DELETE FROM eye_examinations WHERE patient_id = ?',
+                        (patient_id, ))
 
-            # Delete family relationships where this patient is the parent
-            cursor.execute('DELETE FROM family_members WHERE parent_id = ?',
-                           (patient_id, ))
+                # Delete all visits for this patient
+                cursor.execute('DELETE FROM visits WHERE patient_id = ?',
+                               (patient_id, ))
 
-            # Finally delete the patient
-            cursor.execute('DELETE FROM patients WHERE patient_id = ?',
-                           (patient_id, ))
+                # Detach children who listed this patient as their parent
+                cursor.execute(
+                    'UPDATE patients SET parent_id = NULL WHERE parent_id = ?',
+                    (patient_id, ))
 
-            # Check if deletion was successful
-            cursor.execute(
-                'SELECT COUNT(*) FROM patients WHERE patient_id = ?',
-                (patient_id, ))
-            remaining_count = cursor.fetchone()[0]
+                # Finally delete the patient
+                cursor.execute('DELETE FROM patients WHERE patient_id = ?',
+                               (patient_id, ))
 
-            if remaining_count == 0:
-                conn.commit()
-                return True
-            else:
-                conn.rollback()
-                return False
+                if cursor.rowcount == 1:
+                    self.conn.commit()
+                    return True
+                else:
+                    self.conn.rollback()
+                    return False
 
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            return False
-        finally:
-            if conn:
-                conn.close()
+            except Exception as e:
+                self.conn.rollback()
+                return False
 
     def add_location(self, country_code: str, country_name: str,
                      city: str) -> int:
         """Add a new clinic location"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            '''
-            INSERT INTO locations (country_code, country_name, city, created_date)
-            VALUES (?, ?, ?, ?)
-        ''', (country_code, country_name, city, datetime.now().isoformat()))
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        location_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            location_id = self._exec_retry(cursor,
+                '''
+                INSERT INTO locations (country_code, country_name, city, created_date)
+                VALUES (?, ?, ?, ?)
+                RETURNING id
+            ''', (country_code, country_name, city, datetime.now().isoformat())).fetchone()[0]
 
-        return int(location_id) if location_id else 0
+        get_locations.clear()
+        return location_id
 
     def get_locations(self) -> List[Dict]:
         """Get all clinic locations"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute('SELECT * FROM locations ORDER BY country_name, city')
-        results = cursor.fetchall()
-        conn.close()
+            cursor.execute('SELECT * FROM locations ORDER BY country_name, city')
+            results = cursor.fetchall()
 
-        columns = [
-            'id', 'country_code', 'country_name', 'city', 'created_date'
-        ]
-        return [dict(zip(columns, row)) for row in results]
+            return [dict(row) for row in results]
 
-    def get_preset_medications(self) -> List[Dict]:
+    def get_preset_medications(self, limit: Optional[int] = None,
+                               offset: int = 0) -> List[Dict]:
         """Get all active preset medications"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute('''
-            SELECT * FROM preset_medications 
-            WHERE active = 1 
-            ORDER BY category, medication_name
-        ''')
-        results = cursor.fetchall()
-        conn.close()
+            cursor.execute('''
+                SELECT id, medication_name, common_dosages, category, requires_lab
+                FROM preset_medications 
+                WHERE active = 1 
+                ORDER BY category, medication_name
+                LIMIT ? OFFSET ?
+            ''', (limit if limit is not None else -1, offset))
+            results = cursor.fetchall()
 
-        columns = [
-            'id', 'medication_name', 'common_dosages', 'category',
-            'requires_lab', 'active'
-        ]
-        return [dict(zip(columns, row)) for row in results]
+            return [dict(row) for row in results]
 
     def order_lab_test(self, visit_id: str, test_type: str,
                        ordered_by: str) -> int:
         """Order a lab test for a patient"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        cursor.execute(
-            '''
-            INSERT INTO lab_tests (visit_id, test_type, ordered_by, ordered_time, status)
-            VALUES (?, ?, ?, ?, 'pending')
-        ''', (visit_id, test_type, ordered_by, datetime.now().isoformat()))
+            test_id = self._exec_retry(cursor,
+                self._INS_LAB_TEST, (visit_id, test_type, ordered_by, datetime.now().isoformat())).fetchone()[0]
+            return test_id
 
-        test_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    def get_pending_lab_tests(self, limit: Optional[int] = None,
+                              offset: int = 0) -> List[Dict]:
+        """Get all pending lab tests"""
+        with self._reader() as conn:
+            cursor = conn.cursor()
 
-        return int(test_id) if test_id else 0
+            cursor.execute('''
+                SELECT lt.id, lt.visit_id, lt.test_type, lt.ordered_by, lt.ordered_time,
+                       p.name as patient_name, p.patient_id, v.visit_date
+                FROM lab_tests lt
+                JOIN visits v ON lt.visit_id = v.visit_id
+                JOIN patients p ON v.patient_id = p.patient_id
+                WHERE lt.status = 'pending'
+                ORDER BY lt.ordered_time
+                LIMIT ? OFFSET ?
+            ''', (limit if limit is not None else -1, offset))
 
-    def get_pending_lab_tests(self) -> List[Dict]:
-        """Get all pending lab tests"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+            results = cursor.fetchall()
 
-        cursor.execute('''
-            SELECT lt.*, p.name as patient_name, p.patient_id, v.visit_date
-            FROM lab_tests lt
-            JOIN visits v ON lt.visit_id = v.visit_id
-            JOIN patients p ON v.patient_id = p.patient_id
-            WHERE lt.status = 'pending'
-            ORDER BY lt.ordered_time
-        ''')
+            return [dict(row) for row in results]
 
-        results = cursor.fetchall()
-        conn.close()
+    def complete_lab_test(self, test_id: int, results: str,
+                          return_to_doctor: bool = False) -> Optional[tuple]:
+        """Complete a lab test with results; returns (patient name, test type)"""
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
 
-        columns = [
-            'id', 'visit_id', 'test_type', 'ordered_by', 'ordered_time',
-            'completed_time', 'results', 'status', 'patient_name',
-            'patient_id', 'visit_date'
-        ]
-        return [dict(zip(columns, row)) for row in results]
+            self._exec_retry(cursor,
+                '''
+                UPDATE lab_tests 
+                SET status = 'completed', results = ?, completed_time = ?
+                WHERE id = ?
+            ''', (results, datetime.now().isoformat(), test_id))
 
-    def complete_lab_test(self, test_id: int, results: str):
-        """Complete a lab test with results"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+            # Sent back for lab review in the same transaction as the result
+            if return_to_doctor:
+                cursor.execute(
+                    '''
+                    UPDATE visits 
+                    SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
+                    WHERE visit_id = (SELECT visit_id FROM lab_tests WHERE id = ?)
+                ''', (test_id, ))
 
-        cursor.execute(
-            '''
-            UPDATE lab_tests 
-            SET status = 'completed', results = ?, completed_time = ?
-            WHERE id = ?
-        ''', (results, datetime.now().isoformat(), test_id))
+            cursor.execute(
+                '''
+                SELECT p.name, lt.test_type 
+                FROM lab_tests lt
+                JOIN visits v ON lt.visit_id = v.visit_id
+                JOIN patients p ON v.patient_id = p.patient_id
+                WHERE lt.id = ?
+            ''', (test_id, ))
+            completed = cursor.fetchone()
 
-        conn.commit()
-        conn.close()
+        clear_todays_listings()
+        return completed
 
     def add_prescription(self,
                          visit_id: str,
@@ -1537,59 +1598,144 @@ class DatabaseManager:
                          instructions: str = "",
                          awaiting_lab: str = "no") -> int:
         """Add a prescription"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        with self._lock, self.conn:
+            cursor = self.conn.cursor()
+
+            prescription_id = self._exec_retry(cursor,
+                self._INS_PRESCRIPTION,
+                (visit_id, medication_id, medication_name, dosage, frequency,
+                 duration, instructions, awaiting_lab, datetime.now().isoformat())).fetchone()[0]
+            return prescription_id
+
+
+# Initialize database
+@st.cache_resource
+def get_db_manager():
+    return DatabaseManager()
+
+
+db = get_db_manager()
+
+
+def get_conn() -> sqlite3.Connection:
+    """DatabaseManager's write connection, for the station pages' inline writes"""
+    # One write connection for the whole app, so page transactions and
+    # DatabaseManager writes queue on one lock instead of on SQLite's.
+    # Page reads use db._reader() and never see another rerun's open writes
+    return db.conn
+
+
+def get_conn_lock() -> threading.RLock:
+    """Serializes write transactions on the shared write connection"""
+    return db._lock
+
+
+def today_bounds(day: Optional[str] = None) -> tuple:
+    """(today, tomorrow) as ISO dates for binding 'today' range filters"""
+    # Timestamps are stored in local time, so the bounds come from the local
+    # date rather than SQLite's UTC DATE('now')
+    start = date.fromisoformat(day) if day else date.today()
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
 
-        cursor.execute(
-            '''
-            INSERT INTO prescriptions 
-            (visit_id, medication_id, medication_name, dosage, frequency, duration, 
-             instructions, awaiting_lab, prescribed_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''',
-            (visit_id, medication_id, medication_name, dosage, frequency,
-             duration, instructions, awaiting_lab, datetime.now().isoformat()))
 
-        prescription_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+# Read-mostly lookups shared by every rerun; writers clear them on change
+def clear_todays_listings():
+    """Drop the cached today's listings after a write that changes them"""
+    get_pharmacy_dashboard_data.clear()
+    todays_consultations.clear()
+    todays_completed_lab_tests.clear()
 
-        return int(prescription_id) if prescription_id else 0
 
+@st.cache_data(ttl=300)
+def get_doctors() -> List[Dict]:
+    """Get all active doctors (cached)"""
+    return db.get_doctors()
 
-# Initialize database
-@st.cache_resource
-def get_db_manager():
-    return DatabaseManager()
 
+# Status changes constantly, so keep only a short TTL as a safety net
+@st.cache_data(ttl=2)
+def get_doctor_status() -> List[Dict]:
+    """Get current status of all doctors (cached)"""
+    return db.get_all_doctor_status()
+
+
+@st.cache_data(ttl=60)
+def get_locations() -> List[Dict]:
+    """Get all clinic locations (cached)"""
+    return db.get_locations()
+
+
+@st.cache_data(ttl=3600)
+def get_preset_medications() -> List[Dict]:
+    """Get all active preset medications (cached)"""
+    return db.get_preset_medications()
+
+
+@st.cache_data(ttl=3600)
+def get_medications_by_category() -> Dict[str, List[Dict]]:
+    """Get preset medications deduplicated by name and grouped by category (cached)"""
+    unique_meds = {}
+    for med in db.get_preset_medications():
+        # Keep the first occurrence of each name, with its dosages pre-split
+        unique_meds.setdefault(
+            med['medication_name'],
+            {**med, 'dosage_list': med['common_dosages'].split(', ')})
+
+    grouped = {}
+    for med in unique_meds.values():
+        grouped.setdefault(med['category'], []).append(med)
+    return dict(sorted(grouped.items()))
 
-db = get_db_manager()
+
+@st.cache_data
+def load_logo(path: str, width: int) -> bytes:
+    """Load a logo once, downscaled to twice its display width"""
+    # The logo PNGs are over 1MB; re-reading and re-hashing them on every
+    # rerun just to show a 40-300px image is wasted work
+    with Image.open(path) as image:
+        image.thumbnail((width * 2, width * 2))
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
 
 
 def show_loading_screen():
     """Display loading screen for the medical application"""
-    if 'loading_shown' not in st.session_state:
-        st.session_state.loading_shown = False
+    if st.session_state.get('loading_shown', False):
+        return
 
-    if not st.session_state.loading_shown:
-        placeholder = st.empty()
-        with placeholder.container():
-            st.markdown('<div style="margin-top: 100px;"></div>',
-                        unsafe_allow_html=True)
-            # Center the logo precisely
-            _, center_col, _ = st.columns([2, 1, 2])
-            with center_col:
-                st.image(
+    # Only emitted on the first run of a session; the browser fades the
+    # overlay out while the page renders underneath, so nothing blocks here
+    st.session_state.loading_shown = True
+    st.markdown("""
+    <style>
+    @keyframes splashFadeOut {
+        to { opacity: 0; visibility: hidden; }
+    }
+    .st-key-loading_splash {
+        position: fixed;
+        inset: 0;
+        z-index: 999999;
+        background: white;
+        padding-top: 100px;
+        pointer-events: none;
+        animation: splashFadeOut 0.4s ease 0.3s forwards;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+
+    with st.container(key="loading_splash"):
+        # Center the logo precisely
+        _, center_col, _ = st.columns([2, 1, 2])
+        with center_col:
+            st.image(
+                load_logo(
                     "attached_assets/ChatGPT Image Jun 15, 2025, 05_23_25 PM_1750024910085.png",
-                    width=200)
-            st.markdown(
-                '<p style="text-align: center; color: #666; margin-top: 30px;">Loading...</p>',
-                unsafe_allow_html=True)
-
-        time.sleep(2)
-        placeholder.empty()
-        st.session_state.loading_shown = True
-        st.rerun()
+                    200),
+                width=200)
+        st.markdown(
+            '<p style="text-align: center; color: #666; margin-top: 30px;">Loading...</p>',
+            unsafe_allow_html=True)
 
 
 def initialize_navigation():
@@ -1814,39 +1960,6 @@ def main():
         border-color: #dc2626 !important;
     }
     
-    /* Modern card styling */
-    .patient-card {
-        background: white;
-        border-radius: 16px;
-        padding: 20px;
-        margin: 12px 0;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.08);
-        border: 1px solid #f0f0f0;
-        transition: all 0.3s ease;
-    }
-    
-    .patient-card:hover {
-        transform: translateY(-4px);
-        box-shadow: 0 8px 30px rgba(0,0,0,0.12);
-    }
-    
-    .patient-card.urgent {
-        border-left: 5px solid #ff6b6b;
-        background: linear-gradient(135deg, #fff5f5 0%, #ffffff 100%);
-    }
-    
-    .patient-card.in-progress {
-        border-left: 5px solid #4ecdc4;
-        background: linear-gradient(135deg, #f0fdfc 0%, #ffffff 100%);
-    }
-    
-    .patient-card.completed {
-        border-left: 5px solid #51cf66;
-        background: linear-gradient(135deg, #f3fdf4 0%, #ffffff 100%);
-    }
-    
-
-    
     /* Modern input styling */
     .stTextInput input, .stSelectbox select, .stNumberInput input {
         border-radius: 6px !important;
@@ -2217,7 +2330,9 @@ def main():
     col1, col2, col3 = st.columns([1, 1, 1])
     with col2:
         st.image(
-            "attached_assets/ChatGPT Image Jun 15, 2025, 05_27_41 PM_1750022867924.png",
+            load_logo(
+                "attached_assets/ChatGPT Image Jun 15, 2025, 05_27_41 PM_1750022867924.png",
+                300),
             width=300)
 
     # Navigation buttons in a cleaner horizontal layout
@@ -2410,7 +2525,9 @@ def main():
         '<div style="display: flex; justify-content: center; margin-bottom: 10px;">',
         unsafe_allow_html=True)
     st.sidebar.image(
-        "attached_assets/ChatGPT Image Jun 15, 2025, 05_23_25 PM_1750022665650.png",
+        load_logo(
+            "attached_assets/ChatGPT Image Jun 15, 2025, 05_23_25 PM_1750022665650.png",
+            40),
         width=40)
     st.sidebar.markdown('</div>', unsafe_allow_html=True)
 
@@ -2444,7 +2561,7 @@ def doctor_login():
     st.markdown("### Doctor Login")
 
     db = get_db_manager()
-    doctors = db.get_doctors()
+    doctors = get_doctors()
 
     if not doctors:
         st.warning(
@@ -2457,17 +2574,15 @@ def doctor_login():
 
     # Display current doctor status in real-time
     st.markdown("#### Current Doctor Status")
-    doctor_status = db.get_all_doctor_status()
+    doctor_status = get_doctor_status()
 
     if doctor_status:
         for status in doctor_status:
-            status_color = "🟢" if status[
-                'status'] == 'available' else "🟡" if status[
-                    'status'] == 'with_patient' else "🔴"
+            status_color = DOCTOR_STATUS_EMOJI.get(status['status'], "🔴")
             patient_info = f" - {status['current_patient_name']} ({status['current_patient_id']})" if status[
                 'current_patient_id'] else ""
             st.write(
-                f"{status_color} **{status['doctor_name']}** - {status['status'].replace('_', ' ').title()}{patient_info}"
+                f"{status_color} **{status['doctor_name']}** - {DOCTOR_STATUS_LABEL.get(status['status'], status['status'])}{patient_info}"
             )
 
     st.markdown("---")
@@ -2482,15 +2597,14 @@ def doctor_login():
             st.session_state.doctor_name = selected_doctor
             
             # Check if doctor was in middle of consultation
-            conn = sqlite3.connect("clinic_database.db")
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT current_patient_id, current_patient_name, status
-                FROM doctor_status 
-                WHERE doctor_name = ?
-            ''', (selected_doctor,))
-            doctor_status = cursor.fetchone()
-            conn.close()
+            with db._reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT current_patient_id, current_patient_name, status
+                    FROM doctor_status 
+                    WHERE doctor_name = ?
+                ''', (selected_doctor,))
+                doctor_status = cursor.fetchone()
             
             if doctor_status and doctor_status[0] and doctor_status[2] == 'with_patient':
                 # Doctor was with a patient - restore consultation
@@ -2508,36 +2622,6 @@ def doctor_login():
             st.rerun()
         except Exception as e:
             st.error(f"Login error: {str(e)}")
-            # Try to fix the issue by ensuring the doctor exists in status table
-            try:
-                # Check if doctor exists in the doctors table first
-                doctors_list = db.get_doctors()
-                doctor_exists = any(doc['name'] == selected_doctor
-                                    for doc in doctors_list)
-
-                if doctor_exists:
-                    # Force create status entry
-                    conn = sqlite3.connect("clinic_database.db")
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'DELETE FROM doctor_status WHERE doctor_name = ?',
-                        (selected_doctor, ))
-                    cursor.execute(
-                        '''
-                        INSERT INTO doctor_status (doctor_name, status, last_updated)
-                        VALUES (?, ?, ?)
-                    ''', (selected_doctor, "available",
-                          datetime.now().isoformat()))
-                    conn.commit()
-                    conn.close()
-
-                    st.session_state.doctor_name = selected_doctor
-                    st.success(f"Logged in as {selected_doctor}")
-                    st.rerun()
-                else:
-                    st.error(f"Doctor {selected_doctor} not found in system")
-            except Exception as e2:
-                st.error(f"Could not fix login issue: {str(e2)}")
 
     if st.button("Back to Role Selection"):
         if 'user_role' in st.session_state:
@@ -2545,6 +2629,53 @@ def doctor_login():
         st.rerun()
 
 
+@st.cache_data(ttl=60)
+def get_local_ip() -> tuple:
+    """Find this machine's hostname and LAN address (cached)"""
+    hostname = socket.gethostname()
+
+    # The hostname often resolves to 127.0.1.1, so ask which interface would
+    # route outbound traffic instead. Connecting a UDP socket sends nothing
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect(('10.255.255.255', 1))
+            return hostname, sock.getsockname()[0]
+        except OSError:
+            # No route at all; fall back to the hostname lookup
+            return hostname, socket.gethostbyname(hostname)
+
+
+async def probe_host(ip: str, port: int, timeout: float = 0.3) -> bool:
+    """Check whether a host accepts TCP connections on the given port"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port),
+                                           timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass  # The host already answered; a reset on close doesn't matter
+    return True
+
+
+@st.cache_data(ttl=30)
+def scan_lan(local_ip: str, port: int) -> List[str]:
+    """Find other hosts on this device's /24 serving the clinic app (cached)"""
+    prefix = local_ip.rsplit('.', 1)[0]
+    hosts = [
+        ip for ip in (f"{prefix}.{i}" for i in range(1, 255)) if ip != local_ip
+    ]
+
+    # Probe every address at once so the sweep takes one timeout, not 254
+    async def sweep():
+        results = await asyncio.gather(*(probe_host(ip, port) for ip in hosts))
+        return [ip for ip, is_up in zip(hosts, results) if is_up]
+
+    return asyncio.run(sweep())
+
+
 def show_lan_status_page():
     """Display LAN connectivity status for iPad connections"""
     st.markdown("## 🌐 LAN Network Status")
@@ -2553,41 +2684,27 @@ def show_lan_status_page():
     with col1:
         st.markdown("### Connected Devices")
 
-        # Simulate checking for other devices on the network
-        import socket
-
         try:
             # Get current IP address
-            hostname = socket.gethostname()
-            local_ip = socket.gethostbyname(hostname)
+            hostname, local_ip = get_local_ip()
             st.success(f"This Device: {local_ip}")
 
-            # Show network scan status
-            st.info("Scanning for other ParakaleoMed devices on network...")
-
-            # Simulated device list (in real implementation, would scan network)
-            devices = [{
-                "name": "iPad-Triage-01",
-                "ip": "192.168.1.105",
-                "status": "Connected",
-                "role": "Triage"
-            }, {
-                "name": "iPad-Doctor-01",
-                "ip": "192.168.1.106",
-                "status": "Connected",
-                "role": "Doctor"
-            }, {
-                "name": "iPad-Pharmacy-01",
-                "ip": "192.168.1.107",
-                "status": "Offline",
-                "role": "Pharmacy"
-            }]
-
-            for device in devices:
-                status_color = "🟢" if device["status"] == "Connected" else "🔴"
-                st.markdown(
-                    f"{status_color} **{device['name']}** ({device['role']}) - {device['ip']} - {device['status']}"
-                )
+            # A loopback address means there is no LAN interface, and a /24
+            # sweep would only probe this machine
+            if ipaddress.ip_address(local_ip).is_loopback:
+                st.warning("Not connected to a network. Check WiFi connection.")
+            else:
+                # Look for other stations serving the app on the same port
+                with st.status("Scanning for other ParakaleoMed devices on network...") as scan_status:
+                    stations = scan_lan(local_ip, st.get_option("server.port"))
+                    scan_status.update(
+                        label=f"Found {len(stations)} other ParakaleoMed device(s)",
+                        state="complete")
+
+                for ip in stations:
+                    st.markdown(f"🟢 **ParakaleoMed station** - {ip} - Connected")
+                if not stations:
+                    st.caption("iPads connect through the browser and are not listed here.")
 
         except Exception:
             st.error("Unable to scan network. Check WiFi connection.")
@@ -2613,7 +2730,7 @@ def location_setup():
     )
 
     # Get existing locations
-    locations = db.get_locations()
+    locations = get_locations()
 
     tab1, tab2 = st.tabs(["Select Location", "Add New Location"])
 
@@ -2755,94 +2872,69 @@ def family_vital_signs_collection():
         st.markdown(f"*Next: {', '.join(remaining_names)}*")
 
     # Vital signs form for current family member
-    with st.form(f"family_vitals_{current_member['visit_id']}"):
+    form_key = f"family_vitals_{current_member['visit_id']}"
+    with st.form(form_key):
         st.markdown("#### Vital Signs")
 
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            systolic = st.number_input("Systolic BP",
-                                       min_value=50,
-                                       max_value=300,
-                                       value=120)
-            diastolic = st.number_input("Diastolic BP",
-                                        min_value=30,
-                                        max_value=200,
-                                        value=80)
+            st.number_input("Systolic BP",
+                            key=f"{form_key}_systolic",
+                            min_value=50,
+                            max_value=300,
+                            value=120)
+            st.number_input("Diastolic BP",
+                            key=f"{form_key}_diastolic",
+                            min_value=30,
+                            max_value=200,
+                            value=80)
 
         with col2:
-            heart_rate = st.number_input("Heart Rate (bpm)",
-                                         min_value=30,
-                                         max_value=250,
-                                         value=72)
-            temperature = st.number_input("Temperature (°F)",
-                                          min_value=90.0,
-                                          max_value=110.0,
-                                          value=98.6,
-                                          step=0.1)
+            st.number_input("Heart Rate (bpm)",
+                            key=f"{form_key}_heart_rate",
+                            min_value=30,
+                            max_value=250,
+                            value=72)
+            st.number_input("Temperature (°F)",
+                            key=f"{form_key}_temperature",
+                            min_value=90.0,
+                            max_value=110.0,
+                            value=98.6,
+                            step=0.1)
 
         with col3:
-            weight = st.number_input("Weight (kg)",
-                                     min_value=0.5,
-                                     max_value=500.0,
-                                     value=None,
-                                     step=0.1)
-            height = st.number_input("Height (inches)",
-                                     min_value=12.0,
-                                     max_value=96.0,
-                                     value=None,
-                                     step=0.5)
-            oxygen_sat = st.number_input("O2 Saturation (%)",
-                                         min_value=70,
-                                         max_value=100,
-                                         value=98)
+            st.number_input("Weight (kg)",
+                            key=f"{form_key}_weight",
+                            min_value=0.5,
+                            max_value=500.0,
+                            value=None,
+                            step=0.1)
+            st.number_input("Height (inches)",
+                            key=f"{form_key}_height",
+                            min_value=12.0,
+                            max_value=96.0,
+                            value=None,
+                            step=0.5)
+            st.number_input("O2 Saturation (%)",
+                            key=f"{form_key}_oxygen_sat",
+                            min_value=70,
+                            max_value=100,
+                            value=98)
 
         col1, col2 = st.columns([1, 1])
         with col1:
-            if st.form_submit_button("Save Vital Signs & Continue",
-                                     type="primary"):
-                # Save vital signs for current family member
-                conn = sqlite3.connect(db.db_name)
-                cursor = conn.cursor()
-
-                # First, delete any existing vital signs for this visit (in case of editing)
-                cursor.execute('DELETE FROM vital_signs WHERE visit_id = ?',
-                               (current_member['visit_id'], ))
-
-                cursor.execute(
-                    '''
-                    INSERT INTO vital_signs (visit_id, systolic_bp, diastolic_bp, heart_rate, 
-                                           temperature, weight, height, oxygen_saturation, recorded_time)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (current_member['visit_id'], systolic, diastolic,
-                      heart_rate, temperature, weight, height, oxygen_sat,
-                      datetime.now().isoformat()))
-
-                # Update visit status
-                cursor.execute(
-                    '''
-                    UPDATE visits SET triage_time = ?, status = ? WHERE visit_id = ?
-                ''', (datetime.now().isoformat(), 'waiting_consultation',
-                      current_member['visit_id']))
-
-                conn.commit()
-                conn.close()
-
-                st.success(
-                    f"✅ Vital signs recorded for {current_member['patient_name']}"
-                )
-
-                # Move to next family member
-                st.session_state.current_family_vital_index = current_index + 1
-                st.rerun()
+            st.form_submit_button("Save Vital Signs & Continue",
+                                  type="primary",
+                                  on_click=save_family_vital_signs,
+                                  args=(form_key, current_member,
+                                        current_index + 1))
 
         with col2:
-            if st.form_submit_button("Skip This Member", type="secondary"):
-                st.warning(
-                    f"Skipped vital signs for {current_member['patient_name']}"
-                )
-                st.session_state.current_family_vital_index = current_index + 1
-                st.rerun()
+            st.form_submit_button("Skip This Member",
+                                  type="secondary",
+                                  on_click=skip_family_member,
+                                  args=(current_member, current_index + 1))
 
     # Navigation buttons outside the form
     st.markdown("---")
@@ -2902,16 +2994,14 @@ def name_registration_interface():
                 
                 if st.form_submit_button("Add to Queue", type="primary"):
                     if name.strip():
-                        conn = sqlite3.connect(db.db_name)
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            INSERT INTO patient_names_queue 
-                            (name, age, gender, location_code, relationship, created_time, notes)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (name.strip(), age if age > 0 else None, gender if gender else None, location_code, 
-                             'individual', datetime.now().isoformat(), notes.strip() if notes else None))
-                        conn.commit()
-                        conn.close()
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute('''
+                                INSERT INTO patient_names_queue 
+                                (name, age, gender, location_code, relationship, created_time, notes)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ''', (name.strip(), age if age > 0 else None, gender if gender else None, location_code, 
+                                 'individual', datetime.now().isoformat(), notes.strip() if notes else None))
                         
                         # Broadcast update to all connected devices
                         broadcast_to_clients(f"new_name_registered:{name.strip()}")
@@ -2963,33 +3053,32 @@ def name_registration_interface():
                 
                 if st.form_submit_button("Add Family to Queue", type="primary"):
                     if parent_name.strip() and children_data:
-                        conn = sqlite3.connect(db.db_name)
-                        cursor = conn.cursor()
-                        
-                        # Generate family group ID
-                        family_group_id = f"FAM_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
                         
-                        # Add parent
-                        cursor.execute('''
-                            INSERT INTO patient_names_queue 
-                            (name, age, gender, location_code, relationship, family_group_id, created_time, notes)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (parent_name.strip(), parent_age if parent_age > 18 else None, parent_gender if parent_gender else None, 
-                             location_code, 'parent', family_group_id, datetime.now().isoformat(), 
-                             f"Family: {family_name}. {family_notes}" if family_notes else f"Family: {family_name}"))
+                            # Generate family group ID
+                            now_dt = datetime.now()
+                            now = now_dt.isoformat()
+                            family_group_id = f"FAM_{now_dt.strftime('%Y%m%d_%H%M%S')}"
                         
-                        # Add children
-                        for child in children_data:
+                            # Add parent
                             cursor.execute('''
                                 INSERT INTO patient_names_queue 
                                 (name, age, gender, location_code, relationship, family_group_id, created_time, notes)
                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', (child['name'], child['age'], child['gender'], location_code, 
-                                 'child', family_group_id, datetime.now().isoformat(), 
-                                 f"Child of {parent_name.strip()}"))
+                            ''', (parent_name.strip(), parent_age if parent_age > 18 else None, parent_gender if parent_gender else None, 
+                                 location_code, 'parent', family_group_id, now, 
+                                 f"Family: {family_name}. {family_notes}" if family_notes else f"Family: {family_name}"))
                         
-                        conn.commit()
-                        conn.close()
+                            # Add children
+                            for child in children_data:
+                                cursor.execute('''
+                                    INSERT INTO patient_names_queue 
+                                    (name, age, gender, location_code, relationship, family_group_id, created_time, notes)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                ''', (child['name'], child['age'], child['gender'], location_code, 
+                                     'child', family_group_id, now, 
+                                     f"Child of {parent_name.strip()}"))
                         
                         # Broadcast update to all connected devices
                         broadcast_to_clients(f"new_family_registered:{family_name}:{len(children_data) + 1}_members")
@@ -3005,17 +3094,16 @@ def name_registration_interface():
         st.markdown("### Registration Queue")
         
         # Get pending names
-        conn = sqlite3.connect(db.db_name)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, name, age, gender, relationship, family_group_id, created_time, notes, status
-            FROM patient_names_queue 
-            WHERE status = 'pending_vitals' AND location_code = ?
-            ORDER BY family_group_id, CASE WHEN relationship = 'parent' THEN 0 ELSE 1 END, created_time
-        ''', (location_code,))
+        with db._reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, name, age, gender, relationship, family_group_id, created_time, notes, status
+                FROM patient_names_queue 
+                WHERE status = 'pending_vitals' AND location_code = ?
+                ORDER BY family_group_id, CASE WHEN relationship = 'parent' THEN 0 ELSE 1 END, created_time
+            ''', (location_code,))
         
-        pending_names = cursor.fetchall()
-        conn.close()
+            pending_names = cursor.fetchall()
         
         if pending_names:
             # Group by family if applicable
@@ -3052,15 +3140,13 @@ def name_registration_interface():
                         with col2:
                             if st.button("Start Vitals", key=f"vitals_{member['id']}", type="secondary"):
                                 # Mark as processing and redirect to triage
-                                conn = sqlite3.connect(db.db_name)
-                                cursor = conn.cursor()
-                                cursor.execute('''
-                                    UPDATE patient_names_queue 
-                                    SET status = 'processing_vitals', processed_by = ?
-                                    WHERE id = ?
-                                ''', (st.session_state.get('user_name', 'Triage Staff'), member['id']))
-                                conn.commit()
-                                conn.close()
+                                with get_conn_lock(), get_conn() as conn:
+                                    cursor = conn.cursor()
+                                    cursor.execute('''
+                                        UPDATE patient_names_queue 
+                                        SET status = 'processing_vitals', processed_by = ?
+                                        WHERE id = ?
+                                    ''', (st.session_state.get('user_name', 'Triage Staff'), member['id']))
                                 
                                 # Broadcast update to all connected devices
                                 broadcast_to_clients(f"new_patient_vitals:{member['name']}")
@@ -3079,11 +3165,9 @@ def name_registration_interface():
                                 st.rerun()
                         with col3:
                             if st.button("Remove", key=f"remove_{member['id']}", type="secondary"):
-                                conn = sqlite3.connect(db.db_name)
-                                cursor = conn.cursor()
-                                cursor.execute('DELETE FROM patient_names_queue WHERE id = ?', (member['id'],))
-                                conn.commit()
-                                conn.close()
+                                with get_conn_lock(), get_conn() as conn:
+                                    cursor = conn.cursor()
+                                    cursor.execute('DELETE FROM patient_names_queue WHERE id = ?', (member['id'],))
                                 st.rerun()
             
             # Display individuals
@@ -3098,15 +3182,13 @@ def name_registration_interface():
                 with col2:
                     if st.button("Start Vitals", key=f"vitals_{individual['id']}", type="secondary"):
                         # Mark as processing and redirect to triage
-                        conn = sqlite3.connect(db.db_name)
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            UPDATE patient_names_queue 
-                            SET status = 'processing_vitals', processed_by = ?
-                            WHERE id = ?
-                        ''', (st.session_state.get('user_name', 'Triage Staff'), individual['id']))
-                        conn.commit()
-                        conn.close()
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute('''
+                                UPDATE patient_names_queue 
+                                SET status = 'processing_vitals', processed_by = ?
+                                WHERE id = ?
+                            ''', (st.session_state.get('user_name', 'Triage Staff'), individual['id']))
                         
                         # Store patient info for triage
                         st.session_state.preregistered_patient = {
@@ -3122,11 +3204,9 @@ def name_registration_interface():
                         st.rerun()
                 with col3:
                     if st.button("Remove", key=f"remove_{individual['id']}", type="secondary"):
-                        conn = sqlite3.connect(db.db_name)
-                        cursor = conn.cursor()
-                        cursor.execute('DELETE FROM patient_names_queue WHERE id = ?', (individual['id'],))
-                        conn.commit()
-                        conn.close()
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute('DELETE FROM patient_names_queue WHERE id = ?', (individual['id'],))
                         st.rerun()
         else:
             st.info("No names in registration queue. Add names in the 'Register Names' tab.")
@@ -3136,6 +3216,9 @@ def triage_interface():
     add_to_history('triage')
     st.markdown("## 🩺 Triage Station")
 
+    # Vital signs submitted on the last run; this may start the family workflow
+    finish_vital_signs()
+
     # Check if we need to collect family vital signs
     if ('family_vital_signs_queue' in st.session_state
             and st.session_state.family_vital_signs_queue
@@ -3175,17 +3258,16 @@ def preregistered_queue_view():
     location_code = st.session_state.clinic_location['country_code']
     
     # Get pre-registered patients waiting for vitals
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, name, age, gender, relationship, family_group_id, created_time, notes
-        FROM patient_names_queue 
-        WHERE status = 'pending_vitals' AND location_code = ?
-        ORDER BY family_group_id, CASE WHEN relationship = 'parent' THEN 0 ELSE 1 END, created_time
-    ''', (location_code,))
+    with db._reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, age, gender, relationship, family_group_id, created_time, notes
+            FROM patient_names_queue 
+            WHERE status = 'pending_vitals' AND location_code = ?
+            ORDER BY family_group_id, CASE WHEN relationship = 'parent' THEN 0 ELSE 1 END, created_time
+        ''', (location_code,))
     
-    pending_patients = cursor.fetchall()
-    conn.close()
+        pending_patients = cursor.fetchall()
     
     if pending_patients:
         # Group by family if applicable
@@ -3237,15 +3319,13 @@ def preregistered_queue_view():
                             visit_id = db.create_visit(patient_id)
                             
                             # Mark as processing in queue
-                            conn = sqlite3.connect(db.db_name)
-                            cursor = conn.cursor()
-                            cursor.execute('''
-                                UPDATE patient_names_queue 
-                                SET status = 'completed'
-                                WHERE id = ?
-                            ''', (member['id'],))
-                            conn.commit()
-                            conn.close()
+                            with get_conn_lock(), get_conn() as conn:
+                                cursor = conn.cursor()
+                                cursor.execute('''
+                                    UPDATE patient_names_queue 
+                                    SET status = 'completed'
+                                    WHERE id = ?
+                                ''', (member['id'],))
                             
                             # Set up vital signs workflow
                             st.session_state.pending_vitals = visit_id
@@ -3280,15 +3360,13 @@ def preregistered_queue_view():
                     visit_id = db.create_visit(patient_id)
                     
                     # Mark as processing in queue
-                    conn = sqlite3.connect(db.db_name)
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE patient_names_queue 
-                        SET status = 'completed'
-                        WHERE id = ?
-                    ''', (individual['id'],))
-                    conn.commit()
-                    conn.close()
+                    with get_conn_lock(), get_conn() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute('''
+                            UPDATE patient_names_queue 
+                            SET status = 'completed'
+                            WHERE id = ?
+                        ''', (individual['id'],))
                     
                     # Set up vital signs workflow
                     st.session_state.pending_vitals = visit_id
@@ -3700,6 +3778,9 @@ def new_patient_form():
         vital_signs_form(st.session_state.pending_vitals)
 
 
+SEARCH_PAGE_SIZE = 20
+
+
 def existing_patient_search():
     add_to_history('existing_patient_search')
     st.markdown("### Find Existing Patient")
@@ -3708,23 +3789,32 @@ def existing_patient_search():
                                  placeholder="Enter name or ID (e.g., 00001)")
 
     if search_query:
-        patients = db.search_patients(search_query)
+        # Page through results; a new query starts again at the first page
+        if st.session_state.get('search_query') != search_query:
+            st.session_state.search_query = search_query
+            st.session_state.search_page = 0
+        page = st.session_state.get('search_page', 0)
+
+        # Fetch one extra row to know whether a next page exists
+        patients = db.search_patients(search_query,
+                                      limit=SEARCH_PAGE_SIZE + 1,
+                                      offset=page * SEARCH_PAGE_SIZE)
+        has_next = len(patients) > SEARCH_PAGE_SIZE
+        patients = patients[:SEARCH_PAGE_SIZE]
 
         if patients:
             st.markdown("### Search Results:")
 
             for patient in patients:
-                with st.container():
-                    st.markdown(f"""
-                    <div class="patient-card">
-                        <h4>👤 {patient['name']}</h4>
-                        <p><strong>ID:</strong> {patient['patient_id']}</p>
-                        <p><strong>Age:</strong> {patient['age'] or 'Not specified'}</p>
-                        <p><strong>Gender:</strong> {patient['gender'] or 'Not specified'}</p>
-                        <p><strong>Last Visit:</strong> {patient['last_visit'][:10] if patient['last_visit'] else 'Never'}</p>
-                    </div>
-                    """,
-                                unsafe_allow_html=True)
+                with st.container(border=True):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.markdown(f"**👤 {patient['name']}**  \nID: `{patient['patient_id']}`")
+                        st.caption(
+                            f"Gender: {patient['gender'] or 'Not specified'} · "
+                            f"Last Visit: {patient['last_visit'][:10] if patient['last_visit'] else 'Never'}")
+                    with col2:
+                        st.metric("Age", patient['age'] or "—")
 
                     if st.button(f"Start New Visit",
                                  key=f"visit_{patient['patient_id']}",
@@ -3738,176 +3828,242 @@ def existing_patient_search():
                         st.session_state.pending_vitals = visit_id
                         st.session_state.patient_name = patient['name']
                         st.rerun()
+
+            if page > 0 or has_next:
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if page > 0 and st.button("← Previous",
+                                              key="search_prev",
+                                              use_container_width=True):
+                        st.session_state.search_page = page - 1
+                        st.rerun()
+                with col2:
+                    st.caption(f"Page {page + 1}")
+                with col3:
+                    if has_next and st.button("Next →",
+                                              key="search_next",
+                                              use_container_width=True):
+                        st.session_state.search_page = page + 1
+                        st.rerun()
         else:
             st.warning("No patients found matching your search.")
 
 
-def vital_signs_form(visit_id: str):
-    with st.form(f"vitals_{visit_id}"):
-        st.markdown("#### Vital Signs")
+# Vitals form fields, in record_vital_signs argument order; widget keys are
+# f"{form_key}_{field}"
+VITAL_SIGN_FIELDS = ('systolic', 'diastolic', 'heart_rate', 'temperature',
+                     'weight', 'height', 'oxygen_sat')
 
-        col1, col2, col3 = st.columns(3)
 
-        with col1:
-            systolic = st.number_input("Systolic BP",
-                                       min_value=50,
-                                       max_value=300,
-                                       value=120)
-            diastolic = st.number_input("Diastolic BP",
-                                        min_value=30,
-                                        max_value=200,
-                                        value=80)
+def record_vital_signs(visit_id: str, systolic, diastolic, heart_rate,
+                       temperature, weight, height, oxygen_sat,
+                       replace: bool = False):
+    """Store vitals and move the visit to the consultation queue in one transaction"""
+    with get_conn_lock(), get_conn() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        now = datetime.now().isoformat()
 
-        with col2:
-            heart_rate = st.number_input("Heart Rate (bpm)",
-                                         min_value=30,
-                                         max_value=250,
-                                         value=72)
-            temperature = st.number_input("Temperature (°F)",
-                                          min_value=90.0,
-                                          max_value=110.0,
-                                          value=98.6,
-                                          step=0.1)
+        if replace:
+            # Editing a family member's vitals replaces the earlier reading
+            conn.execute('DELETE FROM vital_signs WHERE visit_id = ?',
+                         (visit_id, ))
 
-        with col3:
-            weight = st.number_input("Weight (kg)",
-                                     min_value=0.5,
-                                     max_value=500.0,
-                                     value=None,
-                                     step=0.1)
-            height = st.number_input("Height (inches)",
-                                     min_value=12.0,
-                                     max_value=96.0,
-                                     value=None,
-                                     step=0.5)
-            oxygen_sat = st.number_input("O2 Saturation (%)",
-                                         min_value=70,
-                                         max_value=100,
-                                         value=98)
-
-        if st.form_submit_button("Save Vital Signs", type="primary"):
-            conn = sqlite3.connect(db.db_name)
-            cursor = conn.cursor()
+        conn.execute(
+            '''
+            INSERT INTO vital_signs (visit_id, systolic_bp, diastolic_bp, heart_rate, 
+                                   temperature, weight, height, oxygen_saturation, recorded_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (visit_id, systolic, diastolic, heart_rate, temperature, weight,
+              height, oxygen_sat, now))
 
-            cursor.execute(
-                '''
-                INSERT INTO vital_signs (visit_id, systolic_bp, diastolic_bp, heart_rate, 
-                                       temperature, weight, height, oxygen_saturation, recorded_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (visit_id, systolic, diastolic, heart_rate, temperature,
-                  weight, height, oxygen_sat, datetime.now().isoformat()))
+        # Update visit status
+        conn.execute(
+            '''
+            UPDATE visits SET triage_time = ?, status = ? WHERE visit_id = ?
+        ''', (now, 'waiting_consultation', visit_id))
 
-            # Update visit status
-            cursor.execute(
-                '''
-                UPDATE visits SET triage_time = ?, status = ? WHERE visit_id = ?
-            ''',
-                (datetime.now().isoformat(), 'waiting_consultation', visit_id))
 
-            conn.commit()
-            conn.close()
+def save_vital_signs(visit_id: str, form_key: str):
+    """Save Vital Signs callback; finish_vital_signs records them on the rerun"""
+    st.session_state.vitals_submitted = (
+        visit_id, tuple(st.session_state[f"{form_key}_{field}"]
+                        for field in VITAL_SIGN_FIELDS))
 
-            st.success(
-                "✅ Vital signs recorded! Patient is ready for consultation.")
 
-            # Green confirmation box
-            # Broadcast vital signs completion to all devices
-            patient_name = st.session_state.get('patient_name', 'Patient')
-            broadcast_to_clients(f"vitals_complete:{patient_name}:waiting_consultation")
-            
-            st.markdown("""
-                <div style="background-color: #d4edda; border: 1px solid #c3e6cb; border-radius: 0.375rem; padding: 1rem; margin: 0.5rem 0;">
-                    <div style="color: #155724; font-weight: bold; font-size: 1.1rem;">
-                        🟢 PATIENT SENT TO DOCTOR QUEUE
-                    </div>
-                    <div style="color: #155724; margin-top: 0.5rem;">
-                        <strong>{}</strong> is now waiting for consultation
-                    </div>
-                </div>
-            """.format(patient_name), unsafe_allow_html=True)
-
-            # Check if this patient has children - if so, start family vital signs workflow
-            patient_conn = sqlite3.connect(db.db_name)
-            patient_cursor = patient_conn.cursor()
-
-            # Get the patient ID from the visit
+def finish_vital_signs():
+    """Record submitted vital signs, confirm, and start any children's vitals"""
+    if 'vitals_submitted' not in st.session_state:
+        return
+    visit_id, values = st.session_state.pop('vitals_submitted')
+    record_vital_signs(visit_id, *values)
+
+    st.success(
+        "✅ Vital signs recorded! Patient is ready for consultation.")
+
+    # Green confirmation box
+    # Broadcast vital signs completion to all devices
+    patient_name = st.session_state.get('patient_name', 'Patient')
+    broadcast_to_clients(f"vitals_complete:{patient_name}:waiting_consultation")
+    
+    st.markdown("""
+        <div style="background-color: #d4edda; border: 1px solid #c3e6cb; border-radius: 0.375rem; padding: 1rem; margin: 0.5rem 0;">
+            <div style="color: #155724; font-weight: bold; font-size: 1.1rem;">
+                🟢 PATIENT SENT TO DOCTOR QUEUE
+            </div>
+            <div style="color: #155724; margin-top: 0.5rem;">
+                <strong>{}</strong> is now waiting for consultation
+            </div>
+        </div>
+    """.format(patient_name), unsafe_allow_html=True)
+
+    # Check if this patient has children - if so, start family vital signs workflow
+    with db._reader() as patient_conn:
+        patient_cursor = patient_conn.cursor()
+
+        # Get the patient ID from the visit
+        patient_cursor.execute(
+            'SELECT patient_id FROM visits WHERE visit_id = ?',
+            (visit_id, ))
+        patient_result = patient_cursor.fetchone()
+
+        if patient_result:
+            current_patient_id = patient_result[0]
+
+            # Check for children
             patient_cursor.execute(
-                'SELECT patient_id FROM visits WHERE visit_id = ?',
-                (visit_id, ))
-            patient_result = patient_cursor.fetchone()
+                '''
+                SELECT p.patient_id, p.name, COALESCE(p.age, 0) as age 
+                FROM patients p
+                JOIN visits v ON p.patient_id = v.patient_id
+                WHERE p.parent_id = ? AND v.visit_date >= ? AND v.visit_date < ?
+                ORDER BY COALESCE(p.age, 0) DESC
+            ''', (current_patient_id, *today_bounds()))
+
+            children = patient_cursor.fetchall()
+
+            if children:
+                # Start family vital signs workflow for children
+                family_vitals_queue = []
+                for child_id, child_name, child_age in children:
+                    # Get child's visit ID
+                    patient_cursor.execute(
+                        '''
+                        SELECT visit_id FROM visits 
+                        WHERE patient_id = ? AND visit_date >= ? AND visit_date < ?
+                        ORDER BY visit_date DESC LIMIT 1
+                    ''', (child_id, *today_bounds()))
+                    child_visit = patient_cursor.fetchone()
+
+                    if child_visit:
+                        family_vitals_queue.append({
+                            'patient_id':
+                            child_id,
+                            'patient_name':
+                            child_name,
+                            'visit_id':
+                            child_visit[0],
+                            'relationship':
+                            'child',
+                            'age':
+                            child_age
+                        })
 
-            if patient_result:
-                current_patient_id = patient_result[0]
+                if family_vitals_queue:
+                    st.session_state.family_vital_signs_queue = family_vitals_queue
+                    st.session_state.current_family_vital_index = 0
+                    st.session_state.family_workflow_active = True
 
-                # Check for children
-                patient_cursor.execute(
-                    '''
-                    SELECT p.patient_id, p.name, COALESCE(p.age, 0) as age 
-                    FROM patients p
-                    JOIN visits v ON p.patient_id = v.patient_id
-                    WHERE p.parent_id = ? AND DATE(v.visit_date) = DATE('now')
-                    ORDER BY COALESCE(p.age, 0) DESC
-                ''', (current_patient_id, ))
-
-                children = patient_cursor.fetchall()
-                patient_conn.close()
-
-                if children:
-                    # Start family vital signs workflow for children
-                    family_vitals_queue = []
-                    for child_id, child_name, child_age in children:
-                        # Get child's visit ID
-                        child_conn = sqlite3.connect(db.db_name)
-                        child_cursor = child_conn.cursor()
-                        child_cursor.execute(
-                            '''
-                            SELECT visit_id FROM visits 
-                            WHERE patient_id = ? AND DATE(visit_date) = DATE('now')
-                            ORDER BY visit_date DESC LIMIT 1
-                        ''', (child_id, ))
-                        child_visit = child_cursor.fetchone()
-                        child_conn.close()
-
-                        if child_visit:
-                            family_vitals_queue.append({
-                                'patient_id':
-                                child_id,
-                                'patient_name':
-                                child_name,
-                                'visit_id':
-                                child_visit[0],
-                                'relationship':
-                                'child',
-                                'age':
-                                child_age
-                            })
+                    # Clear the pending vitals to stop showing parent form
+                    if 'pending_vitals' in st.session_state:
+                        del st.session_state.pending_vitals
+                    if 'patient_name' in st.session_state:
+                        del st.session_state.patient_name
+
+                    st.success(
+                        f"✅ Parent vital signs recorded! Now collecting vital signs for {len(family_vitals_queue)} children."
+                    )
+                    return  # Exit early to start children's vital signs workflow
 
-                    if family_vitals_queue:
-                        st.session_state.family_vital_signs_queue = family_vitals_queue
-                        st.session_state.current_family_vital_index = 0
-                        st.session_state.family_workflow_active = True
+    # Only clear session state if no children workflow was started
+    if 'pending_vitals' in st.session_state:
+        del st.session_state.pending_vitals
+    if 'patient_name' in st.session_state:
+        del st.session_state.patient_name
 
-                        # Clear the pending vitals to stop showing parent form
-                        if 'pending_vitals' in st.session_state:
-                            del st.session_state.pending_vitals
-                        if 'patient_name' in st.session_state:
-                            del st.session_state.patient_name
 
-                        st.success(
-                            f"✅ Parent vital signs recorded! Now collecting vital signs for {len(family_vitals_queue)} children."
-                        )
-                        st.rerun()
-                        return  # Exit early to start children's vital signs workflow
-            else:
-                patient_conn.close()
+def save_family_vital_signs(form_key: str, member: Dict, next_index: int):
+    """Save & Continue callback for the family vitals form"""
+    record_vital_signs(member['visit_id'],
+                       *(st.session_state[f"{form_key}_{field}"]
+                         for field in VITAL_SIGN_FIELDS),
+                       replace=True)
+    st.success(f"✅ Vital signs recorded for {member['patient_name']}")
 
-            # Only clear session state if no children workflow was started
-            if 'pending_vitals' in st.session_state:
-                del st.session_state.pending_vitals
-            if 'patient_name' in st.session_state:
-                del st.session_state.patient_name
+    # Move to next family member
+    st.session_state.current_family_vital_index = next_index
 
-            st.rerun()
+
+def skip_family_member(member: Dict, next_index: int):
+    """Skip callback for the family vitals form"""
+    st.warning(f"Skipped vital signs for {member['patient_name']}")
+    st.session_state.current_family_vital_index = next_index
+
+
+def vital_signs_form(visit_id: str):
+    form_key = f"vitals_{visit_id}"
+    with st.form(form_key):
+        st.markdown("#### Vital Signs")
+
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.number_input("Systolic BP",
+                            key=f"{form_key}_systolic",
+                            min_value=50,
+                            max_value=300,
+                            value=120)
+            st.number_input("Diastolic BP",
+                            key=f"{form_key}_diastolic",
+                            min_value=30,
+                            max_value=200,
+                            value=80)
+
+        with col2:
+            st.number_input("Heart Rate (bpm)",
+                            key=f"{form_key}_heart_rate",
+                            min_value=30,
+                            max_value=250,
+                            value=72)
+            st.number_input("Temperature (°F)",
+                            key=f"{form_key}_temperature",
+                            min_value=90.0,
+                            max_value=110.0,
+                            value=98.6,
+                            step=0.1)
+
+        with col3:
+            st.number_input("Weight (kg)",
+                            key=f"{form_key}_weight",
+                            min_value=0.5,
+                            max_value=500.0,
+                            value=None,
+                            step=0.1)
+            st.number_input("Height (inches)",
+                            key=f"{form_key}_height",
+                            min_value=12.0,
+                            max_value=96.0,
+                            value=None,
+                            step=0.5)
+            st.number_input("O2 Saturation (%)",
+                            key=f"{form_key}_oxygen_sat",
+                            min_value=70,
+                            max_value=100,
+                            value=98)
+
+        st.form_submit_button("Save Vital Signs",
+                              type="primary",
+                              on_click=save_vital_signs,
+                              args=(visit_id, form_key))
 
 
 def patient_queue_monitor_interface():
@@ -3922,86 +4078,61 @@ def patient_queue_view():
     add_to_history('patient_queue')
     st.markdown("### Current Patient Queue")
 
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT v.visit_id, v.patient_id, p.name, v.status, v.priority, v.visit_date
-        FROM visits v
-        JOIN patients p ON v.patient_id = p.patient_id
-        WHERE DATE(v.visit_date) = DATE('now')
-        ORDER BY 
-            CASE v.priority 
-                WHEN 'critical' THEN 1 
-                WHEN 'urgent' THEN 2 
-                ELSE 3 
-            END,
-            v.visit_date
-    ''')
-
-    queue = cursor.fetchall()
-    conn.close()
-
-    if queue:
-        for visit in queue:
+    with db._reader() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT v.visit_id, v.patient_id, p.name, v.status, v.priority, v.visit_date
+            FROM visits v
+            JOIN patients p ON v.patient_id = p.patient_id
+            WHERE v.visit_date >= ? AND v.visit_date < ?
+            ORDER BY v.priority_rank, v.visit_date
+        ''', today_bounds())
+
+        # Render cards straight off the cursor so the first ones reach the
+        # browser before the rest of the queue has been read
+        queue_empty = True
+        for visit in cursor:
+            queue_empty = False
             visit_id, patient_id, name, status, priority, visit_date = visit
 
-            status_class = ""
-            if status == "completed":
-                status_class = "completed"
-            elif status in ["consultation", "prescribed"]:
-                status_class = "in-progress"
-            elif priority == "critical":
-                status_class = "urgent"
-
-            priority_emoji = "🔴" if priority == "critical" else "🟡" if priority == "urgent" else "🟢"
-            status_emoji = {
-                "triage": "📝",
-                "waiting_consultation": "⏳",
-                "consultation": "👨‍⚕️",
-                "prescribed": "💊",
-                "completed": "✅"
-            }.get(status, "❓")
-
-            st.markdown(f"""
-            <div class="patient-card {status_class}">
-                <h4>{priority_emoji} {name} (ID: {patient_id})</h4>
-                <p><strong>Status:</strong> {status_emoji} {status.replace('_', ' ').title()}</p>
-                <p><strong>Visit ID:</strong> {visit_id}</p>
-                <p><strong>Time:</strong> {visit_date[:16].replace('T', ' ')}</p>
-            </div>
-            """,
-                        unsafe_allow_html=True)
-    else:
-        st.info("No patients in queue for today.")
+            priority_emoji = PRIORITY_EMOJI.get(priority, "🟢")
+            status_emoji = STATUS_EMOJI.get(status, "❓")
+
+            with st.container(border=True):
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.markdown(f"**{priority_emoji} {name}** (ID: {patient_id})")
+                    st.caption(
+                        f"Visit ID: {visit_id} · {visit_date[:16].replace('T', ' ')}")
+                with col2:
+                    st.markdown(
+                        f"{status_emoji} {status.replace('_', ' ').title()}")
 
+    if queue_empty:
+        st.info("No patients in queue for today.")
 
-def doctor_interface():
-    add_to_history('doctor')
-    st.markdown(
-        f"## 👨‍⚕️ Doctor Consultation - {st.session_state.doctor_name}")
 
-    # Update doctor status and show real-time status of all doctors
+@st.fragment(run_every="5s")
+def doctor_status_panel():
+    """Real-time status of all doctors, refreshed without rerunning the page"""
     db = get_db_manager()
 
-    # Display real-time doctor status at top
     with st.expander("📊 Real-Time Doctor Status", expanded=False):
-        doctor_status = db.get_all_doctor_status()
+        doctor_status = get_doctor_status()
         if doctor_status:
             for status in doctor_status:
-                status_color = "🟢" if status[
-                    'status'] == 'available' else "🟡" if status[
-                        'status'] == 'with_patient' else "🔴"
+                status_color = DOCTOR_STATUS_EMOJI.get(status['status'], "🔴")
                 patient_info = f" - {status['current_patient_name']} ({status['current_patient_id']})" if status[
                     'current_patient_id'] else ""
 
                 if status['doctor_name'] == st.session_state.doctor_name:
                     st.markdown(
-                        f"**{status_color} {status['doctor_name']} (YOU)** - {status['status'].replace('_', ' ').title()}{patient_info}"
+                        f"**{status_color} {status['doctor_name']} (YOU)** - {DOCTOR_STATUS_LABEL.get(status['status'], status['status'])}{patient_info}"
                     )
                 else:
                     st.write(
-                        f"{status_color} {status['doctor_name']} - {status['status'].replace('_', ' ').title()}{patient_info}"
+                        f"{status_color} {status['doctor_name']} - {DOCTOR_STATUS_LABEL.get(status['status'], status['status'])}{patient_info}"
                     )
 
         if st.button("🚪 Logout"):
@@ -4009,6 +4140,15 @@ def doctor_interface():
             del st.session_state.doctor_name
             st.rerun()
 
+
+def doctor_interface():
+    add_to_history('doctor')
+    st.markdown(
+        f"## 👨‍⚕️ Doctor Consultation - {st.session_state.doctor_name}")
+
+    # Display real-time doctor status at top; it refreshes on its own
+    doctor_status_panel()
+
     tab1, tab2 = st.tabs(["Patient Consultation", "Consultation History"])
 
     with tab1:
@@ -4020,34 +4160,39 @@ def doctor_interface():
 
 def consultation_interface():
     add_to_history('consultation_interface')
+
+    # Skip the waiting-patients query and widgets while a consultation is open
+    consultation = st.session_state.get('active_consultation')
+    if isinstance(consultation, dict):
+        st.info(f"Consultation in progress with {consultation['patient_name']}")
+        if st.button("Return to Consultation", type="primary"):
+            st.session_state.page = 'consultation_form'
+            st.rerun()
+        return
+
     st.markdown("### Select Patient for Consultation")
 
     # Get patients waiting for consultation, including family relationships
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT v.visit_id, v.patient_id, p.name, v.priority, vs.systolic_bp, 
-               vs.diastolic_bp, vs.heart_rate, vs.temperature, p.parent_id, p.relationship,
-               v.return_reason, v.consultation_time
-        FROM visits v
-        JOIN patients p ON v.patient_id = p.patient_id
-        LEFT JOIN vital_signs vs ON v.visit_id = vs.visit_id
-        WHERE v.status = 'waiting_consultation' AND DATE(v.visit_date) = DATE('now')
-        ORDER BY 
-            CASE WHEN v.return_reason = 'pharmacy_lab_review' THEN 0 ELSE 1 END,
-            CASE WHEN p.parent_id IS NULL THEN 0 ELSE 1 END,
-            COALESCE(p.parent_id, p.patient_id),
-            CASE v.priority 
-                WHEN 'critical' THEN 1 
-                WHEN 'urgent' THEN 2 
-                ELSE 3 
-            END,
-            v.visit_date
-    ''')
-
-    waiting_patients = cursor.fetchall()
-    conn.close()
+    with db._reader() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT v.visit_id, v.patient_id, p.name, v.priority, vs.systolic_bp, 
+                   vs.diastolic_bp, vs.heart_rate, vs.temperature, p.parent_id, p.relationship,
+                   v.return_reason, v.consultation_time
+            FROM visits v
+            JOIN patients p ON v.patient_id = p.patient_id
+            LEFT JOIN vital_signs vs ON v.visit_id = vs.visit_id
+            WHERE v.status = 'waiting_consultation' AND v.visit_date >= ? AND v.visit_date < ?
+            ORDER BY 
+                CASE WHEN v.return_reason = 'pharmacy_lab_review' THEN 0 ELSE 1 END,
+                CASE WHEN p.parent_id IS NULL THEN 0 ELSE 1 END,
+                COALESCE(p.parent_id, p.patient_id),
+                v.priority_rank,
+                v.visit_date
+        ''', today_bounds())
+
+        waiting_patients = cursor.fetchall()
 
     # Group patients by family
     families = {}
@@ -4100,21 +4245,26 @@ def consultation_interface():
     if lab_return_patients:
         st.markdown("#### 🧪 PRIORITY: Patients with Lab Results")
         st.markdown("*These patients have already been seen and returned from pharmacy/lab for result review*")
+
+        # Get lab results for every returning patient in one query
+        with db._reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT lt.visit_id, lt.test_type, lt.results, lt.completed_time
+                FROM lab_tests lt
+                JOIN visits v ON lt.visit_id = v.visit_id
+                WHERE lt.status = 'completed' AND v.status = 'waiting_consultation'
+                    AND v.return_reason = 'pharmacy_lab_review'
+                    AND v.visit_date >= ? AND v.visit_date < ?
+                ORDER BY lt.completed_time DESC
+            ''', today_bounds())
+            lab_results_by_visit = {}
+            for lab_visit_id, test_type, results, completed_time in cursor.fetchall():
+                lab_results_by_visit.setdefault(lab_visit_id, []).append(
+                    (test_type, results, completed_time))
         
         for patient in lab_return_patients:
-            # Get lab results for this patient
-            conn_lab = sqlite3.connect("clinic_database.db")
-            cursor_lab = conn_lab.cursor()
-            
-            cursor_lab.execute('''
-                SELECT test_type, results, completed_time
-                FROM lab_tests
-                WHERE visit_id = ? AND status = 'completed'
-                ORDER BY completed_time DESC
-            ''', (patient['visit_id'],))
-            
-            lab_results = cursor_lab.fetchall()
-            conn_lab.close()
+            lab_results = lab_results_by_visit.get(patient['visit_id'], [])
             
             with st.expander(f"🔄 **LAB RESULTS READY** - {patient['name']} (ID: {patient['patient_id']})", expanded=True):
                 
@@ -4176,31 +4326,13 @@ def consultation_interface():
                                 type="primary", 
                                 use_container_width=True):
                         # Load existing consultation data from database for restoration
-                        conn_restore = sqlite3.connect("clinic_database.db")
-                        cursor_restore = conn_restore.cursor()
-                        cursor_restore.execute('''
-                            SELECT chief_complaint, symptoms, diagnosis, treatment_plan, notes,
-                                   surgical_history, medical_history, allergies, current_medications
-                            FROM visits 
-                            WHERE visit_id = ?
-                        ''', (patient['visit_id'],))
-                        consultation_data = cursor_restore.fetchone()
-                        conn_restore.close()
+                        consultation_data = get_db_manager().get_visit_consultation(
+                            patient['visit_id'])
                         
                         # Store consultation data in session state for restoration
                         consultation_key = f"consultation_data_{patient['visit_id']}"
                         if consultation_data:
-                            st.session_state[consultation_key] = {
-                                'chief_complaint': consultation_data[0] or '',
-                                'symptoms': consultation_data[1] or '',
-                                'diagnosis': consultation_data[2] or '',
-                                'treatment_plan': consultation_data[3] or '',
-                                'notes': consultation_data[4] or '',
-                                'surgical_history': consultation_data[5] or '',
-                                'medical_history': consultation_data[6] or '',
-                                'allergies': consultation_data[7] or '',
-                                'current_medications': consultation_data[8] or ''
-                            }
+                            st.session_state[consultation_key] = consultation_data
                         
                         st.session_state.active_consultation = {
                             'visit_id': patient['visit_id'],
@@ -4210,7 +4342,6 @@ def consultation_interface():
                             'lab_results': lab_results
                         }
                         # Update doctor status
-                        db = get_db_manager()
                         db.update_doctor_status(
                             st.session_state.doctor_name, "with_patient",
                             patient['patient_id'],
@@ -4228,9 +4359,7 @@ def consultation_interface():
             children = family_data['children']
 
             if parent:
-                priority_emoji = "🔴" if parent[
-                    'priority'] == "critical" else "🟡" if parent[
-                        'priority'] == "urgent" else "🟢"
+                priority_emoji = PRIORITY_EMOJI.get(parent['priority'], "🟢")
 
                 with st.expander(
                         f"{priority_emoji} **Family Consultation:** {parent['name']} + {len(children)} children",
@@ -4267,7 +4396,6 @@ def consultation_interface():
                                 'patient_name': parent['name']
                             }
                             # Update doctor status
-                            db = get_db_manager()
                             db.update_doctor_status(
                                 st.session_state.doctor_name, "with_patient",
                                 parent['patient_id'],
@@ -4286,9 +4414,7 @@ def consultation_interface():
     if individual_patients:
         st.markdown("#### 👤 Individual Patients")
         for patient in individual_patients:
-            priority_emoji = "🔴" if patient[
-                'priority'] == "critical" else "🟡" if patient[
-                    'priority'] == "urgent" else "🟢"
+            priority_emoji = PRIORITY_EMOJI.get(patient['priority'], "🟢")
 
             with st.expander(
                     f"{priority_emoji} {patient['name']} (ID: {patient['patient_id']})",
@@ -4313,7 +4439,6 @@ def consultation_interface():
                                 'patient_name': patient['name']
                             }
                             # Update doctor status
-                            db = get_db_manager()
                             db.update_doctor_status(
                                 st.session_state.doctor_name, "with_patient",
                                 patient['patient_id'], patient['name'])
@@ -4408,29 +4533,8 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
             
             # If no session data, check database for previous consultation
             if not existing_data:
-                conn = sqlite3.connect("clinic_database.db")
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT chief_complaint, symptoms, diagnosis, treatment_plan, notes,
-                           surgical_history, medical_history, allergies, current_medications
-                    FROM visits 
-                    WHERE visit_id = ?
-                ''', (visit_id,))
-                db_data = cursor.fetchone()
-                conn.close()
-                
-                if db_data:
-                    existing_data = {
-                        'chief_complaint': db_data[0] or '',
-                        'symptoms': db_data[1] or '',
-                        'diagnosis': db_data[2] or '',
-                        'treatment_plan': db_data[3] or '',
-                        'notes': db_data[4] or '',
-                        'surgical_history': db_data[5] or '',
-                        'medical_history': db_data[6] or '',
-                        'allergies': db_data[7] or '',
-                        'current_medications': db_data[8] or ''
-                    }
+                existing_data = get_db_manager().get_visit_consultation(
+                    visit_id) or {}
             
             # History Section (above chief complaint)
             st.markdown("#### Patient History")
@@ -4497,18 +4601,16 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
                 }
                 
                 # Update database with consultation details
-                conn = sqlite3.connect("clinic_database.db")
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE visits 
-                    SET chief_complaint = ?, symptoms = ?, diagnosis = ?, 
-                        treatment_plan = ?, notes = ?, surgical_history = ?,
-                        medical_history = ?, allergies = ?, current_medications = ?
-                    WHERE visit_id = ?
-                ''', (chief_complaint, symptoms, diagnosis, treatment_plan, notes,
-                      surgical_history, medical_history, allergies, current_medications, visit_id))
-                conn.commit()
-                conn.close()
+                with get_conn_lock(), get_conn() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        UPDATE visits 
+                        SET chief_complaint = ?, symptoms = ?, diagnosis = ?, 
+                            treatment_plan = ?, notes = ?, surgical_history = ?,
+                            medical_history = ?, allergies = ?, current_medications = ?
+                        WHERE visit_id = ?
+                    ''', (chief_complaint, symptoms, diagnosis, treatment_plan, notes,
+                          surgical_history, medical_history, allergies, current_medications, visit_id))
                 
                 st.success("Consultation updated successfully!")
                 st.info("Continue to Lab & Prescriptions tab to complete the re-consultation.")
@@ -4657,124 +4759,76 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
         # Prescriptions section - outside form for immediate checkbox updates
         st.markdown("#### Prescriptions")
 
-        # Get preset medications and deduplicate by name
         db_manager = get_db_manager()
-        preset_meds = db_manager.get_preset_medications()
-
-        # Deduplicate medications by name (keep first occurrence)
-        unique_meds = {}
-        for med in preset_meds:
-            med_name = med['medication_name']
-            if med_name not in unique_meds:
-                unique_meds[med_name] = med
-
-        deduplicated_meds = list(unique_meds.values())
-        med_categories = list(
-            set(med['category'] for med in deduplicated_meds))
-
         selected_medications = []
 
-        for category in sorted(med_categories):
-            with st.expander(f"{category} Medications"):
-                category_meds = [
-                    med for med in deduplicated_meds
-                    if med['category'] == category
-                ]
+        # One editable table for the whole formulary instead of a widget set
+        # per medication; rows restore any selections saved before a lab visit
+        freq_options = ["Once daily", "Twice daily", "Three times daily", "Four times daily", "As needed"]
+        dur_options = ["3 days", "5 days", "7 days", "10 days", "14 days", "30 days"]
+        saved_meds = previous_selections.get('medications', {})
+        med_rows = []
+        for category, category_meds in get_medications_by_category().items():
+            for med in category_meds:
+                prev_med_data = saved_meds.get(f"med_{med['id']}", {})
+                dosages = med['dosage_list']
+                med_rows.append({
+                    'id': med['id'],
+                    'Select': prev_med_data.get('selected', False),
+                    'Medication': med['medication_name'],
+                    'Category': category,
+                    'Common Dosages': med['common_dosages'],
+                    'Dosage': prev_med_data.get('dosage') or dosages[0],
+                    'Frequency': prev_med_data.get('frequency') if prev_med_data.get('frequency') in freq_options else freq_options[0],
+                    'Duration': prev_med_data.get('duration') if prev_med_data.get('duration') in dur_options else dur_options[0],
+                    'Dosage for Pharmacy': prev_med_data.get('pharmacy_dosage', ''),
+                    'Indication': prev_med_data.get('indication', ''),
+                    'Instructions': prev_med_data.get('instructions', ''),
+                    'Awaiting Lab': prev_med_data.get('awaiting_lab', 'no') == 'yes',
+                    'Return to Provider': False,
+                })
 
-                for med in category_meds:
-                    # Check if this medication was previously selected
-                    med_key = f"med_{med['id']}"
-                    was_previously_selected = previous_selections.get('medications', {}).get(med_key, {}).get('selected', False)
-                    
-                    # Medication checkbox
-                    selected = st.checkbox(f"{med['medication_name']}",
-                                           value=was_previously_selected,
-                                           key=f"med_{med['id']}_{visit_id}")
+        edited_rows = st.data_editor(
+            med_rows,
+            key=f"med_editor_{visit_id}",
+            hide_index=True,
+            num_rows="fixed",
+            use_container_width=True,
+            column_order=[
+                'Select', 'Medication', 'Category', 'Common Dosages', 'Dosage',
+                'Frequency', 'Duration', 'Dosage for Pharmacy', 'Indication',
+                'Instructions', 'Awaiting Lab', 'Return to Provider'
+            ],
+            disabled=['Medication', 'Category', 'Common Dosages'],
+            column_config={
+                'Select': st.column_config.CheckboxColumn("Select", width="small"),
+                'Dosage': st.column_config.TextColumn("Dosage"),
+                'Frequency': st.column_config.SelectboxColumn(
+                    "Frequency", options=freq_options, required=True),
+                'Duration': st.column_config.SelectboxColumn(
+                    "Duration", options=dur_options, required=True),
+                'Awaiting Lab': st.column_config.CheckboxColumn("Awaiting Lab"),
+                'Return to Provider': st.column_config.CheckboxColumn(
+                    "Return to Provider",
+                    help="Only applies when awaiting lab results"),
+            })
 
-                    # Show additional fields immediately when medication is checked
-                    if selected:
-                        with st.container():
-                            st.markdown("---")
-                            
-                            # Get previously saved values for this medication
-                            prev_med_data = previous_selections.get('medications', {}).get(med_key, {})
-                            
-                            # Dosage and frequency options
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                dosages = med['common_dosages'].split(', ')
-                                prev_dosage_idx = 0
-                                if prev_med_data.get('dosage') in dosages:
-                                    prev_dosage_idx = dosages.index(prev_med_data.get('dosage'))
-                                selected_dosage = st.selectbox(
-                                    "Dosage", dosages, 
-                                    index=prev_dosage_idx,
-                                    key=f"dosage_{med['id']}_{visit_id}")
-                            with col2:
-                                freq_options = ["Once daily", "Twice daily", "Three times daily", "Four times daily", "As needed"]
-                                prev_freq_idx = 0
-                                if prev_med_data.get('frequency') in freq_options:
-                                    prev_freq_idx = freq_options.index(prev_med_data.get('frequency'))
-                                frequency = st.selectbox("Frequency", freq_options,
-                                                        index=prev_freq_idx,
-                                                        key=f"freq_{med['id']}_{visit_id}")
-                            with col3:
-                                dur_options = ["3 days", "5 days", "7 days", "10 days", "14 days", "30 days"]
-                                prev_dur_idx = 0
-                                if prev_med_data.get('duration') in dur_options:
-                                    prev_dur_idx = dur_options.index(prev_med_data.get('duration'))
-                                duration = st.selectbox("Duration", dur_options,
-                                                       index=prev_dur_idx,
-                                                       key=f"dur_{med['id']}_{visit_id}")
-
-                            # Additional fields
-                            col4, col5 = st.columns(2)
-                            with col4:
-                                pharmacy_dosage = st.text_input(
-                                    "Dosage for Pharmacy",
-                                    value=prev_med_data.get('pharmacy_dosage', ''),
-                                    placeholder="e.g., 500mg twice daily for 7 days",
-                                    key=f"pharma_dose_{med['id']}_{visit_id}")
-                            with col5:
-                                indication = st.text_input(
-                                    "Indication",
-                                    value=prev_med_data.get('indication', ''),
-                                    placeholder="e.g., UTI, hypertension",
-                                    key=f"indication_{med['id']}_{visit_id}")
-
-                            instructions = st.text_input("Special Instructions",
-                                                         value=prev_med_data.get('instructions', ''),
-                                                         key=f"inst_{med['id']}_{visit_id}")
-
-                            # Lab results options with indentation - restore previous values
-                            st.markdown("&nbsp;&nbsp;&nbsp;&nbsp;**Lab Options:**", unsafe_allow_html=True)
-                            col_indent, col_lab = st.columns([0.1, 0.9])
-                            with col_lab:
-                                prev_awaiting_lab = prev_med_data.get('awaiting_lab', 'no') == 'yes'
-                                awaiting_lab = "yes" if st.checkbox(
-                                    "Awaiting Lab Results",
-                                    key=f"await_{med['id']}_{visit_id}",
-                                    value=prev_awaiting_lab) else "no"
-                                
-                                return_to_provider = "no"
-                                if awaiting_lab == "yes":
-                                    return_to_provider = "yes" if st.checkbox(
-                                        "Return to provider after lab results",
-                                        key=f"return_{med['id']}_{visit_id}",
-                                        value=False) else "no"
-
-                            selected_medications.append({
-                                'id': med['id'],
-                                'name': med['medication_name'],
-                                'dosage': selected_dosage,
-                                'frequency': frequency,
-                                'duration': duration,
-                                'instructions': instructions,
-                                'awaiting_lab': awaiting_lab,
-                                'return_to_provider': return_to_provider,
-                                'pharmacy_notes': pharmacy_dosage,
-                                'indication': indication
-                            })
+        for row in edited_rows:
+            if not row['Select']:
+                continue
+            awaiting_lab = "yes" if row['Awaiting Lab'] else "no"
+            selected_medications.append({
+                'id': row['id'],
+                'name': row['Medication'],
+                'dosage': row['Dosage'] or '',
+                'frequency': row['Frequency'],
+                'duration': row['Duration'],
+                'instructions': row['Instructions'] or '',
+                'awaiting_lab': awaiting_lab,
+                'return_to_provider': "yes" if awaiting_lab == "yes" and row['Return to Provider'] else "no",
+                'pharmacy_notes': row['Dosage for Pharmacy'] or '',
+                'indication': row['Indication'] or ''
+            })
 
         # Custom medication section
         with st.expander("Add Custom Medication"):
@@ -4858,80 +4912,125 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
                 elif current_doctor_name and (current_chief_complaint or len(selected_medications) > 0 or len(lab_tests) > 0):
                     try:
                         # Save consultation state immediately to database for later resumption
-                        db_conn = sqlite3.connect(db_manager.db_name, timeout=10.0)
-                        db_conn.execute('BEGIN IMMEDIATE')
-                        cursor = db_conn.cursor()
+                        with get_conn_lock(), get_conn() as db_conn:
+                            db_conn.execute('BEGIN IMMEDIATE')
+                            cursor = db_conn.cursor()
+                            now = datetime.now().isoformat()
 
-                        # Save complete consultation state to visits table
-                        cursor.execute('''
-                            UPDATE visits 
-                            SET chief_complaint = ?, symptoms = ?, diagnosis = ?, 
-                                treatment_plan = ?, notes = ?, surgical_history = ?,
-                                medical_history = ?, allergies = ?, current_medications = ?,
-                                consultation_time = ?
-                            WHERE visit_id = ?
-                        ''', (current_chief_complaint, consultation_data.get('symptoms', ''), 
-                              consultation_data.get('diagnosis', ''), consultation_data.get('treatment_plan', ''),
-                              consultation_data.get('notes', ''), consultation_data.get('surgical_history', ''),
-                              consultation_data.get('medical_history', ''), consultation_data.get('allergies', ''),
-                              consultation_data.get('current_medications', ''), datetime.now().isoformat(), visit_id))
-
-                        # Also save to consultations table for tracking
-                        cursor.execute(
-                            '''
-                            INSERT INTO consultations (visit_id, doctor_name, chief_complaint, 
-                                                     symptoms, diagnosis, treatment_plan, notes, 
-                                                     needs_ophthalmology, consultation_time)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (visit_id, current_doctor_name, current_chief_complaint, 
-                              consultation_data.get('symptoms', ''), consultation_data.get('diagnosis', ''),
-                              consultation_data.get('treatment_plan', ''), consultation_data.get('notes', ''),
-                              needs_ophthalmology, datetime.now().isoformat()))
-
-                        # Check if this is a re-consultation (patient returning from lab)
-                        cursor.execute('''
-                            SELECT COUNT(*) FROM lab_tests 
-                            WHERE visit_id = ? AND status = 'completed'
-                        ''', (visit_id,))
-                        completed_labs = cursor.fetchone()[0]
-                        
-                        # Determine consultation status and handle prescription state
-                        has_lab_dependent_meds = any(med['awaiting_lab'] == 'yes' for med in selected_medications)
-                        
-                        if lab_tests and not completed_labs:
-                            # Initial consultation with lab orders - save consultation in paused state
-                            new_status = 'waiting_lab'
-                        elif completed_labs > 0:
-                            # Re-consultation after lab results - send back to pharmacy with cleared return reason
-                            new_status = 'prescribed'
-                            # Clear return_reason to prevent repeated lab returns
+                            # Save complete consultation state to visits table
                             cursor.execute('''
                                 UPDATE visits 
-                                SET return_reason = NULL 
+                                SET chief_complaint = ?, symptoms = ?, diagnosis = ?, 
+                                    treatment_plan = ?, notes = ?, surgical_history = ?,
+                                    medical_history = ?, allergies = ?, current_medications = ?,
+                                    consultation_time = ?
                                 WHERE visit_id = ?
-                            ''', (visit_id,))
-                            st.info("Patient being sent back to pharmacy with updated prescriptions based on lab results.")
-                        elif needs_ophthalmology:
-                            new_status = 'needs_ophthalmology'
-                        elif selected_medications:
-                            new_status = 'prescribed'
-                        else:
-                            new_status = 'completed'
+                            ''', (current_chief_complaint, consultation_data.get('symptoms', ''), 
+                                  consultation_data.get('diagnosis', ''), consultation_data.get('treatment_plan', ''),
+                                  consultation_data.get('notes', ''), consultation_data.get('surgical_history', ''),
+                                  consultation_data.get('medical_history', ''), consultation_data.get('allergies', ''),
+                                  consultation_data.get('current_medications', ''), now, visit_id))
 
-                        cursor.execute(
-                            '''
-                            UPDATE visits SET consultation_time = ?, status = ? WHERE visit_id = ?
-                        ''',
-                            (datetime.now().isoformat(), new_status, visit_id))
+                            # Also save to consultations table for tracking
+                            cursor.execute(
+                                '''
+                                INSERT INTO consultations (visit_id, doctor_name, chief_complaint, 
+                                                         symptoms, diagnosis, treatment_plan, notes, 
+                                                         needs_ophthalmology, consultation_time)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (visit_id, current_doctor_name, current_chief_complaint, 
+                                  consultation_data.get('symptoms', ''), consultation_data.get('diagnosis', ''),
+                                  consultation_data.get('treatment_plan', ''), consultation_data.get('notes', ''),
+                                  needs_ophthalmology, now))
+
+                            # Check if this is a re-consultation (patient returning from lab)
+                            cursor.execute('''
+                                SELECT COUNT(*) FROM lab_tests 
+                                WHERE visit_id = ? AND status = 'completed'
+                            ''', (visit_id,))
+                            completed_labs = cursor.fetchone()[0]
+                        
+                            # Determine consultation status and handle prescription state
+                            has_lab_dependent_meds = any(med['awaiting_lab'] == 'yes' for med in selected_medications)
+                        
+                            if lab_tests and not completed_labs:
+                                # Initial consultation with lab orders - save consultation in paused state
+                                new_status = 'waiting_lab'
+                            elif completed_labs > 0:
+                                # Re-consultation after lab results - send back to pharmacy with cleared return reason
+                                new_status = 'prescribed'
+                                # Clear return_reason to prevent repeated lab returns
+                                cursor.execute('''
+                                    UPDATE visits 
+                                    SET return_reason = NULL 
+                                    WHERE visit_id = ?
+                                ''', (visit_id,))
+                                st.info("Patient being sent back to pharmacy with updated prescriptions based on lab results.")
+                            elif needs_ophthalmology:
+                                new_status = 'needs_ophthalmology'
+                            elif selected_medications:
+                                new_status = 'prescribed'
+                            else:
+                                new_status = 'completed'
 
-                        db_conn.commit()
-                        db_conn.close()
+                            cursor.execute(
+                                '''
+                                UPDATE visits SET consultation_time = ?, status = ? WHERE visit_id = ?
+                            ''',
+                                (now, new_status, visit_id))
+
+                            # Lab orders and prescriptions go in the same transaction
+                            cursor.executemany('''
+                                INSERT INTO lab_tests (visit_id, test_type, ordered_by, ordered_time, status)
+                                VALUES (?, ?, ?, ?, 'pending')
+                            ''', [(visit_id, test_type, current_doctor_name, now)
+                                  for test_type, disposition in lab_tests])
+
+                            # Save all prescriptions (including lab-dependent ones) for consultation state preservation
+                            prescription_rows = []
+                            prescription_data = []
+                            for med in selected_medications:
+                                if med['name']:
+                                    # Determine prescription status based on consultation state
+                                    if lab_tests and not completed_labs:
+                                        # Initial consultation - save prescriptions as "paused" if lab dependent
+                                        prescription_status = 'paused_pending_lab' if med['awaiting_lab'] == 'yes' else 'pending'
+                                    else:
+                                        # Normal flow or re-consultation - send to pharmacy
+                                        prescription_status = 'pending'
+
+                                    prescription_rows.append(
+                                        (visit_id, med['name'], med['dosage'],
+                                         med['frequency'], med['duration'],
+                                         med['instructions'],
+                                         med.get('indication', ''),
+                                         med['awaiting_lab'],
+                                         med.get('return_to_provider', 'no'),
+                                         now,
+                                         prescription_status))
+
+                                    # Save prescription data for state preservation
+                                    prescription_data.append({
+                                        'medication_name': med['name'],
+                                        'dosage': med['dosage'],
+                                        'frequency': med['frequency'],
+                                        'duration': med['duration'],
+                                        'instructions': med['instructions'],
+                                        'indication': med.get('indication', ''),
+                                        'awaiting_lab': med['awaiting_lab'],
+                                        'status': prescription_status
+                                    })
+
+                            cursor.executemany(
+                                '''
+                                INSERT INTO prescriptions (visit_id, medication_name, 
+                                                         dosage, frequency, duration, instructions, 
+                                                         indication, awaiting_lab, return_to_provider, 
+                                                         prescribed_time, status)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', prescription_rows)
 
-                        # Now handle lab tests and prescriptions using separate connections
-                        for test_info in lab_tests:
-                            test_type, disposition = test_info
-                            db_manager.order_lab_test(visit_id, test_type,
-                                                      current_doctor_name)
+                        clear_todays_listings()
 
                         # Save Lab & Prescriptions state for restoration when patient returns
                         lab_prescriptions_data = {
@@ -4947,13 +5046,15 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
                         # Save medication selections
                         for med in selected_medications:
                             if med['name']:
-                                med_key = f"med_{med.get('med_id', med['name'].replace(' ', '_'))}"
+                                # Formulary rows restore by their preset id; custom
+                                # medications have none and fall back to the name
+                                med_key = f"med_{med['id'] if med['id'] is not None else med['name'].replace(' ', '_')}"
                                 lab_prescriptions_data['medications'][med_key] = {
                                     'selected': True,
                                     'dosage': med['dosage'],
                                     'frequency': med['frequency'],
                                     'duration': med['duration'],
-                                    'pharmacy_dosage': med.get('pharmacy_dosage', ''),
+                                    'pharmacy_dosage': med.get('pharmacy_notes', ''),
                                     'indication': med.get('indication', ''),
                                     'instructions': med['instructions'],
                                     'awaiting_lab': med['awaiting_lab']
@@ -4961,51 +5062,6 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
                         
                         st.session_state[lab_prescriptions_key] = lab_prescriptions_data
 
-                        # Save all prescriptions (including lab-dependent ones) for consultation state preservation
-                        prescription_data = []
-                        for med in selected_medications:
-                            if med['name']:
-                                conn_med = sqlite3.connect(db_manager.db_name)
-                                cursor_med = conn_med.cursor()
-                                
-                                # Determine prescription status based on consultation state
-                                if lab_tests and not completed_labs:
-                                    # Initial consultation - save prescriptions as "paused" if lab dependent
-                                    prescription_status = 'paused_pending_lab' if med['awaiting_lab'] == 'yes' else 'pending'
-                                else:
-                                    # Normal flow or re-consultation - send to pharmacy
-                                    prescription_status = 'pending'
-                                
-                                cursor_med.execute(
-                                    '''
-                                    INSERT INTO prescriptions (visit_id, medication_name, 
-                                                             dosage, frequency, duration, instructions, 
-                                                             indication, awaiting_lab, return_to_provider, 
-                                                             prescribed_time, status)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                ''', (visit_id, med['name'], med['dosage'],
-                                      med['frequency'], med['duration'],
-                                      med['instructions'],
-                                      med.get('indication', ''), 
-                                      med['awaiting_lab'],
-                                      med.get('return_to_provider', 'no'),
-                                      datetime.now().isoformat(),
-                                      prescription_status))
-                                conn_med.commit()
-                                conn_med.close()
-                                
-                                # Save prescription data for state preservation
-                                prescription_data.append({
-                                    'medication_name': med['name'],
-                                    'dosage': med['dosage'],
-                                    'frequency': med['frequency'],
-                                    'duration': med['duration'],
-                                    'instructions': med['instructions'],
-                                    'indication': med.get('indication', ''),
-                                    'awaiting_lab': med['awaiting_lab'],
-                                    'status': prescription_status
-                                })
-                        
                         # Save prescription state for pharmacy workflow
                         if prescription_data:
                             patient_name = st.session_state.get('current_patient_name', 'Patient')
@@ -5065,19 +5121,17 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
                             del st.session_state.active_consultation
 
                         # Save patient history to database
-                        history_conn = sqlite3.connect(db_manager.db_name)
-                        history_cursor = history_conn.cursor()
-                        history_cursor.execute(
-                            '''
-                            UPDATE patients 
-                            SET medical_history = ?, allergies = ?
-                            WHERE patient_id = ?
-                        ''',
-                            (f"Surgical: {surgical_history}\nMedical: {medical_history}",
-                             f"Allergies: {allergies}\nCurrent Meds: {current_medications}",
-                             patient_id))
-                        history_conn.commit()
-                        history_conn.close()
+                        with get_conn_lock(), get_conn() as history_conn:
+                            history_cursor = history_conn.cursor()
+                            history_cursor.execute(
+                                '''
+                                UPDATE patients 
+                                SET medical_history = ?, allergies = ?
+                                WHERE patient_id = ?
+                            ''',
+                                (f"Surgical: {surgical_history}\nMedical: {medical_history}",
+                                 f"Allergies: {allergies}\nCurrent Meds: {current_medications}",
+                                 patient_id))
 
                         # Save any photos that were captured during this consultation
                         if f"symptom_photos_{visit_id}" in st.session_state:
@@ -5193,6 +5247,29 @@ def consultation_form(visit_id: str, patient_id: str, patient_name: str):
 
 
 
+TODAY_CONSULT_SQL = '''
+    SELECT c.id, c.doctor_name, c.chief_complaint, c.symptoms, c.diagnosis,
+           c.treatment_plan, c.notes, c.consultation_time, p.name, v.patient_id
+    FROM consultations c
+    JOIN visits v ON c.visit_id = v.visit_id
+    JOIN patients p ON v.patient_id = p.patient_id
+    WHERE c.consultation_time >= ? AND c.consultation_time < ?
+    AND v.status IN ('completed', 'prescribed', 'needs_ophthalmology')
+    AND v.return_reason IS NULL
+    ORDER BY c.consultation_time DESC
+'''
+
+
+@st.cache_data(ttl=30)
+def todays_consultations(day: str) -> List[Dict]:
+    """Today's finished consultations for the history tab (cached)"""
+    with db._reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute(TODAY_CONSULT_SQL, today_bounds(day))
+        # Plain dicts so st.cache_data can pickle them
+        return [dict(row) for row in cursor.fetchall()]
+
+
 def consultation_history():
     st.markdown("### Today's Consultations")
 
@@ -5204,37 +5281,19 @@ def consultation_history():
                                     st.session_state.patient_history_name)
         return
 
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT c.id, c.visit_id, c.doctor_name, c.chief_complaint, c.symptoms, 
-               c.diagnosis, c.treatment_plan, c.notes, c.needs_ophthalmology, 
-               c.consultation_time, p.name, v.patient_id
-        FROM consultations c
-        JOIN visits v ON c.visit_id = v.visit_id
-        JOIN patients p ON v.patient_id = p.patient_id
-        WHERE DATE(c.consultation_time) = DATE('now')
-        AND v.status IN ('completed', 'prescribed', 'needs_ophthalmology')
-        AND v.return_reason IS NULL
-        ORDER BY c.consultation_time DESC
-    ''')
-
-    consultations = cursor.fetchall()
-    conn.close()
+    consultations = todays_consultations(date.today().isoformat())
 
     if consultations:
         for consultation in consultations:
-            # consultation structure: [id, visit_id, doctor_name, chief_complaint, symptoms, diagnosis, treatment_plan, notes, needs_ophthalmology, consultation_time, patient_name, patient_id]
-            patient_name = consultation[10]
-            patient_id = consultation[11]
-            doctor_name = consultation[2]
-            chief_complaint = consultation[3]
-            symptoms = consultation[4]
-            diagnosis = consultation[5]
-            treatment_plan = consultation[6]
-            notes = consultation[7]
-            consultation_time = consultation[9]
+            patient_name = consultation['name']
+            patient_id = consultation['patient_id']
+            doctor_name = consultation['doctor_name']
+            chief_complaint = consultation['chief_complaint']
+            symptoms = consultation['symptoms']
+            diagnosis = consultation['diagnosis']
+            treatment_plan = consultation['treatment_plan']
+            notes = consultation['notes']
+            consultation_time = consultation['consultation_time']
 
             with st.expander(
                     f"👤 {patient_name} (ID: {patient_id}) - {chief_complaint}"
@@ -5254,7 +5313,7 @@ def consultation_history():
 
                 # Add patient history link button
                 if st.button(f"View Full Patient History",
-                             key=f"history_{patient_id}_{consultation[0]}"):
+                             key=f"history_{patient_id}_{consultation['id']}"):
                     st.session_state.show_patient_history = patient_id
                     st.session_state.patient_history_name = patient_name
                     st.rerun()
@@ -5308,113 +5367,113 @@ def show_patient_history_detail(patient_id: str, patient_name: str):
                 del st.session_state.patient_history_name
             st.rerun()
 
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
+    with db._reader() as conn:
+        cursor = conn.cursor()
 
-    # Get patient basic info
-    cursor.execute('SELECT * FROM patients WHERE patient_id = ?',
-                   (patient_id, ))
-    patient = cursor.fetchone()
+        # Get patient basic info
+        cursor.execute(
+            '''
+            SELECT name, age, gender, phone, emergency_contact,
+                   medical_history, allergies
+            FROM patients WHERE patient_id = ?
+        ''', (patient_id, ))
+        patient = cursor.fetchone()
 
-    if patient:
-        st.markdown("#### Patient Information")
-        col1, col2 = st.columns(2)
-        with col1:
-            st.write(f"**Name:** {patient[1]}")
-            st.write(f"**Age:** {patient[2] or 'Not specified'}")
-            st.write(f"**Gender:** {patient[3] or 'Not specified'}")
-        with col2:
-            st.write(f"**Phone:** {patient[4] or 'Not provided'}")
-            st.write(f"**Emergency Contact:** {patient[6] or 'Not provided'}")
-
-        if patient[9]:  # medical_history
-            st.markdown("**Medical History:**")
-            st.text(patient[9])
-        if patient[8]:  # allergies
-            st.markdown("**Allergies:**")
-            st.text(patient[8])
-
-    # Get all visits
-    cursor.execute(
-        '''
-        SELECT v.visit_id, v.visit_date, v.status, c.chief_complaint, c.diagnosis, c.doctor_name, c.consultation_time
-        FROM visits v
-        LEFT JOIN consultations c ON v.visit_id = c.visit_id
-        WHERE v.patient_id = ?
-        ORDER BY v.visit_date DESC
-    ''', (patient_id, ))
-
-    visits = cursor.fetchall()
-
-    if visits:
-        st.markdown("#### Visit History")
-        for visit in visits:
-            visit_date = visit[1][:10] if visit[1] else "Unknown"
-            status = visit[2] or "In Progress"
-
-            with st.expander(f"Visit {visit_date} - {status}"):
-                if visit[3]:  # chief_complaint
-                    st.write(f"**Chief Complaint:** {visit[3]}")
-                if visit[4]:  # diagnosis
-                    st.write(f"**Diagnosis:** {visit[4]}")
-                if visit[5]:  # doctor_name
-                    st.write(f"**Doctor:** {visit[5]}")
-                if visit[6]:  # consultation_time
-                    st.write(
-                        f"**Consultation Time:** {visit[6][:16].replace('T', ' ')}"
-                    )
+        if patient:
+            (name, age, gender, phone, emergency_contact, medical_history,
+             allergies) = patient
+            st.markdown("#### Patient Information")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write(f"**Name:** {name}")
+                st.write(f"**Age:** {age or 'Not specified'}")
+                st.write(f"**Gender:** {gender or 'Not specified'}")
+            with col2:
+                st.write(f"**Phone:** {phone or 'Not provided'}")
+                st.write(f"**Emergency Contact:** {emergency_contact or 'Not provided'}")
 
-                # Get prescriptions for this visit
-                cursor.execute(
-                    '''
-                    SELECT medication_name, dosage, frequency, duration, indication, prescribed_time
-                    FROM prescriptions
-                    WHERE visit_id = ?
-                    ORDER BY prescribed_time DESC
-                ''', (visit[0], ))
-
-                prescriptions = cursor.fetchall()
-                if prescriptions:
-                    st.markdown("**Prescriptions:**")
-                    for rx in prescriptions:
-                        indication_text = f" - {rx[4]}" if rx[4] else ""
+            if medical_history:
+                st.markdown("**Medical History:**")
+                st.text(medical_history)
+            if allergies:
+                st.markdown("**Allergies:**")
+                st.text(allergies)
+
+        # Get all visits
+        cursor.execute(
+            '''
+            SELECT v.visit_id, v.visit_date, v.status, c.chief_complaint, c.diagnosis, c.doctor_name, c.consultation_time
+            FROM visits v
+            LEFT JOIN consultations c ON v.visit_id = c.visit_id
+            WHERE v.patient_id = ?
+            ORDER BY v.visit_date DESC
+        ''', (patient_id, ))
+
+        visits = cursor.fetchall()
+
+        if visits:
+            st.markdown("#### Visit History")
+            for visit in visits:
+                visit_date = visit[1][:10] if visit[1] else "Unknown"
+                status = visit[2] or "In Progress"
+
+                with st.expander(f"Visit {visit_date} - {status}"):
+                    if visit[3]:  # chief_complaint
+                        st.write(f"**Chief Complaint:** {visit[3]}")
+                    if visit[4]:  # diagnosis
+                        st.write(f"**Diagnosis:** {visit[4]}")
+                    if visit[5]:  # doctor_name
+                        st.write(f"**Doctor:** {visit[5]}")
+                    if visit[6]:  # consultation_time
                         st.write(
-                            f"• {rx[0]} {rx[1]} {rx[2]} for {rx[3]}{indication_text}"
+                            f"**Consultation Time:** {visit[6][:16].replace('T', ' ')}"
                         )
 
-                # Get lab tests for this visit
-                cursor.execute(
-                    '''
-                    SELECT test_type, status, results, ordered_time, completed_time
-                    FROM lab_tests
-                    WHERE visit_id = ?
-                    ORDER BY ordered_time DESC
-                ''', (visit[0], ))
+                    # Get prescriptions for this visit
+                    cursor.execute(
+                        '''
+                        SELECT medication_name, dosage, frequency, duration, indication, prescribed_time
+                        FROM prescriptions
+                        WHERE visit_id = ?
+                        ORDER BY prescribed_time DESC
+                    ''', (visit[0], ))
+
+                    prescriptions = cursor.fetchall()
+                    if prescriptions:
+                        st.markdown("**Prescriptions:**")
+                        for rx in prescriptions:
+                            indication_text = f" - {rx[4]}" if rx[4] else ""
+                            st.write(
+                                f"• {rx[0]} {rx[1]} {rx[2]} for {rx[3]}{indication_text}"
+                            )
+
+                    # Get lab tests for this visit
+                    cursor.execute(
+                        '''
+                        SELECT test_type, status, results, ordered_time, completed_time
+                        FROM lab_tests
+                        WHERE visit_id = ?
+                        ORDER BY ordered_time DESC
+                    ''', (visit[0], ))
 
-                lab_tests = cursor.fetchall()
-                if lab_tests:
-                    st.markdown("**Lab Tests:**")
-                    for test in lab_tests:
-                        status_text = f"({test[1]})"
-                        results_text = f" - {test[2]}" if test[2] else ""
-                        st.write(f"• {test[0]} {status_text}{results_text}")
+                    lab_tests = cursor.fetchall()
+                    if lab_tests:
+                        st.markdown("**Lab Tests:**")
+                        for test in lab_tests:
+                            status_text = f"({test[1]})"
+                            results_text = f" - {test[2]}" if test[2] else ""
+                            st.write(f"• {test[0]} {status_text}{results_text}")
 
-    conn.close()
 
 
 def pharmacy_interface():
     add_to_history('pharmacy')
     st.markdown("## 💊 Pharmacy/Lab Station")
 
-    # Get pending lab test count
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT COUNT(*) FROM lab_tests 
-        WHERE status = 'pending' AND DATE(ordered_time) = DATE('now')
-    ''')
-    pending_lab_count = cursor.fetchone()[0]
-    conn.close()
+    # All tabs render on every rerun, so fetch the pending lab count, today's
+    # lab results and the filled prescription count in one round trip
+    pending_lab_count, lab_results, filled_count = get_pharmacy_dashboard_data(
+        date.today().isoformat())
     
     lab_input_label = f"Lab Input ({pending_lab_count})" if pending_lab_count > 0 else "Lab Input"
     
@@ -5425,13 +5484,66 @@ def pharmacy_interface():
         pending_prescriptions()
 
     with tab2:
-        awaiting_lab_prescriptions()
+        awaiting_lab_prescriptions(lab_results)
 
     with tab3:
         lab_results_input()
 
     with tab4:
-        filled_prescriptions()
+        filled_prescriptions(filled_count)
+
+
+# Each branch is padded to the same columns: row kind first, sort time last
+PHARMACY_DASHBOARD_SQL = '''
+    SELECT 'counts', COUNT(*),
+           (SELECT COUNT(*) FROM prescriptions
+            WHERE status = 'filled' AND filled_time >= ? AND filled_time < ?),
+           NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+    FROM lab_tests
+    WHERE status = 'pending' AND ordered_time >= ? AND ordered_time < ?
+
+    UNION ALL
+
+    SELECT 'lab_result', lt.id, lt.visit_id, lt.test_type, lt.results, lt.completed_time,
+           pt.name, pt.patient_id, v.consultation_time,
+           CASE WHEN EXISTS (
+               SELECT 1 FROM visits v2 
+               WHERE v2.patient_id = pt.patient_id 
+               AND v2.status = 'waiting_consultation' 
+               AND v2.return_reason = 'pharmacy_lab_review'
+           ) THEN 'returned_to_provider'
+           ELSE 'completed_lab'
+           END,
+           lt.completed_time
+    FROM lab_tests lt
+    JOIN visits v ON lt.visit_id = v.visit_id
+    JOIN patients pt ON v.patient_id = pt.patient_id
+    WHERE lt.status = 'completed' AND lt.completed_time >= ? AND lt.completed_time < ?
+
+    ORDER BY 11 DESC
+'''
+
+
+@st.cache_data(ttl=30)
+def get_pharmacy_dashboard_data(day: str):
+    """Get pending lab count, today's lab results and filled prescription count in one query"""
+    # day only keys the cache so it turns over at midnight
+    with db._reader() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(PHARMACY_DASHBOARD_SQL, today_bounds(day) * 3)
+        rows = cursor.fetchall()
+
+    pending_lab_count = 0
+    filled_count = 0
+    lab_results = []
+    for row in rows:
+        if row[0] == 'counts':
+            pending_lab_count, filled_count = row[1], row[2]
+        else:
+            lab_results.append(row[1:10])
+
+    return pending_lab_count, lab_results, filled_count
 
 
 def save_prescription_state(visit_id: str, patient_id: str, patient_name: str, prescriptions: list):
@@ -5450,6 +5562,35 @@ def restore_prescription_state(visit_id: str) -> dict:
     prescription_state_key = f"prescription_state_{visit_id}"
     return st.session_state.get(prescription_state_key, None)
 
+
+# Prescription card for the pending list; the optional rows are filled in
+# only when the prescription has an indication or instructions
+RX_CARD = string.Template(
+    '<div style="background: white; border: 1px solid #e5e7eb; border-radius: 8px; padding: 16px; margin-bottom: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">'
+    '<h5 style="color: #1f2937; margin: 0 0 12px 0; font-size: 16px;">💊 $medication</h5>'
+    '<div style="display: grid; grid-template-columns: 1fr 1fr; gap: 8px; margin-bottom: 8px;">'
+    '<p style="margin: 0; color: #4b5563; font-size: 14px;"><strong>Dosage:</strong> $dosage</p>'
+    '<p style="margin: 0; color: #4b5563; font-size: 14px;"><strong>Frequency:</strong> $frequency</p>'
+    '</div>'
+    '<p style="margin: 0 0 8px 0; color: #4b5563; font-size: 14px;"><strong>Duration:</strong> $duration</p>'
+    '$indication$instructions'
+    '</div>')
+RX_CARD_FOR = string.Template(
+    '<p style="margin: 0 0 8px 0; color: #059669; font-size: 14px; background: #d1fae5; padding: 4px 8px; border-radius: 4px;"><strong>For:</strong> $indication</p>')
+RX_CARD_INSTRUCTIONS = string.Template(
+    '<p style="margin: 0; color: #6b7280; font-size: 13px; font-style: italic;"><strong>Instructions:</strong> $instructions</p>')
+
+PENDING_RX_SQL = '''
+    SELECT p.id, p.visit_id, p.medication_name, p.dosage, p.frequency, 
+           p.duration, p.instructions, p.indication, p.prescribed_time, pt.name, v.patient_id, p.awaiting_lab
+    FROM prescriptions p
+    JOIN visits v ON p.visit_id = v.visit_id
+    JOIN patients pt ON v.patient_id = pt.patient_id
+    WHERE p.status = 'pending' AND p.awaiting_lab = 'no' AND p.prescribed_time >= ? AND p.prescribed_time < ?
+    ORDER BY v.patient_id, p.prescribed_time
+'''
+
+
 def pending_prescriptions():
     st.markdown("### Prescriptions to Fill")
     
@@ -5463,19 +5604,18 @@ def pending_prescriptions():
             st.markdown(f"**{member['patient_name']} (ID: {member['patient_id']})**")
             
             # Get prescriptions for this family member
-            conn = sqlite3.connect(db.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.id, p.visit_id, p.medication_name, p.dosage, p.frequency, 
-                       p.duration, p.instructions, p.indication, p.prescribed_time, pt.name, v.patient_id, p.awaiting_lab
-                FROM prescriptions p
-                JOIN visits v ON p.visit_id = v.visit_id
-                JOIN patients pt ON v.patient_id = pt.patient_id
-                WHERE p.visit_id = ? AND p.status = 'pending' AND p.awaiting_lab = 'no'
-            ''', (member['visit_id'],))
+            with db._reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT p.id, p.visit_id, p.medication_name, p.dosage, p.frequency, 
+                           p.duration, p.instructions, p.indication, p.prescribed_time, pt.name, v.patient_id, p.awaiting_lab
+                    FROM prescriptions p
+                    JOIN visits v ON p.visit_id = v.visit_id
+                    JOIN patients pt ON v.patient_id = pt.patient_id
+                    WHERE p.visit_id = ? AND p.status = 'pending' AND p.awaiting_lab = 'no'
+                ''', (member['visit_id'],))
             
-            member_prescriptions = cursor.fetchall()
-            conn.close()
+                member_prescriptions = cursor.fetchall()
             
             if member_prescriptions:
                 for prescription in member_prescriptions:
@@ -5485,24 +5625,23 @@ def pending_prescriptions():
         
         if st.button("Complete All Family Prescriptions", key="complete_family_pharmacy"):
             # Mark all family prescriptions as filled
-            conn = sqlite3.connect(db.db_name)
-            cursor = conn.cursor()
-            
-            for member in family_data:
-                cursor.execute('''
+            with get_conn_lock(), get_conn() as conn:
+                cursor = conn.cursor()
+                # One timestamp and one parameter list shared by both updates
+                now = datetime.now().isoformat()
+                params = [(now, member['visit_id']) for member in family_data]
+
+                cursor.executemany('''
                     UPDATE prescriptions 
                     SET status = 'filled', filled_time = ? 
                     WHERE visit_id = ? AND status = 'pending' AND awaiting_lab = 'no'
-                ''', (datetime.now().isoformat(), member['visit_id']))
-                
-                cursor.execute('''
+                ''', params)
+
+                cursor.executemany('''
                     UPDATE visits 
                     SET pharmacy_time = ?, status = 'completed' 
                     WHERE visit_id = ?
-                ''', (datetime.now().isoformat(), member['visit_id']))
-            
-            conn.commit()
-            conn.close()
+                ''', params)
             
             # Broadcast family prescription completion to all devices
             family_names = [member['patient_name'] for member in family_data]
@@ -5511,84 +5650,79 @@ def pending_prescriptions():
             # Clear family workflow
             del st.session_state.family_pharmacy_workflow
             
+            clear_todays_listings()
             st.success("✅ All family prescriptions completed!")
             st.rerun()
         
         return
 
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
+    with db._reader() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT p.id, p.visit_id, p.medication_name, p.dosage, p.frequency, 
-               p.duration, p.instructions, p.indication, p.prescribed_time, pt.name, v.patient_id, p.awaiting_lab
-        FROM prescriptions p
-        JOIN visits v ON p.visit_id = v.visit_id
-        JOIN patients pt ON v.patient_id = pt.patient_id
-        WHERE p.status = 'pending' AND p.awaiting_lab = 'no' AND DATE(p.prescribed_time) = DATE('now')
-        ORDER BY p.prescribed_time
-    ''')
+        cursor.execute(PENDING_RX_SQL, today_bounds())
 
-    pending = cursor.fetchall()
-    conn.close()
+        pending = cursor.fetchall()
 
     if pending:
-        # Group by patient
-        patients = {}
-        for prescription in pending:
-            patient_id = prescription[10]
-            patient_name = prescription[9]
-            visit_id = prescription[1]
+        # Rows arrive sorted by patient, so group them in one sequential pass
+        patients = []
+        for patient_id, rows in groupby(pending, key=itemgetter('patient_id')):
+            rows = list(rows)
+            patients.append((patient_id, {
+                'name': rows[0]['name'],
+                'visit_id': rows[0]['visit_id'],
+                'prescriptions': rows
+            }))
 
-            if patient_id not in patients:
-                patients[patient_id] = {
-                    'name': patient_name,
-                    'visit_id': visit_id,
-                    'prescriptions': []
-                }
 
-            patients[patient_id]['prescriptions'].append(prescription)
-            
         # Check for prescription state restoration
-        for patient_id, patient_data in patients.items():
+        for patient_id, patient_data in patients:
             restored_state = restore_prescription_state(patient_data['visit_id'])
             if restored_state:
                 st.info(f"📋 Prescription history restored for {patient_data['name']}")
 
-        for patient_id, patient_data in patients.items():
+        for patient_id, patient_data in patients:
             with st.expander(f"👤 {patient_data['name']} (ID: {patient_id})",
                              expanded=True):
                 st.markdown("**Prescriptions:**")
 
-                all_filled = True
                 prescription_ids = []
 
                 for prescription in patient_data['prescriptions']:
-                    prescription_ids.append(prescription[0])
-
-                    col1, col2 = st.columns([3, 1])
-
-                    with col1:
-                        st.markdown(f"""
-                        <div style="background: white; border: 1px solid #e5e7eb; border-radius: 8px; padding: 16px; margin-bottom: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
-                            <h5 style="color: #1f2937; margin: 0 0 12px 0; font-size: 16px;">💊 {prescription[2]}</h5>
-                            <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 8px; margin-bottom: 8px;">
-                                <p style="margin: 0; color: #4b5563; font-size: 14px;"><strong>Dosage:</strong> {prescription[3]}</p>
-                                <p style="margin: 0; color: #4b5563; font-size: 14px;"><strong>Frequency:</strong> {prescription[4]}</p>
-                            </div>
-                            <p style="margin: 0 0 8px 0; color: #4b5563; font-size: 14px;"><strong>Duration:</strong> {prescription[5]}</p>
-                            {f'<p style="margin: 0 0 8px 0; color: #059669; font-size: 14px; background: #d1fae5; padding: 4px 8px; border-radius: 4px;"><strong>For:</strong> {prescription[7]}</p>' if prescription[7] else ''}
-                            {f'<p style="margin: 0; color: #6b7280; font-size: 13px; font-style: italic;"><strong>Instructions:</strong> {prescription[6]}</p>' if prescription[6] else ''}
-                        </div>
-                        """,
-                                    unsafe_allow_html=True)
+                    prescription_ids.append(prescription['id'])
+
+                    st.markdown(RX_CARD.substitute(
+                        medication=prescription['medication_name'],
+                        dosage=prescription['dosage'],
+                        frequency=prescription['frequency'],
+                        duration=prescription['duration'],
+                        indication=RX_CARD_FOR.substitute(
+                            indication=prescription['indication'])
+                        if prescription['indication'] else '',
+                        instructions=RX_CARD_INSTRUCTIONS.substitute(
+                            instructions=prescription['instructions'])
+                        if prescription['instructions'] else ''),
+                                unsafe_allow_html=True)
 
-                    with col2:
-                        if st.checkbox(f"Filled",
-                                       key=f"filled_{prescription[0]}"):
-                            pass
-                        else:
-                            all_filled = False
+                # One editable checklist per patient rather than a checkbox
+                # widget per prescription
+                checklist = pd.DataFrame({
+                    'Medication': [
+                        prescription['medication_name']
+                        for prescription in patient_data['prescriptions']
+                    ],
+                    'Filled': False
+                })
+                edited = st.data_editor(
+                    checklist,
+                    column_config={
+                        'Filled': st.column_config.CheckboxColumn('Filled')
+                    },
+                    disabled=['Medication'],
+                    hide_index=True,
+                    use_container_width=True,
+                    key=f"filled_{patient_id}")
+                all_filled = bool(edited['Filled'].all())
 
                 if st.button(
                         f"✅ Complete All Prescriptions for {patient_data['name']}",
@@ -5598,28 +5732,28 @@ def pending_prescriptions():
                         type="primary",
                         use_container_width=True):
 
-                    conn = sqlite3.connect(db.db_name)
-                    cursor = conn.cursor()
+                    with get_conn_lock(), get_conn() as conn:
+                        cursor = conn.cursor()
+                        now = datetime.now().isoformat()
 
-                    # Mark all prescriptions as filled
-                    for prescription_id in prescription_ids:
+                        # Mark all prescriptions as filled in one statement
+                        placeholders = ', '.join('?' * len(prescription_ids))
                         cursor.execute(
-                            '''
+                            f'''
                             UPDATE prescriptions 
                             SET status = 'filled', filled_time = ? 
-                            WHERE id = ?
-                        ''', (datetime.now().isoformat(), prescription_id))
+                            WHERE id IN ({placeholders})
+                        ''', [now] + prescription_ids)
 
-                    # Update visit status to completed
-                    cursor.execute(
-                        '''
-                        UPDATE visits 
-                        SET pharmacy_time = ?, status = 'completed' 
-                        WHERE patient_id = ? AND DATE(visit_date) = DATE('now')
-                    ''', (datetime.now().isoformat(), patient_id))
+                        # Update visit status to completed
+                        cursor.execute(
+                            '''
+                            UPDATE visits 
+                            SET pharmacy_time = ?, status = 'completed' 
+                            WHERE patient_id = ? AND visit_date >= ? AND visit_date < ?
+                        ''', (now, patient_id, *today_bounds()))
 
-                    conn.commit()
-                    conn.close()
+                    clear_todays_listings()
 
                     # Broadcast prescription completion to all devices
                     broadcast_to_clients(f"prescriptions_filled:{patient_data['name']}:individual:complete")
@@ -5632,34 +5766,9 @@ def pending_prescriptions():
         st.info("No pending prescriptions.")
 
 
-def awaiting_lab_prescriptions():
+def awaiting_lab_prescriptions(lab_results):
     st.markdown("### Lab Results & Patient Review")
 
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
-
-    # Get all completed lab tests for today with patient information
-    cursor.execute('''
-        SELECT lt.id, lt.visit_id, lt.test_type, lt.results, lt.completed_time, 
-               pt.name, pt.patient_id, v.consultation_time,
-               CASE WHEN EXISTS (
-                   SELECT 1 FROM visits v2 
-                   WHERE v2.patient_id = pt.patient_id 
-                   AND v2.status = 'waiting_consultation' 
-                   AND v2.return_reason = 'pharmacy_lab_review'
-               ) THEN 'returned_to_provider'
-               ELSE 'completed_lab'
-               END as patient_status
-        FROM lab_tests lt
-        JOIN visits v ON lt.visit_id = v.visit_id
-        JOIN patients pt ON v.patient_id = pt.patient_id
-        WHERE lt.status = 'completed' AND DATE(lt.completed_time) = DATE('now')
-        ORDER BY lt.completed_time DESC
-    ''')
-
-    lab_results = cursor.fetchall()
-    conn.close()
-
     if lab_results:
         # Group by patient
         patients = {}
@@ -5779,20 +5888,19 @@ def lab_results_input():
     st.info("Input lab test results for patients. Results will be sent back to the doctor along with the patient.")
     
     # Get pending lab tests for today
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
+    with db._reader() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT lt.id, lt.visit_id, lt.test_type, pt.name, pt.patient_id, lt.ordered_time, lt.ordered_by
-        FROM lab_tests lt
-        JOIN visits v ON lt.visit_id = v.visit_id
-        JOIN patients pt ON v.patient_id = pt.patient_id
-        WHERE lt.status = 'pending' AND DATE(lt.ordered_time) = DATE('now')
-        ORDER BY lt.ordered_time
-    ''')
+        cursor.execute('''
+            SELECT lt.id, lt.visit_id, lt.test_type, pt.name, pt.patient_id, lt.ordered_time, lt.ordered_by
+            FROM lab_tests lt
+            JOIN visits v ON lt.visit_id = v.visit_id
+            JOIN patients pt ON v.patient_id = pt.patient_id
+            WHERE lt.status = 'pending' AND lt.ordered_time >= ? AND lt.ordered_time < ?
+            ORDER BY lt.ordered_time
+        ''', today_bounds())
     
-    pending_tests = cursor.fetchall()
-    conn.close()
+        pending_tests = cursor.fetchall()
     
     if pending_tests:
         for test in pending_tests:
@@ -5842,46 +5950,45 @@ Chemical Parameters:
 - Nitrites: {nitrites}"""
                             
                             # Save results to database
-                            conn = sqlite3.connect(db.db_name)
-                            cursor = conn.cursor()
-                            
-                            # Update lab test with results
-                            cursor.execute('''
-                                UPDATE lab_tests 
-                                SET results = ?, completed_time = ?, status = 'completed'
-                                WHERE id = ?
-                            ''', (results, datetime.now().isoformat(), test_id))
+                            with get_conn_lock(), get_conn() as conn:
+                                cursor = conn.cursor()
+                                now = datetime.now().isoformat()
                             
-                            # Get patient and doctor info for notification
-                            cursor.execute('''
-                                SELECT pt.name, pt.patient_id, lt.ordered_by, v.visit_id
-                                FROM lab_tests lt
-                                JOIN visits v ON lt.visit_id = v.visit_id
-                                JOIN patients pt ON v.patient_id = pt.patient_id
-                                WHERE lt.id = ?
-                            ''', (test_id,))
+                                # Update lab test with results
+                                cursor.execute('''
+                                    UPDATE lab_tests 
+                                    SET results = ?, completed_time = ?, status = 'completed'
+                                    WHERE id = ?
+                                ''', (results, now, test_id))
                             
-                            patient_info = cursor.fetchone()
-                            if patient_info:
-                                patient_name, patient_id, doctor_name, visit_id = patient_info
-                                
-                                # Create notification for doctor
+                                # Get patient and doctor info for notification
                                 cursor.execute('''
-                                    INSERT INTO notifications (doctor_name, patient_id, patient_name, visit_id, message, notification_type, created_time)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                ''', (doctor_name, patient_id, patient_name, visit_id, 
-                                     f"Urinalysis results available for {patient_name} (ID: {patient_id})", 
-                                     "lab_results", datetime.now().isoformat()))
+                                    SELECT pt.name, pt.patient_id, lt.ordered_by, v.visit_id
+                                    FROM lab_tests lt
+                                    JOIN visits v ON lt.visit_id = v.visit_id
+                                    JOIN patients pt ON v.patient_id = pt.patient_id
+                                    WHERE lt.id = ?
+                                ''', (test_id,))
                             
-                            # Automatically send patient back to doctor queue
-                            cursor.execute('''
-                                UPDATE visits 
-                                SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
-                                WHERE visit_id = ?
-                            ''', (visit_id,))
+                                patient_info = cursor.fetchone()
+                                if patient_info:
+                                    patient_name, patient_id, doctor_name, visit_id = patient_info
+                                
+                                    # Create notification for doctor
+                                    cursor.execute('''
+                                        INSERT INTO notifications (doctor_name, patient_id, patient_name, visit_id, message, notification_type, created_time)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                                    ''', (doctor_name, patient_id, patient_name, visit_id, 
+                                         f"Urinalysis results available for {patient_name} (ID: {patient_id})", 
+                                         "lab_results", now))
                             
-                            conn.commit()
-                            conn.close()
+                                # Automatically send patient back to doctor queue
+                                cursor.execute('''
+                                    UPDATE visits 
+                                    SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
+                                    WHERE visit_id = ?
+                                ''', (visit_id,))
+                            clear_todays_listings()
                             
                             # Broadcast automatic patient return
                             broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:urinalysis_complete")
@@ -5922,47 +6029,46 @@ Chemical Parameters:
                             results = f"{glucose_value} {glucose_units} ({interpretation})"
                             
                             # Save results to database
-                            conn = sqlite3.connect(db.db_name)
-                            cursor = conn.cursor()
-                            
-                            # Update lab test with results
-                            cursor.execute('''
-                                UPDATE lab_tests 
-                                SET results = ?, completed_time = ?, status = 'completed'
-                                WHERE id = ?
-                            ''', (results, datetime.now().isoformat(), test_id))
-                            
-                            # Get patient and doctor info for notification
-                            cursor.execute('''
-                                SELECT pt.name, pt.patient_id, lt.ordered_by, v.visit_id
-                                FROM lab_tests lt
-                                JOIN visits v ON lt.visit_id = v.visit_id
-                                JOIN patients pt ON v.patient_id = pt.patient_id
-                                WHERE lt.id = ?
-                            ''', (test_id,))
+                            with get_conn_lock(), get_conn() as conn:
+                                cursor = conn.cursor()
+                                now = datetime.now().isoformat()
                             
-                            patient_info = cursor.fetchone()
-                            if patient_info:
-                                patient_name, patient_id, doctor_name, visit_id = patient_info
-                                
-                                # Create notification for doctor
+                                # Update lab test with results
                                 cursor.execute('''
-                                    INSERT INTO notifications (doctor_name, patient_id, patient_name, visit_id, message, notification_type, created_time)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                ''', (doctor_name, patient_id, patient_name, visit_id, 
-                                     f"Blood glucose results available for {patient_name} (ID: {patient_id}): {results}", 
-                                     "lab_results", datetime.now().isoformat()))
+                                    UPDATE lab_tests 
+                                    SET results = ?, completed_time = ?, status = 'completed'
+                                    WHERE id = ?
+                                ''', (results, now, test_id))
                             
-                            # Automatically send patient back to doctor queue
-                            if patient_info:
+                                # Get patient and doctor info for notification
                                 cursor.execute('''
-                                    UPDATE visits 
-                                    SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
-                                    WHERE visit_id = ?
-                                ''', (visit_id,))
+                                    SELECT pt.name, pt.patient_id, lt.ordered_by, v.visit_id
+                                    FROM lab_tests lt
+                                    JOIN visits v ON lt.visit_id = v.visit_id
+                                    JOIN patients pt ON v.patient_id = pt.patient_id
+                                    WHERE lt.id = ?
+                                ''', (test_id,))
+                            
+                                patient_info = cursor.fetchone()
+                                if patient_info:
+                                    patient_name, patient_id, doctor_name, visit_id = patient_info
+                                
+                                    # Create notification for doctor
+                                    cursor.execute('''
+                                        INSERT INTO notifications (doctor_name, patient_id, patient_name, visit_id, message, notification_type, created_time)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                                    ''', (doctor_name, patient_id, patient_name, visit_id, 
+                                         f"Blood glucose results available for {patient_name} (ID: {patient_id}): {results}", 
+                                         "lab_results", now))
                             
-                            conn.commit()
-                            conn.close()
+                                # Automatically send patient back to doctor queue
+                                if patient_info:
+                                    cursor.execute('''
+                                        UPDATE visits 
+                                        SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
+                                        WHERE visit_id = ?
+                                    ''', (visit_id,))
+                            clear_todays_listings()
                             
                             # Broadcast automatic patient return
                             if patient_info:
@@ -5993,47 +6099,46 @@ Chemical Parameters:
                                 results += f" - Notes: {test_notes.strip()}"
                             
                             # Save results to database
-                            conn = sqlite3.connect(db.db_name)
-                            cursor = conn.cursor()
-                            
-                            # Update lab test with results
-                            cursor.execute('''
-                                UPDATE lab_tests 
-                                SET results = ?, completed_time = ?, status = 'completed'
-                                WHERE id = ?
-                            ''', (results, datetime.now().isoformat(), test_id))
-                            
-                            # Get patient and doctor info for notification
-                            cursor.execute('''
-                                SELECT pt.name, pt.patient_id, lt.ordered_by, v.visit_id
-                                FROM lab_tests lt
-                                JOIN visits v ON lt.visit_id = v.visit_id
-                                JOIN patients pt ON v.patient_id = pt.patient_id
-                                WHERE lt.id = ?
-                            ''', (test_id,))
+                            with get_conn_lock(), get_conn() as conn:
+                                cursor = conn.cursor()
+                                now = datetime.now().isoformat()
                             
-                            patient_info = cursor.fetchone()
-                            if patient_info:
-                                patient_name, patient_id, doctor_name, visit_id = patient_info
-                                
-                                # Create notification for doctor
+                                # Update lab test with results
                                 cursor.execute('''
-                                    INSERT INTO notifications (doctor_name, patient_id, patient_name, visit_id, message, notification_type, created_time)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                ''', (doctor_name, patient_id, patient_name, visit_id, 
-                                     f"Pregnancy test results available for {patient_name} (ID: {patient_id}): {results}", 
-                                     "lab_results", datetime.now().isoformat()))
+                                    UPDATE lab_tests 
+                                    SET results = ?, completed_time = ?, status = 'completed'
+                                    WHERE id = ?
+                                ''', (results, now, test_id))
                             
-                            # Automatically send patient back to doctor queue
-                            if patient_info:
+                                # Get patient and doctor info for notification
                                 cursor.execute('''
-                                    UPDATE visits 
-                                    SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
-                                    WHERE visit_id = ?
-                                ''', (visit_id,))
+                                    SELECT pt.name, pt.patient_id, lt.ordered_by, v.visit_id
+                                    FROM lab_tests lt
+                                    JOIN visits v ON lt.visit_id = v.visit_id
+                                    JOIN patients pt ON v.patient_id = pt.patient_id
+                                    WHERE lt.id = ?
+                                ''', (test_id,))
+                            
+                                patient_info = cursor.fetchone()
+                                if patient_info:
+                                    patient_name, patient_id, doctor_name, visit_id = patient_info
+                                
+                                    # Create notification for doctor
+                                    cursor.execute('''
+                                        INSERT INTO notifications (doctor_name, patient_id, patient_name, visit_id, message, notification_type, created_time)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                                    ''', (doctor_name, patient_id, patient_name, visit_id, 
+                                         f"Pregnancy test results available for {patient_name} (ID: {patient_id}): {results}", 
+                                         "lab_results", now))
                             
-                            conn.commit()
-                            conn.close()
+                                # Automatically send patient back to doctor queue
+                                if patient_info:
+                                    cursor.execute('''
+                                        UPDATE visits 
+                                        SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
+                                        WHERE visit_id = ?
+                                    ''', (visit_id,))
+                            clear_todays_listings()
                             
                             # Broadcast automatic patient return
                             if patient_info:
@@ -6054,15 +6159,14 @@ Chemical Parameters:
                         if st.form_submit_button(f"Complete {test_type}", type="primary"):
                             if test_results.strip():
                                 # Save results to database
-                                conn = sqlite3.connect(db.db_name)
-                                cursor = conn.cursor()
-                                cursor.execute('''
-                                    UPDATE lab_tests 
-                                    SET results = ?, completed_time = ?, status = 'completed'
-                                    WHERE id = ?
-                                ''', (test_results.strip(), datetime.now().isoformat(), test_id))
-                                conn.commit()
-                                conn.close()
+                                with get_conn_lock(), get_conn() as conn:
+                                    cursor = conn.cursor()
+                                    cursor.execute('''
+                                        UPDATE lab_tests 
+                                        SET results = ?, completed_time = ?, status = 'completed'
+                                        WHERE id = ?
+                                    ''', (test_results.strip(), datetime.now().isoformat(), test_id))
+                                clear_todays_listings()
                                 
                                 st.success(f"{test_type} results saved successfully!")
                                 st.rerun()
@@ -6072,60 +6176,61 @@ Chemical Parameters:
         st.info("No pending lab tests for today.")
 
 
-def filled_prescriptions():
-    st.markdown("### Prescription History")
-
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
+FILLED_PAGE_SIZE = 25
 
-    cursor.execute('''
-        SELECT p.medication_name, p.dosage, p.frequency, p.duration, 
-               p.indication, p.filled_time, pt.name, v.patient_id, p.instructions
-        FROM prescriptions p
-        JOIN visits v ON p.visit_id = v.visit_id
-        JOIN patients pt ON v.patient_id = pt.patient_id
-        WHERE p.status = 'filled' AND DATE(p.filled_time) = DATE('now')
-        ORDER BY p.filled_time DESC
-    ''')
+FILLED_RX_SQL = '''
+    SELECT p.medication_name, p.dosage, p.frequency, p.duration, 
+           p.indication, p.filled_time, pt.name, v.patient_id, p.instructions
+    FROM prescriptions p
+    JOIN visits v ON p.visit_id = v.visit_id
+    JOIN patients pt ON v.patient_id = pt.patient_id
+    WHERE p.status = 'filled' AND p.filled_time >= ? AND p.filled_time < ?
+    ORDER BY p.filled_time DESC
+    LIMIT ? OFFSET ?
+'''
 
-    filled = cursor.fetchall()
-    conn.close()
 
-    if filled:
-        # Group prescriptions by patient for better history display
-        patients = {}
-        for prescription in filled:
-            patient_id = prescription[7]
-            patient_name = prescription[6]
-            
-            if patient_id not in patients:
-                patients[patient_id] = {
-                    'name': patient_name,
-                    'prescriptions': [],
-                    'filled_time': prescription[5]
-                }
-            
-            patients[patient_id]['prescriptions'].append(prescription)
-        
-        for patient_id, patient_data in patients.items():
-            with st.expander(f"📋 {patient_data['name']} (ID: {patient_id}) - {len(patient_data['prescriptions'])} prescriptions filled", expanded=True):
-                for prescription in patient_data['prescriptions']:
-                    indication_text = f" - For: {prescription[4]}" if prescription[4] else ""
-                    instructions_text = f" - {prescription[8]}" if prescription[8] else ""
-                    
-                    st.markdown(f"""
-                    <div style="background: #d1fae5; border: 1px solid #10b981; border-radius: 8px; padding: 12px; margin-bottom: 8px;">
-                        <h5 style="color: #047857; margin: 0 0 8px 0; font-size: 16px;">✅ {prescription[0]}</h5>
-                        <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 8px; margin-bottom: 8px;">
-                            <p style="margin: 0; color: #065f46; font-size: 14px;"><strong>Dosage:</strong> {prescription[1]}</p>
-                            <p style="margin: 0; color: #065f46; font-size: 14px;"><strong>Frequency:</strong> {prescription[2]}</p>
-                        </div>
-                        <p style="margin: 0 0 8px 0; color: #065f46; font-size: 14px;"><strong>Duration:</strong> {prescription[3]}</p>
-                        {f'<p style="margin: 0 0 8px 0; color: #059669; font-size: 14px; background: #ecfdf5; padding: 4px 8px; border-radius: 4px;"><strong>For:</strong> {prescription[4]}</p>' if prescription[4] else ''}
-                        {f'<p style="margin: 0 0 8px 0; color: #065f46; font-size: 13px; font-style: italic;"><strong>Instructions:</strong> {prescription[8]}</p>' if prescription[8] else ''}
-                        <p style="margin: 4px 0 0 0; color: #6b7280; font-size: 12px;">Filled: {prescription[5][:16].replace('T', ' ')}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+def fetch_filled_prescriptions(offset: int = 0, limit: int = FILLED_PAGE_SIZE):
+    """Get one page of prescriptions filled today, newest first"""
+    with db._reader() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute(FILLED_RX_SQL, (*today_bounds(), limit, offset))
+
+        filled = cursor.fetchall()
+    return filled
+
+
+@st.fragment
+def filled_prescriptions(filled_count):
+    st.markdown("### Prescription History")
+
+    # Only the visible page is fetched; the count comes with the dashboard query
+    page = 1
+    page_count = max(1, -(-filled_count // FILLED_PAGE_SIZE))
+    if st.session_state.get("filled_page", 1) > page_count:
+        del st.session_state["filled_page"]
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count})",
+                               min_value=1,
+                               max_value=page_count,
+                               step=1,
+                               key="filled_page")
+    filled = fetch_filled_prescriptions(offset=(page - 1) * FILLED_PAGE_SIZE)
+
+    if filled:
+        # One Arrow table instead of an HTML card per prescription
+        df = pd.DataFrame(filled, columns=[
+            'Medication', 'Dosage', 'Frequency', 'Duration', 'For', 'Filled',
+            'Patient', 'Patient ID', 'Instructions'
+        ])
+        df['Filled'] = df['Filled'].str.slice(0, 16).str.replace('T', ' ')
+        st.dataframe(df[[
+            'Patient', 'Patient ID', 'Medication', 'Dosage', 'Frequency',
+            'Duration', 'For', 'Instructions', 'Filled'
+        ]],
+                     use_container_width=True,
+                     hide_index=True)
     else:
         st.info("No prescriptions filled today.")
 
@@ -6143,6 +6248,7 @@ def lab_interface():
         completed_lab_tests()
 
 
+@st.fragment
 def pending_lab_tests():
     st.markdown("### Tests to Process")
 
@@ -6150,24 +6256,61 @@ def pending_lab_tests():
 
     if pending_tests:
         for test in pending_tests:
-            with st.expander(
-                    f"🧪 {test['patient_name']} (ID: {test['patient_id']}) - {test['test_type']}",
-                    expanded=True):
-                st.write(f"**Ordered by:** {test['ordered_by']}")
-                st.write(
-                    f"**Ordered:** {test['ordered_time'][:16].replace('T', ' ')}"
+            # Only the opened test renders its result form; collapsed rows
+            # are a single line plus a toggle button
+            open_key = f"open_{test['id']}"
+            is_open = st.session_state.get(open_key, False)
+
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(
+                    f"**🧪 {test['patient_name']}** (ID: {test['patient_id']}) - {test['test_type']}"
                 )
+            with col2:
+                if st.button("Hide" if is_open else "Details",
+                             key=f"toggle_{open_key}",
+                             use_container_width=True):
+                    st.session_state[open_key] = not is_open
+                    st.rerun(scope="fragment")
+
+            if is_open:
+                with st.container(border=True):
+                    st.write(f"**Ordered by:** {test['ordered_by']}")
+                    st.write(
+                        f"**Ordered:** {test['ordered_time'][:16].replace('T', ' ')}"
+                    )
 
-                if test['test_type'] == 'Urinalysis':
-                    urinalysis_form(test['id'])
-                elif test['test_type'] == 'Blood Glucose':
-                    glucose_form(test['id'])
-                elif test['test_type'] == 'Pregnancy Test':
-                    pregnancy_form(test['id'])
+                    if test['test_type'] == 'Urinalysis':
+                        urinalysis_form(test['id'])
+                    elif test['test_type'] == 'Blood Glucose':
+                        glucose_form(test['id'])
+                    elif test['test_type'] == 'Pregnancy Test':
+                        pregnancy_form(test['id'])
     else:
         st.info("No pending lab tests.")
 
 
+# Every parameter is always reported, in this order, so a 0 WBC/RBC count
+# is recorded rather than dropped
+URINALYSIS_TEMPLATE = (
+    "Color: {color}\n"
+    "Clarity: {clarity}\n"
+    "Specific Gravity: {specific_gravity}\n"
+    "pH: {ph}\n"
+    "Protein: {protein}\n"
+    "Glucose: {glucose}\n"
+    "Ketones: {ketones}\n"
+    "Blood: {blood}\n"
+    "Leukocyte Esterase: {leukocyte_esterase}\n"
+    "Nitrites: {nitrites}\n"
+    "Urobilinogen: {urobilinogen}\n"
+    "Bilirubin: {bilirubin}\n"
+    "WBC: {wbc}/hpf\n"
+    "RBC: {rbc}/hpf\n"
+    "Bacteria: {bacteria}\n"
+    "Epithelial Cells: {epithelial_cells}")
+
+
 def urinalysis_form(test_id: int):
     with st.form(f"urinalysis_{test_id}"):
         st.markdown("#### Urinalysis Results")
@@ -6231,70 +6374,35 @@ def urinalysis_form(test_id: int):
         notes = st.text_area("Additional Notes")
 
         if st.form_submit_button("Complete Urinalysis", type="primary"):
-            results = {
-                'Color': color,
-                'Clarity': clarity,
-                'Specific Gravity': specific_gravity,
-                'pH': ph,
-                'Protein': protein,
-                'Glucose': glucose,
-                'Ketones': ketones,
-                'Blood': blood,
-                'Leukocyte Esterase': leukocyte_esterase,
-                'Nitrites': nitrites,
-                'Urobilinogen': urobilinogen,
-                'Bilirubin': bilirubin,
-                'WBC': f"{wbc}/hpf",
-                'RBC': f"{rbc}/hpf",
-                'Bacteria': bacteria,
-                'Epithelial Cells': epithelial_cells,
-                'Notes': notes
-            }
-
-            results_text = "\n".join(
-                [f"{k}: {v}" for k, v in results.items() if v])
+            results_text = URINALYSIS_TEMPLATE.format(
+                color=color,
+                clarity=clarity,
+                specific_gravity=specific_gravity,
+                ph=ph,
+                protein=protein,
+                glucose=glucose,
+                ketones=ketones,
+                blood=blood,
+                leukocyte_esterase=leukocyte_esterase,
+                nitrites=nitrites,
+                urobilinogen=urobilinogen,
+                bilirubin=bilirubin,
+                wbc=wbc,
+                rbc=rbc,
+                bacteria=bacteria,
+                epithelial_cells=epithelial_cells)
+            if notes:
+                results_text += f"\nNotes: {notes}"
             
+            # Completing the test also returns the patient to the doctor queue
             db_manager = get_db_manager()
-            db_manager.complete_lab_test(test_id, results_text)
+            lab_info = db_manager.complete_lab_test(test_id, results_text,
+                                                    return_to_doctor=True)
 
-            # Get patient info for broadcast
-            conn = sqlite3.connect(db_manager.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.name, lt.test_type 
-                FROM lab_tests lt
-                JOIN visits v ON lt.visit_id = v.visit_id
-                JOIN patients p ON v.patient_id = p.patient_id
-                WHERE lt.test_id = ?
-            ''', (test_id,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                patient_name, test_type = result
+            if lab_info:
+                patient_name, test_type = lab_info
                 broadcast_to_clients(f"lab_complete:{patient_name}:{test_type}:urinalysis")
-                
-                # Automatically send patient back to doctor queue
-                visit_conn = sqlite3.connect(db_manager.db_name)
-                visit_cursor = visit_conn.cursor()
-                visit_cursor.execute('''
-                    SELECT visit_id FROM lab_tests WHERE test_id = ?
-                ''', (test_id,))
-                visit_result = visit_cursor.fetchone()
-                
-                if visit_result:
-                    visit_id = visit_result[0]
-                    visit_cursor.execute('''
-                        UPDATE visits 
-                        SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
-                        WHERE visit_id = ?
-                    ''', (visit_id,))
-                    visit_conn.commit()
-                    
-                    # Broadcast patient return to doctor
-                    broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:urinalysis_complete")
-                    
-                visit_conn.close()
+                broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:urinalysis_complete")
 
             st.success("Urinalysis completed! Patient automatically returned to doctor.")
             st.rerun()
@@ -6317,47 +6425,15 @@ def glucose_form(test_id: int):
             if notes:
                 results += f"\nNotes: {notes}"
 
+            # Completing the test also returns the patient to the doctor queue
             db_manager = get_db_manager()
-            db_manager.complete_lab_test(test_id, results)
+            lab_info = db_manager.complete_lab_test(test_id, results,
+                                                    return_to_doctor=True)
 
-            # Get patient info for broadcast
-            conn = sqlite3.connect(db_manager.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.name 
-                FROM lab_tests lt
-                JOIN visits v ON lt.visit_id = v.visit_id
-                JOIN patients p ON v.patient_id = p.patient_id
-                WHERE lt.test_id = ?
-            ''', (test_id,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                patient_name = result[0]
+            if lab_info:
+                patient_name, _ = lab_info
                 broadcast_to_clients(f"lab_complete:{patient_name}:glucose:{glucose_value}mg/dL")
-                
-                # Automatically send patient back to doctor queue
-                visit_conn = sqlite3.connect(db_manager.db_name)
-                visit_cursor = visit_conn.cursor()
-                visit_cursor.execute('''
-                    SELECT visit_id FROM lab_tests WHERE test_id = ?
-                ''', (test_id,))
-                visit_result = visit_cursor.fetchone()
-                
-                if visit_result:
-                    visit_id = visit_result[0]
-                    visit_cursor.execute('''
-                        UPDATE visits 
-                        SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
-                        WHERE visit_id = ?
-                    ''', (visit_id,))
-                    visit_conn.commit()
-                    
-                    # Broadcast patient return to doctor
-                    broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:glucose_complete")
-                    
-                visit_conn.close()
+                broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:glucose_complete")
 
             st.success("Glucose test completed! Patient automatically returned to doctor.")
             st.rerun()
@@ -6375,76 +6451,68 @@ def pregnancy_form(test_id: int):
             if notes:
                 results += f"\nNotes: {notes}"
 
+            # Completing the test also returns the patient to the doctor queue
             db_manager = get_db_manager()
-            db_manager.complete_lab_test(test_id, results)
+            lab_info = db_manager.complete_lab_test(test_id, results,
+                                                    return_to_doctor=True)
 
-            # Get patient info for broadcast
-            conn = sqlite3.connect(db_manager.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.name 
-                FROM lab_tests lt
-                JOIN visits v ON lt.visit_id = v.visit_id
-                JOIN patients p ON v.patient_id = p.patient_id
-                WHERE lt.test_id = ?
-            ''', (test_id,))
-            lab_result = cursor.fetchone()
-            conn.close()
-            
-            if lab_result:
-                patient_name = lab_result[0]
+            if lab_info:
+                patient_name, _ = lab_info
                 broadcast_to_clients(f"lab_complete:{patient_name}:pregnancy:{result}")
-                
-                # Automatically send patient back to doctor queue
-                visit_conn = sqlite3.connect(db_manager.db_name)
-                visit_cursor = visit_conn.cursor()
-                visit_cursor.execute('''
-                    SELECT visit_id FROM lab_tests WHERE test_id = ?
-                ''', (test_id,))
-                visit_result = visit_cursor.fetchone()
-                
-                if visit_result:
-                    visit_id = visit_result[0]
-                    visit_cursor.execute('''
-                        UPDATE visits 
-                        SET status = 'waiting_consultation', return_reason = 'pharmacy_lab_review'
-                        WHERE visit_id = ?
-                    ''', (visit_id,))
-                    visit_conn.commit()
-                    
-                    # Broadcast patient return to doctor
-                    broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:pregnancy_complete")
-                    
-                visit_conn.close()
+                broadcast_to_clients(f"patient_returned_to_doctor:{patient_name}:pregnancy_complete")
 
             st.success("Pregnancy test completed! Patient automatically returned to doctor.")
             st.rerun()
 
 
-def completed_lab_tests():
-    st.markdown("### Today's Lab Results")
+COMPLETED_LAB_SQL = '''
+    SELECT lt.id, lt.visit_id, lt.test_type, lt.completed_time, lt.results,
+           p.name as patient_name, p.patient_id
+    FROM lab_tests lt
+    JOIN visits v ON lt.visit_id = v.visit_id
+    JOIN patients p ON v.patient_id = p.patient_id
+    WHERE lt.status = 'completed' AND lt.completed_time >= ? AND lt.completed_time < ?
+    ORDER BY lt.completed_time DESC
+'''
 
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT lt.*, p.name as patient_name, p.patient_id
-        FROM lab_tests lt
-        JOIN visits v ON lt.visit_id = v.visit_id
-        JOIN patients p ON v.patient_id = p.patient_id
-        WHERE lt.status = 'completed' AND DATE(lt.completed_time) = DATE('now')
-        ORDER BY lt.completed_time DESC
-    ''')
+@st.cache_data(ttl=30)
+def todays_completed_lab_tests(day: str) -> List[Dict]:
+    """Today's completed lab tests with patient names (cached)"""
+    with db._reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute(COMPLETED_LAB_SQL, today_bounds(day))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@st.fragment
+def completed_lab_tests():
+    st.markdown("### Today's Lab Results")
 
-    completed_tests = cursor.fetchall()
-    conn.close()
+    completed_tests = todays_completed_lab_tests(date.today().isoformat())
 
     if completed_tests:
         for test in completed_tests:
-            with st.expander(f"✅ {test[8]} (ID: {test[9]}) - {test[2]}"):
-                st.write(f"**Completed:** {test[5][:16].replace('T', ' ')}")
+            open_key = f"open_completed_{test['id']}"
+            is_open = st.session_state.get(open_key, False)
+
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                st.markdown(f"**✅ {test['patient_name']}** (ID: {test['patient_id']}) - {test['test_type']}")
+            with col2:
+                if st.button("Hide" if is_open else "Details",
+                             key=f"toggle_{open_key}",
+                             use_container_width=True):
+                    st.session_state[open_key] = not is_open
+                    st.rerun(scope="fragment")
+
+            if not is_open:
+                continue
+
+            with st.container(border=True):
+                st.write(f"**Completed:** {test['completed_time'][:16].replace('T', ' ')}")
                 st.write(f"**Results:**")
-                st.text(test[6])
+                st.text(test['results'])
 
                 # Post-lab treatment options
                 st.markdown("#### Post-Lab Treatment Decision")
@@ -6452,92 +6520,81 @@ def completed_lab_tests():
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button("Treated by Pharmacy",
-                                 key=f"pharmacy_{test[0]}",
+                                 key=f"pharmacy_{test['id']}",
                                  type="primary"):
                         # Update lab test to indicate pharmacy treatment
-                        conn = sqlite3.connect("clinic_database.db")
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            '''
-                            UPDATE lab_tests SET notes = COALESCE(notes, '') || ' - TREATED BY PHARMACY'
-                            WHERE id = ?
-                        ''', (test[0], ))
-                        conn.commit()
-                        conn.close()
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute(
+                                '''
+                                UPDATE lab_tests SET notes = COALESCE(notes, '') || ' - TREATED BY PHARMACY'
+                                WHERE id = ?
+                            ''', (test['id'], ))
+                        clear_todays_listings()
                         st.success("Marked as treated by pharmacy")
-                        st.rerun()
+                        st.rerun(scope="fragment")
 
                 with col2:
                     if st.button("Return to Provider",
-                                 key=f"provider_{test[0]}",
+                                 key=f"provider_{test['id']}",
                                  type="secondary"):
                         # Create new consultation requirement
-                        visit_id = test[1]  # visit_id from the test
-                        conn = sqlite3.connect("clinic_database.db")
-                        cursor = conn.cursor()
-
-                        # Update visit status to require consultation
-                        cursor.execute(
-                            '''
-                            UPDATE visits SET status = 'waiting_consultation'
-                            WHERE visit_id = ?
-                        ''', (visit_id, ))
+                        visit_id = test['visit_id']
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
 
-                        # Add note to lab test
-                        cursor.execute(
-                            '''
-                            UPDATE lab_tests SET notes = COALESCE(notes, '') || ' - RETURNED TO PROVIDER'
-                            WHERE id = ?
-                        ''', (test[0], ))
+                            # Update visit status to require consultation
+                            cursor.execute(
+                                '''
+                                UPDATE visits SET status = 'waiting_consultation'
+                                WHERE visit_id = ?
+                            ''', (visit_id, ))
 
-                        conn.commit()
-                        conn.close()
+                            # Add note to lab test
+                            cursor.execute(
+                                '''
+                                UPDATE lab_tests SET notes = COALESCE(notes, '') || ' - RETURNED TO PROVIDER'
+                                WHERE id = ?
+                            ''', (test['id'], ))
+                        clear_todays_listings()
                         st.success("Patient returned to consultation queue")
-                        st.rerun()
+                        st.rerun(scope="fragment")
     else:
         st.info("No lab tests completed today.")
 
 
+PATIENT_LIST_LIMIT = 200
+
+
 def patient_management():
     add_to_history('patient_management')
     st.markdown("### Patient Management")
 
-    # Get all patients first
     db = get_db_manager()
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT patient_id, name, age, gender, phone, emergency_contact, 
-               medical_history, allergies, created_date, last_visit
-        FROM patients
-        ORDER BY created_date DESC
-    ''')
-    all_patients = cursor.fetchall()
-    conn.close()
-
-    # Convert to list of dictionaries
-    columns = [
-        'patient_id', 'name', 'age', 'gender', 'phone', 'emergency_contact',
-        'medical_history', 'allergies', 'created_date', 'last_visit'
-    ]
-    patients = [dict(zip(columns, row)) for row in all_patients]
+    with db._reader() as conn:
+        patient_count = conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
 
     # Search filter
     search_query = st.text_input("Search Patients",
                                  placeholder="Filter by name or ID")
 
-    # Filter patients based on search
+    # Let SQLite do the filtering (FTS and LIKE matches) instead of loading
+    # every patient; without a query show the most recently registered
     if search_query:
-        filtered_patients = [
-            p for p in patients if search_query.lower() in p['name'].lower()
-            or search_query.lower() in p['patient_id'].lower()
-        ]
+        filtered_patients = db.search_patients(search_query,
+                                               limit=PATIENT_LIST_LIMIT)
     else:
-        filtered_patients = patients
+        with db._reader() as conn:
+            filtered_patients = conn.execute('''
+                SELECT patient_id, name, age, last_visit
+                FROM patients
+                ORDER BY created_date DESC
+                LIMIT ?
+            ''', (PATIENT_LIST_LIMIT, )).fetchall()
 
     if filtered_patients:
         st.info(
-            f"Showing {len(filtered_patients)} of {len(patients)} patients")
+            f"Showing {len(filtered_patients)} of {patient_count} patients")
         st.warning(
             "⚠️ Deleting a patient will permanently remove all their data including visits, prescriptions, and lab results."
         )
@@ -6570,38 +6627,8 @@ def patient_management():
                                     "✓",
                                     key=f"confirm_{patient['patient_id']}",
                                     help="Confirm delete"):
-                                # Perform the actual deletion using direct database operations
-                                try:
-                                    conn = sqlite3.connect(
-                                        "clinic_database.db")
-                                    cursor = conn.cursor()
-                                    cursor.execute('PRAGMA foreign_keys = OFF')
-
-                                    patient_id = patient['patient_id']
-
-                                    # Delete all related data
-                                    cursor.execute(
-                                        'DELETE FROM vital_signs WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                                        (patient_id, ))
-                                    cursor.execute(
-                                        'DELETE FROM prescriptions WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                                        (patient_id, ))
-                                    cursor.execute(
-                                        'DELETE FROM lab_tests WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                                        (patient_id, ))
-                                    cursor.execute(
-                                        'DELETE FROM consultations WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                                        (patient_id, ))
-                                    cursor.execute(
-                                        'DELETE FROM visits WHERE patient_id = ?',
-                                        (patient_id, ))
-                                    cursor.execute(
-                                        'DELETE FROM patients WHERE patient_id = ?',
-                                        (patient_id, ))
-
-                                    conn.commit()
-                                    conn.close()
-
+                                # delete_patient removes visits, results and photos in one transaction
+                                if db.delete_patient(patient['patient_id']):
                                     st.success(
                                         f"Patient {patient['name']} deleted successfully."
                                     )
@@ -6609,11 +6636,9 @@ def patient_management():
                                     if delete_key in st.session_state:
                                         del st.session_state[delete_key]
                                     st.rerun()
-                                except Exception as e:
+                                else:
                                     st.error(
-                                        f"Failed to delete patient: {str(e)}")
-                                    if 'conn' in locals():
-                                        conn.close()
+                                        f"Failed to delete patient {patient['name']}")
                         with cancel_col:
                             if st.button("✕",
                                          key=f"cancel_{patient['patient_id']}",
@@ -6655,62 +6680,15 @@ def patient_management():
                          type="primary",
                          key="confirm_delete_btn",
                          use_container_width=True):
-                # Simple deletion - disable foreign keys and delete everything
-                conn = sqlite3.connect(db.db_name)
-                cursor = conn.cursor()
-                cursor.execute('PRAGMA foreign_keys = OFF')
-
-                patient_id = patient_to_delete['patient_id']
-
-                try:
-                    # Delete all related data - check if tables exist first
-                    cursor.execute(
-                        "SELECT name FROM sqlite_master WHERE type='table'")
-                    existing_tables = [row[0] for row in cursor.fetchall()]
-
-                    # Delete from tables that exist
-                    if 'vital_signs' in existing_tables:
-                        cursor.execute(
-                            'DELETE FROM vital_signs WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                            (patient_id, ))
-
-                    if 'prescriptions' in existing_tables:
-                        cursor.execute(
-                            'DELETE FROM prescriptions WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                            (patient_id, ))
-
-                    if 'lab_tests' in existing_tables:
-                        cursor.execute(
-                            'DELETE FROM lab_tests WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                            (patient_id, ))
-
-                    if 'consultations' in existing_tables:
-                        cursor.execute(
-                            'DELETE FROM consultations WHERE visit_id IN (SELECT visit_id FROM visits WHERE patient_id = ?)',
-                            (patient_id, ))
-
-                    if 'visits' in existing_tables:
-                        cursor.execute(
-                            'DELETE FROM visits WHERE patient_id = ?',
-                            (patient_id, ))
-
-                    # Delete patient
-                    cursor.execute('DELETE FROM patients WHERE patient_id = ?',
-                                   (patient_id, ))
-
-                    conn.commit()
+                if db.delete_patient(patient_to_delete['patient_id']):
                     st.success(
                         f"Patient {patient_to_delete['patient_name']} deleted successfully."
                     )
-
-                except Exception as e:
-                    conn.rollback()
-                    st.error(f"Error during deletion: {str(e)}")
-
-                finally:
-                    conn.close()
                     del st.session_state.confirm_delete
                     st.rerun()
+                else:
+                    st.error(
+                        f"Error during deletion of {patient_to_delete['patient_name']}")
 
         with col2:
             if st.button("❌ CANCEL",
@@ -6775,6 +6753,20 @@ def admin_interface():
         clinic_settings()
 
 
+# Above this many doctors the list is drawn as a single table
+DOCTOR_TABLE_THRESHOLD = 20
+
+
+def remove_doctor_clicked(name: str):
+    """Remove callback; runs before the doctor list is redrawn"""
+    if get_db_manager().remove_doctor(name):
+        st.success(f"Doctor {name} removed.")
+    else:
+        st.error("Failed to remove doctor.")
+
+
+# Fragments so admin actions rerun only their own tab, not the whole page
+@st.fragment
 def doctor_management():
     """Admin interface for managing doctors"""
     add_to_history('doctor_management')
@@ -6792,7 +6784,6 @@ def doctor_management():
                 if doctor_name.strip():
                     if db.add_doctor(doctor_name.strip()):
                         st.success(f"Doctor {doctor_name} added successfully!")
-                        st.rerun()
                     else:
                         st.error(
                             "Failed to add doctor. Name may already exist.")
@@ -6801,66 +6792,98 @@ def doctor_management():
 
     # Display current doctors and their status
     st.markdown("#### Current Doctors")
-    doctors = db.get_doctors()
-    doctor_status = db.get_all_doctor_status()
+    doctors = get_doctors()
+    doctor_status = get_doctor_status()
+
+    status_by_name = {s['doctor_name']: s for s in doctor_status or []}
+    if len(doctors) > DOCTOR_TABLE_THRESHOLD:
+        # One table payload instead of a row of widgets per doctor
+        rows = []
+        for doctor in doctors:
+            current_status = status_by_name.get(doctor['name'])
+            current = current_status['status'] if current_status else 'offline'
+            rows.append({
+                'Doctor': doctor['name'],
+                'Status': f"{DOCTOR_STATUS_EMOJI.get(current, '🔴')} "
+                          f"{DOCTOR_STATUS_LABEL.get(current, current)}",
+                'Patient': (current_status['current_patient_name'] or ""
+                            if current_status else "")
+            })
+        st.dataframe(pd.DataFrame(rows),
+                     hide_index=True,
+                     use_container_width=True)
 
-    if doctors:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            selected = st.selectbox("Doctor to remove",
+                                    [doctor['name'] for doctor in doctors],
+                                    key="remove_doctor_select")
+        with col2:
+            st.button("Remove",
+                      key="remove_doctor_selected",
+                      type="secondary",
+                      on_click=remove_doctor_clicked,
+                      args=(selected, ))
+    elif doctors:
         for doctor in doctors:
+            name = doctor['name']
             # Find current status for this doctor
-            current_status = next(
-                (s
-                 for s in doctor_status if s['doctor_name'] == doctor['name']),
-                None)
+            current_status = status_by_name.get(name)
 
             col1, col2, col3 = st.columns([2, 2, 1])
 
             with col1:
-                st.write(f"**{doctor['name']}**")
+                st.write(f"**{name}**")
 
             with col2:
                 if current_status:
-                    status_color = "🟢" if current_status[
-                        'status'] == 'available' else "🟡" if current_status[
-                            'status'] == 'with_patient' else "🔴"
+                    current = current_status['status']
+                    status_color = DOCTOR_STATUS_EMOJI.get(current, "🔴")
                     patient_info = f" - {current_status['current_patient_name']}" if current_status[
                         'current_patient_id'] else ""
                     st.write(
-                        f"{status_color} {current_status['status'].replace('_', ' ').title()}{patient_info}"
+                        f"{status_color} {DOCTOR_STATUS_LABEL.get(current, current)}{patient_info}"
                     )
                 else:
                     st.write("🔴 Offline")
 
             with col3:
-                if st.button("Remove",
-                             key=f"remove_doctor_{doctor['name']}",
-                             type="secondary"):
-                    if db.remove_doctor(doctor['name']):
-                        st.success(f"Doctor {doctor['name']} removed.")
-                        st.rerun()
-                    else:
-                        st.error("Failed to remove doctor.")
+                st.button("Remove",
+                          key=f"remove_doctor_{name}",
+                          type="secondary",
+                          on_click=remove_doctor_clicked,
+                          args=(name, ))
     else:
         st.info("No doctors in the system.")
 
     # Real-time status updates
     st.markdown("#### Real-Time Doctor Status")
-    if st.button("🔄 Refresh Status"):
-        st.rerun()
+    # Clicking reruns only this fragment, which re-reads the status
+    st.button("🔄 Refresh Status")
 
     if doctor_status:
         for status in doctor_status:
-            status_color = "🟢" if status[
-                'status'] == 'available' else "🟡" if status[
-                    'status'] == 'with_patient' else "🔴"
+            status_color = DOCTOR_STATUS_EMOJI.get(status['status'], "🔴")
             patient_info = f" - {status['current_patient_name']} ({status['current_patient_id']})" if status[
                 'current_patient_id'] else ""
-            last_update = status['last_updated'][:16].replace(
-                'T', ' ') if status['last_updated'] else "Unknown"
-
             st.write(
-                f"{status_color} **{status['doctor_name']}** - {status['status'].replace('_', ' ').title()}{patient_info}"
+                f"{status_color} **{status['doctor_name']}** - {DOCTOR_STATUS_LABEL.get(status['status'], status['status'])}{patient_info}"
             )
-            st.caption(f"Last updated: {last_update}")
+            st.caption(f"Last updated: {status['last_updated_fmt'] or 'Unknown'}")
+
+
+def set_medication_editing(edit_key: str, editing: bool):
+    """Edit/Cancel callback for a preset medication row"""
+    st.session_state[edit_key] = editing
+
+
+def delete_preset_medication(med_id: int):
+    """Delete callback; runs before the medication list is read"""
+    with get_conn_lock(), get_conn() as conn:
+        conn.execute('DELETE FROM preset_medications WHERE id = ?', (med_id, ))
+    get_preset_medications.clear()
+    get_medications_by_category.clear()
+    st.success("Medication removed!")
 
 
 def medication_management():
@@ -6878,9 +6901,6 @@ def medication_management():
                 )
             else:
                 st.info("No duplicates found")
-            st.rerun()
-
-    medications = db.get_preset_medications()
 
     # Add new medication
     with st.expander("Add New Medication"):
@@ -6904,41 +6924,79 @@ def medication_management():
 
             if st.form_submit_button("Add Medication"):
                 if med_name:
-                    conn = sqlite3.connect(db.db_name)
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        '''
-                        INSERT INTO preset_medications (medication_name, common_dosages, category, requires_lab, amount, indications)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (med_name, dosages, category, "no", amount, indications))
-                    conn.commit()
-                    conn.close()
+                    with get_conn_lock(), get_conn() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute(
+                            '''
+                            INSERT INTO preset_medications (medication_name, common_dosages, category, requires_lab, amount, indications)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', (med_name, dosages, category, "no", amount, indications))
+                    get_preset_medications.clear()
+                    get_medications_by_category.clear()
                     st.success("Medication added!")
-                    st.rerun()
+
+    with st.expander("Add Multiple Medications"):
+        with st.form("new_medications_batch"):
+            batch = st.text_area(
+                "One medication per line: name|dosages|category",
+                placeholder="Ibuprofen|200mg, 400mg|Pain Relief\nCetirizine|10mg|Other",
+                height=150)
+
+            if st.form_submit_button("Add Medications"):
+                rows = []
+                for line in batch.splitlines():
+                    parts = [part.strip() for part in line.split('|')]
+                    if not parts[0]:
+                        continue
+                    parts += [''] * (3 - len(parts))
+                    rows.append((parts[0], parts[1], parts[2] or "Other", "no"))
+
+                if rows:
+                    # One write lock and one commit for the whole batch
+                    with get_conn_lock(), get_conn() as conn:
+                        if not conn.in_transaction:
+                            conn.execute('BEGIN IMMEDIATE')
+                        conn.executemany(
+                            '''
+                            INSERT INTO preset_medications (medication_name, common_dosages, category, requires_lab)
+                            VALUES (?, ?, ?, ?)
+                        ''', rows)
+                    get_preset_medications.clear()
+                    get_medications_by_category.clear()
+                    st.success(f"Added {len(rows)} medications!")
+                else:
+                    st.warning("Enter at least one medication name.")
+
+    # Read after the forms above so additions show without another rerun
+    medications = get_preset_medications()
 
     # Display existing medications
     if medications:
-        for category in set(med['category'] for med in medications):
+        # Group in one pass rather than re-scanning the list per category
+        meds_by_category = {}
+        for med in medications:
+            meds_by_category.setdefault(med['category'], []).append(med)
+
+        for category, category_meds in meds_by_category.items():
             with st.expander(f"{category} Medications"):
-                category_meds = [
-                    med for med in medications if med['category'] == category
-                ]
                 for med in category_meds:
+                    # Unpack the row once instead of re-indexing it per widget
+                    med_id, med_name = med['id'], med['medication_name']
                     # Check if this medication is being edited
-                    edit_key = f"edit_{med['id']}"
+                    edit_key = f"edit_{med_id}"
                     is_editing = st.session_state.get(edit_key, False)
 
                     if is_editing:
                         # Edit form
-                        with st.form(f"edit_form_{med['id']}"):
+                        with st.form(f"edit_form_{med_id}"):
                             st.markdown(
-                                f"**Editing: {med['medication_name']}**")
+                                f"**Editing: {med_name}**")
 
                             col1, col2 = st.columns(2)
                             with col1:
                                 new_name = st.text_input(
                                     "Medication Name",
-                                    value=med['medication_name'])
+                                    value=med_name)
                                 new_dosages = st.text_area(
                                     "Common Dosages",
                                     value=med['common_dosages'],
@@ -6972,21 +7030,20 @@ def medication_management():
                                 if st.form_submit_button("Save Changes",
                                                          type="primary"):
                                     if new_name and new_name.strip():
-                                        conn = sqlite3.connect(
-                                            "clinic_database.db")
-                                        cursor = conn.cursor()
-                                        cursor.execute(
-                                            '''
-                                            UPDATE preset_medications 
-                                            SET medication_name = ?, common_dosages = ?, category = ?, amount = ?, indications = ?
-                                            WHERE id = ?
-                                        ''',
-                                            (new_name.strip(),
-                                             new_dosages.strip() if new_dosages
-                                             else "", new_category, new_amount.strip() if new_amount else "", 
-                                             new_indications.strip() if new_indications else "", med['id']))
-                                        conn.commit()
-                                        conn.close()
+                                        with get_conn_lock(), get_conn() as conn:
+                                            cursor = conn.cursor()
+                                            cursor.execute(
+                                                '''
+                                                UPDATE preset_medications 
+                                                SET medication_name = ?, common_dosages = ?, category = ?, amount = ?, indications = ?
+                                                WHERE id = ?
+                                            ''',
+                                                (new_name.strip(),
+                                                 new_dosages.strip() if new_dosages
+                                                 else "", new_category, new_amount.strip() if new_amount else "", 
+                                                 new_indications.strip() if new_indications else "", med_id))
+                                        get_preset_medications.clear()
+                                        get_medications_by_category.clear()
                                         st.session_state[edit_key] = False
                                         st.success("Medication updated!")
                                         st.rerun()
@@ -6995,14 +7052,15 @@ def medication_management():
                                             "Medication name cannot be empty")
 
                             with col_cancel:
-                                if st.form_submit_button("Cancel"):
-                                    st.session_state[edit_key] = False
-                                    st.rerun()
+                                st.form_submit_button(
+                                    "Cancel",
+                                    on_click=set_medication_editing,
+                                    args=(edit_key, False))
                     else:
                         # Display mode
                         col1, col2, col3, col4 = st.columns([4, 1, 1, 1])
                         with col1:
-                            st.write(f"**{med['medication_name']}**")
+                            st.write(f"**{med_name}**")
                             st.caption(f"Dosages: {med['common_dosages']}")
                             if med.get('amount'):
                                 st.caption(f"Amount: {med['amount']}")
@@ -7011,199 +7069,183 @@ def medication_management():
                         with col2:
                             st.write(f"{med['category']}")
                         with col3:
-                            if st.button("Edit",
-                                         key=f"edit_btn_{med['id']}",
-                                         type="secondary"):
-                                st.session_state[edit_key] = True
-                                st.rerun()
+                            st.button("Edit",
+                                      key=f"edit_btn_{med_id}",
+                                      type="secondary",
+                                      on_click=set_medication_editing,
+                                      args=(edit_key, True))
                         with col4:
-                            if st.button("Delete",
-                                         key=f"delete_{med['id']}",
-                                         type="secondary"):
-                                conn = sqlite3.connect("clinic_database.db")
-                                cursor = conn.cursor()
-                                cursor.execute(
-                                    'DELETE FROM preset_medications WHERE id = ?',
-                                    (med['id'], ))
-                                conn.commit()
-                                conn.close()
-                                st.success("Medication removed!")
-                                st.rerun()
+                            st.button("Delete",
+                                      key=f"delete_{med_id}",
+                                      type="secondary",
+                                      on_click=delete_preset_medication,
+                                      args=(med_id, ))
+
 
+@st.cache_data(ttl=60)
+def daily_counts(day: str) -> tuple:
+    """Today's visit, completed, prescription and lab counts (cached)"""
+    with db._reader() as conn:
+        cursor = conn.cursor()
 
+        # All four counts in one round trip
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM visits
+                 WHERE visit_date >= ? AND visit_date < ?),
+                (SELECT COUNT(*) FROM visits
+                 WHERE status = 'completed' AND visit_date >= ? AND visit_date < ?),
+                (SELECT COUNT(*) FROM prescriptions
+                 WHERE prescribed_time >= ? AND prescribed_time < ?),
+                (SELECT COUNT(*) FROM lab_tests
+                 WHERE ordered_time >= ? AND ordered_time < ?)
+        ''', today_bounds(day) * 4)
+        return tuple(cursor.fetchone())
+
+
+@st.fragment
 def daily_reports():
     add_to_history('daily_reports')
-    st.markdown("### Daily Statistics")
-
-    conn = sqlite3.connect(db.db_name)
-    cursor = conn.cursor()
-
-    # Patient counts
-    cursor.execute(
-        "SELECT COUNT(*) FROM visits WHERE DATE(visit_date) = DATE('now')")
-    today_patients = cursor.fetchone()[0]
-
-    cursor.execute(
-        "SELECT COUNT(*) FROM visits WHERE status = 'completed' AND DATE(visit_date) = DATE('now')"
-    )
-    completed_patients = cursor.fetchone()[0]
-
-    cursor.execute(
-        "SELECT COUNT(*) FROM prescriptions WHERE DATE(prescribed_time) = DATE('now')"
-    )
-    prescriptions_written = cursor.fetchone()[0]
+    # One date per render for the counts, export and file names below
+    today = date.today().isoformat()
+    reports_tab, onedrive_tab = st.tabs(["📊 Reports", "☁️ OneDrive"])
 
-    cursor.execute(
-        "SELECT COUNT(*) FROM lab_tests WHERE DATE(ordered_time) = DATE('now')"
-    )
-    lab_tests_ordered = cursor.fetchone()[0]
-
-    conn.close()
-
-    col1, col2, col3, col4 = st.columns(4)
-
-    with col1:
-        st.metric("Total Patients", today_patients)
-    with col2:
-        st.metric("Completed", completed_patients)
-    with col3:
-        st.metric("Prescriptions", prescriptions_written)
-    with col4:
-        st.metric("Lab Tests", lab_tests_ordered)
+    with reports_tab:
+        st.markdown("### Daily Statistics")
 
-    st.markdown("---")
+        (today_patients, completed_patients, prescriptions_written,
+         lab_tests_ordered) = daily_counts(today)
 
-    # Data Export
-    st.markdown("### Data Export")
+        col1, col2, col3, col4 = st.columns(4)
 
-    # Generate export data when button is clicked
-    export_data = generate_daily_export()
-    csv_data = export_data.to_csv(index=False)
-    today_date = datetime.now().strftime("%Y-%m-%d")
-    filename = f"parakaleo_clinic_data_{today_date}.csv"
+        with col1:
+            st.metric("Total Patients", today_patients)
+        with col2:
+            st.metric("Completed", completed_patients)
+        with col3:
+            st.metric("Prescriptions", prescriptions_written)
+        with col4:
+            st.metric("Lab Tests", lab_tests_ordered)
 
-    # Full-width download button
-    st.download_button(label="📄 Download Today's Data (CSV)",
-                       data=csv_data,
-                       file_name=filename,
-                       mime="text/csv",
-                       type="primary",
-                       use_container_width=True)
+        st.markdown("---")
 
-    st.markdown("---")
+        # Data Export
+        st.markdown("### Data Export")
 
-    # OneDrive connection as secondary option
-    if st.button("☁️ Connect to OneDrive",
-                 type="secondary",
-                 use_container_width=True):
-        st.session_state.show_onedrive = True
-        st.rerun()
+        # Generate export data when button is clicked
+        export_data = generate_daily_export(today)
+        # Write the CSV straight to bytes in chunks rather than building one big str
+        csv_data = BytesIO()
+        export_data.to_csv(csv_data, index=False, chunksize=1000)
+        csv_data.seek(0)
+        filename = f"parakaleo_clinic_data_{today}.csv"
 
-    # Show OneDrive integration if requested
-    if 'show_onedrive' in st.session_state and st.session_state.show_onedrive:
-        onedrive_integration()
-        if st.button("Back to Reports"):
-            st.session_state.show_onedrive = False
-            st.rerun()
-        return
+        # Full-width download button
+        st.download_button(label="📄 Download Today's Data (CSV)",
+                           data=csv_data,
+                           file_name=filename,
+                           mime="text/csv",
+                           type="primary",
+                           use_container_width=True)
 
-    # OneDrive backup instructions
-    with st.expander("OneDrive Backup Instructions"):
-        st.markdown("""
-        **To backup your clinic data to OneDrive:**
+        # OneDrive backup instructions
+        with st.expander("OneDrive Backup Instructions"):
+            st.markdown("""
+            **To backup your clinic data to OneDrive:**
         
-        1. **Download the CSV file** using the "Export Today's Data" button above
+            1. **Download the CSV file** using the "Export Today's Data" button above
         
-        2. **Open OneDrive app** on your iPad:
-           - Look for the blue OneDrive icon on your home screen
-           - Sign in with your Microsoft account if needed
+            2. **Open OneDrive app** on your iPad:
+               - Look for the blue OneDrive icon on your home screen
+               - Sign in with your Microsoft account if needed
         
-        3. **Upload the file**:
-           - Tap the "+" button in OneDrive
-           - Select "Upload files"
-           - Choose the downloaded CSV file from your Downloads folder
+            3. **Upload the file**:
+               - Tap the "+" button in OneDrive
+               - Select "Upload files"
+               - Choose the downloaded CSV file from your Downloads folder
         
-        4. **Organize in folders**:
-           - Create a folder called "ParakaleoMed Backups"
-           - Create subfolders by date (e.g., "2025-06-15")
-           - Move your daily export files into the appropriate date folder
+            4. **Organize in folders**:
+               - Create a folder called "ParakaleoMed Backups"
+               - Create subfolders by date (e.g., "2025-06-15")
+               - Move your daily export files into the appropriate date folder
         
-        5. **Automatic sync**:
-           - OneDrive will automatically sync to the cloud
-           - Access your data from any device by logging into OneDrive
+            5. **Automatic sync**:
+               - OneDrive will automatically sync to the cloud
+               - Access your data from any device by logging into OneDrive
         
-        **Important**: Export and backup data daily to ensure no patient information is lost.
-        """)
-
+            **Important**: Export and backup data daily to ensure no patient information is lost.
+            """)
 
-def generate_daily_export():
-    """Generate comprehensive daily data export"""
-    import pandas as pd
+    with onedrive_tab:
+        onedrive_integration(today)
 
-    conn = sqlite3.connect(db.db_name)
 
+@st.cache_data(ttl=60)
+def generate_daily_export(day: str):
+    """Generate comprehensive daily data export (cached)"""
     # Get today's data
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    # Export patients visited today
-    patients_query = '''
-        SELECT p.patient_id, p.name, p.age, p.gender, v.visit_date, v.status
-        FROM patients p
-        JOIN visits v ON p.patient_id = v.patient_id
-        WHERE DATE(v.visit_date) = ?
-    '''
-
-    patients_df = pd.read_sql_query(patients_query, conn, params=[today])
-
-    # Export prescriptions from today
-    prescriptions_query = '''
-        SELECT pr.medication_name, pr.dosage, pr.frequency, pr.duration, 
-               pr.awaiting_lab, p.name as patient_name, p.patient_id
-        FROM prescriptions pr
-        JOIN visits v ON pr.visit_id = v.visit_id
-        JOIN patients p ON v.patient_id = p.patient_id
-        WHERE DATE(pr.prescribed_time) = ?
-    '''
-
-    prescriptions_df = pd.read_sql_query(prescriptions_query,
-                                         conn,
-                                         params=[today])
-
-    # Export lab tests from today
-    lab_tests_query = '''
-        SELECT lt.test_type, lt.status, lt.results, p.name as patient_name, p.patient_id
-        FROM lab_tests lt
-        JOIN visits v ON lt.visit_id = v.visit_id
-        JOIN patients p ON v.patient_id = p.patient_id
-        WHERE DATE(lt.ordered_time) = ?
-    '''
-
-    lab_tests_df = pd.read_sql_query(lab_tests_query, conn, params=[today])
-
-    conn.close()
-
-    # Combine all data into one export
-    export_data = pd.DataFrame()
-
-    if not patients_df.empty:
-        export_data = pd.concat(
-            [export_data, patients_df.add_prefix('patient_')],
-            ignore_index=True)
-
-    if not prescriptions_df.empty:
-        export_data = pd.concat(
-            [export_data,
-             prescriptions_df.add_prefix('prescription_')],
-            ignore_index=True)
-
-    if not lab_tests_df.empty:
-        export_data = pd.concat(
-            [export_data, lab_tests_df.add_prefix('lab_')], ignore_index=True)
-
+    day_range = today_bounds(day)
+
+    # Patients visited, prescriptions written and lab tests ordered today in
+    # one query; each branch fills only its own prefixed columns
+    with db._reader() as conn:
+        export_data = pd.read_sql_query('''
+            WITH visit_patients AS (
+                SELECT v.visit_id, v.visit_date, v.status, p.patient_id, p.name,
+                       p.age, p.gender
+                FROM visits v
+                JOIN patients p ON v.patient_id = p.patient_id
+            )
+            SELECT 0 AS section,
+                   vp.patient_id AS patient_patient_id, vp.name AS patient_name,
+                   vp.age AS patient_age, vp.gender AS patient_gender,
+                   vp.visit_date AS patient_visit_date, vp.status AS patient_status,
+                   NULL AS prescription_medication_name, NULL AS prescription_dosage,
+                   NULL AS prescription_frequency, NULL AS prescription_duration,
+                   NULL AS prescription_awaiting_lab, NULL AS prescription_patient_name,
+                   NULL AS prescription_patient_id,
+                   NULL AS lab_test_type, NULL AS lab_status, NULL AS lab_results,
+                   NULL AS lab_patient_name, NULL AS lab_patient_id
+            FROM visit_patients vp
+            WHERE vp.visit_date >= :start AND vp.visit_date < :end
+
+            UNION ALL
+
+            SELECT 1, NULL, NULL, NULL, NULL, NULL, NULL,
+                   pr.medication_name, pr.dosage, pr.frequency, pr.duration,
+                   pr.awaiting_lab, vp.name, vp.patient_id,
+                   NULL, NULL, NULL, NULL, NULL
+            FROM prescriptions pr
+            JOIN visit_patients vp ON pr.visit_id = vp.visit_id
+            WHERE pr.prescribed_time >= :start AND pr.prescribed_time < :end
+
+            UNION ALL
+
+            SELECT 2, NULL, NULL, NULL, NULL, NULL, NULL,
+                   NULL, NULL, NULL, NULL, NULL, NULL, NULL,
+                   lt.test_type, lt.status, lt.results, vp.name, vp.patient_id
+            FROM lab_tests lt
+            JOIN visit_patients vp ON lt.visit_id = vp.visit_id
+            WHERE lt.ordered_time >= :start AND lt.ordered_time < :end
+
+            ORDER BY section
+        ''', conn, params={'start': day_range[0], 'end': day_range[1]})
+
+    # Leave out the columns of sections with nothing to report today
+    present = set(export_data['section'])
+    export_data = export_data[[
+        column for column in export_data.columns
+        if column != 'section' and
+        (column.startswith('patient_') and 0 in present or
+         column.startswith('prescription_') and 1 in present or
+         column.startswith('lab_') and 2 in present)
+    ]]
+    if export_data.empty:
+        return pd.DataFrame()
     return export_data
 
 
-def onedrive_integration():
+def onedrive_integration(today: str):
     """Handle OneDrive connection and backup"""
     st.markdown("### OneDrive Integration")
 
@@ -7235,10 +7277,9 @@ def onedrive_integration():
             )
 
             # Generate and prepare data for upload
-            export_data = generate_daily_export()
+            export_data = generate_daily_export(today)
             csv_data = export_data.to_csv(index=False)
-            today_date = datetime.now().strftime("%Y-%m-%d")
-            filename = f"parakaleo_clinic_data_{today_date}.csv"
+            filename = f"parakaleo_clinic_data_{today}.csv"
 
             st.download_button(label="Download for Manual Upload to OneDrive",
                                data=csv_data,
@@ -7254,10 +7295,9 @@ def onedrive_integration():
     st.markdown("#### Manual Backup to OneDrive")
 
     if st.button("Prepare Manual Backup"):
-        export_data = generate_daily_export()
+        export_data = generate_daily_export(today)
         csv_data = export_data.to_csv(index=False)
-        today_date = datetime.now().strftime("%Y-%m-%d")
-        filename = f"parakaleo_clinic_backup_{today_date}.csv"
+        filename = f"parakaleo_clinic_backup_{today}.csv"
 
         st.download_button(label="Download Backup File",
                            data=csv_data,
@@ -7277,49 +7317,47 @@ def onedrive_integration():
 def ophthalmologist_interface():
     st.markdown("### 👁️ Ophthalmologist Interface")
 
-    # Ensure eye_examinations table exists
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
-
     # Create eye_examinations table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS eye_examinations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            visit_id TEXT,
-            patient_id TEXT,
-            eye_history TEXT,
-            visual_acuity_right TEXT,
-            visual_acuity_left TEXT,
-            eye_pressure_right TEXT,
-            eye_pressure_left TEXT,
-            eye_findings TEXT,
-            od_sphere TEXT,
-            od_cylinder TEXT,
-            od_axis TEXT,
-            os_sphere TEXT,
-            os_cylinder TEXT,
-            os_axis TEXT,
-            add_power TEXT,
-            pd TEXT,
-            recommendations TEXT,
-            examination_time TEXT,
-            FOREIGN KEY (visit_id) REFERENCES visits (visit_id),
-            FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
-        )
-    ''')
+    with get_conn_lock(), get_conn() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS eye_examinations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                visit_id TEXT,
+                patient_id TEXT,
+                eye_history TEXT,
+                visual_acuity_right TEXT,
+                visual_acuity_left TEXT,
+                eye_pressure_right TEXT,
+                eye_pressure_left TEXT,
+                eye_findings TEXT,
+                od_sphere TEXT,
+                od_cylinder TEXT,
+                od_axis TEXT,
+                os_sphere TEXT,
+                os_cylinder TEXT,
+                os_axis TEXT,
+                add_power TEXT,
+                pd TEXT,
+                recommendations TEXT,
+                examination_time TEXT,
+                FOREIGN KEY (visit_id) REFERENCES visits (visit_id),
+                FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
+            )
+        ''')
 
     # Get patients who need ophthalmology consultation
-    cursor.execute('''
-        SELECT v.visit_id, v.patient_id, p.name, c.needs_ophthalmology
-        FROM visits v
-        JOIN patients p ON v.patient_id = p.patient_id
-        LEFT JOIN consultations c ON v.visit_id = c.visit_id
-        WHERE c.needs_ophthalmology = 1 AND v.status != 'completed'
-        ORDER BY v.visit_date DESC
-    ''')
-
-    ophthalmology_patients = cursor.fetchall()
-    conn.close()
+    with db._reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT v.visit_id, v.patient_id, p.name, c.needs_ophthalmology
+            FROM visits v
+            JOIN patients p ON v.patient_id = p.patient_id
+            LEFT JOIN consultations c ON v.visit_id = c.visit_id
+            WHERE c.needs_ophthalmology = 1 AND v.status != 'completed'
+            ORDER BY v.visit_date DESC
+        ''')
+
+        ophthalmology_patients = cursor.fetchall()
 
     if ophthalmology_patients:
         st.markdown("#### Patients Needing Eye Examination")
@@ -7329,14 +7367,13 @@ def ophthalmologist_interface():
 
             with st.expander(f"👁️ {name} (ID: {patient_id})", expanded=False):
                 # Get patient's eye history
-                conn = sqlite3.connect("clinic_database.db")
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT medical_history, allergies FROM patients WHERE patient_id = ?',
-                    (patient_id, ))
-                patient_data = cursor.fetchone()
-                conn.close()
-
+                with db._reader() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        'SELECT medical_history, allergies FROM patients WHERE patient_id = ?',
+                        (patient_id, ))
+                    patient_data = cursor.fetchone()
+            
                 if patient_data:
                     st.markdown("**Current Medical History:**")
                     st.text(patient_data[0] or "No history recorded")
@@ -7400,8 +7437,8 @@ def ophthalmologist_interface():
 
                     add_power = st.text_input("Add Power (if needed)",
                                               placeholder="e.g., +1.50")
-                    pd = st.text_input("Pupillary Distance (PD)",
-                                       placeholder="e.g., 62mm")
+                    pupillary_distance = st.text_input("Pupillary Distance (PD)",
+                                                       placeholder="e.g., 62mm")
 
                     recommendations = st.text_area(
                         "Recommendations",
@@ -7410,68 +7447,66 @@ def ophthalmologist_interface():
                     if st.form_submit_button("Complete Eye Examination",
                                              type="primary"):
                         # Save eye examination data
-                        conn = sqlite3.connect("clinic_database.db")
-                        cursor = conn.cursor()
+                        with get_conn_lock(), get_conn() as conn:
+                            cursor = conn.cursor()
 
-                        # Create eye_examinations table if it doesn't exist
-                        cursor.execute('''
-                            CREATE TABLE IF NOT EXISTS eye_examinations (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                visit_id TEXT,
-                                patient_id TEXT,
-                                eye_history TEXT,
-                                visual_acuity_right TEXT,
-                                visual_acuity_left TEXT,
-                                eye_pressure_right TEXT,
-                                eye_pressure_left TEXT,
-                                eye_findings TEXT,
-                                od_sphere TEXT,
-                                od_cylinder TEXT,
-                                od_axis TEXT,
-                                os_sphere TEXT,
-                                os_cylinder TEXT,
-                                os_axis TEXT,
-                                add_power TEXT,
-                                pd TEXT,
-                                recommendations TEXT,
-                                examination_time TEXT,
-                                FOREIGN KEY (visit_id) REFERENCES visits (visit_id),
-                                FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
-                            )
-                        ''')
+                            # Create eye_examinations table if it doesn't exist
+                            cursor.execute('''
+                                CREATE TABLE IF NOT EXISTS eye_examinations (
+                                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                    visit_id TEXT,
+                                    patient_id TEXT,
+                                    eye_history TEXT,
+                                    visual_acuity_right TEXT,
+                                    visual_acuity_left TEXT,
+                                    eye_pressure_right TEXT,
+                                    eye_pressure_left TEXT,
+                                    eye_findings TEXT,
+                                    od_sphere TEXT,
+                                    od_cylinder TEXT,
+                                    od_axis TEXT,
+                                    os_sphere TEXT,
+                                    os_cylinder TEXT,
+                                    os_axis TEXT,
+                                    add_power TEXT,
+                                    pd TEXT,
+                                    recommendations TEXT,
+                                    examination_time TEXT,
+                                    FOREIGN KEY (visit_id) REFERENCES visits (visit_id),
+                                    FOREIGN KEY (patient_id) REFERENCES patients (patient_id)
+                                )
+                            ''')
 
-                        cursor.execute(
-                            '''
-                            INSERT INTO eye_examinations (
-                                visit_id, patient_id, eye_history, visual_acuity_right, visual_acuity_left,
-                                eye_pressure_right, eye_pressure_left, eye_findings, od_sphere, od_cylinder,
-                                od_axis, os_sphere, os_cylinder, os_axis, add_power, pd, recommendations,
-                                examination_time
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (visit_id, patient_id, eye_history,
-                              visual_acuity_right, visual_acuity_left,
-                              eye_pressure_right, eye_pressure_left,
-                              eye_findings, od_sphere, od_cylinder, od_axis,
-                              os_sphere, os_cylinder, os_axis, add_power, pd,
-                              recommendations, datetime.now().isoformat()))
-
-                        # Update patient's medical history with eye history
-                        if eye_history:
                             cursor.execute(
                                 '''
-                                UPDATE patients 
-                                SET medical_history = COALESCE(medical_history, '') || '\nEye History: ' || ?
-                                WHERE patient_id = ?
-                            ''', (eye_history, patient_id))
-
-                        # Update visit status to completed
-                        cursor.execute(
-                            '''
-                            UPDATE visits SET status = 'completed' WHERE visit_id = ?
-                        ''', (visit_id, ))
+                                INSERT INTO eye_examinations (
+                                    visit_id, patient_id, eye_history, visual_acuity_right, visual_acuity_left,
+                                    eye_pressure_right, eye_pressure_left, eye_findings, od_sphere, od_cylinder,
+                                    od_axis, os_sphere, os_cylinder, os_axis, add_power, pd, recommendations,
+                                    examination_time
+                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', (visit_id, patient_id, eye_history,
+                                  visual_acuity_right, visual_acuity_left,
+                                  eye_pressure_right, eye_pressure_left,
+                                  eye_findings, od_sphere, od_cylinder, od_axis,
+                                  os_sphere, os_cylinder, os_axis, add_power, pupillary_distance,
+                                  recommendations, datetime.now().isoformat()))
+
+                            # Update patient's medical history with eye history
+                            if eye_history:
+                                cursor.execute(
+                                    '''
+                                    UPDATE patients 
+                                    SET medical_history = COALESCE(medical_history, '') || '\nEye History: ' || ?
+                                    WHERE patient_id = ?
+                                ''', (eye_history, patient_id))
 
-                        conn.commit()
-                        conn.close()
+                            # Update visit status to completed
+                            cursor.execute(
+                                '''
+                                UPDATE visits SET status = 'completed' WHERE visit_id = ?
+                            ''', (visit_id, ))
+                        clear_todays_listings()
 
                         st.success("Eye examination completed successfully!")
                         st.rerun()
@@ -7482,17 +7517,16 @@ def ophthalmologist_interface():
     st.markdown("---")
     st.markdown("#### Recent Eye Examinations")
 
-    conn = sqlite3.connect("clinic_database.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT e.*, p.name
-        FROM eye_examinations e
-        JOIN patients p ON e.patient_id = p.patient_id
-        ORDER BY e.examination_time DESC
-        LIMIT 10
-    ''')
-    recent_exams = cursor.fetchall()
-    conn.close()
+    with db._reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT e.*, p.name
+            FROM eye_examinations e
+            JOIN patients p ON e.patient_id = p.patient_id
+            ORDER BY e.examination_time DESC
+            LIMIT 10
+        ''')
+        recent_exams = cursor.fetchall()
 
     if recent_exams:
         for exam in recent_exams: